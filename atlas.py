@@ -0,0 +1,129 @@
+import json
+import math
+import os
+import numpy as np
+from ursina import Texture, Shader, Vec2, application
+from world import BLOCK_TEXTURES
+
+ATLAS_VERSION = 1
+TILE_SIZE = 128  # Pixels per block texture in the atlas
+PADDING = 8  # Wrapped border around every tile, so filtering and mipmaps don't bleed into neighbours
+CELL_SIZE = TILE_SIZE + 2 * PADDING
+COLUMNS = math.ceil(math.sqrt(len(BLOCK_TEXTURES) - 1))
+ATLAS_SIZE = COLUMNS * CELL_SIZE
+TILE_UV_SIZE = TILE_SIZE / ATLAS_SIZE
+CACHE_DIRECTORY = 'cache'
+
+
+class TextureAtlas:
+    # Every block texture packed into one image, so a whole chunk draws with a single texture and
+    # material. The layout only depends on the block ID order, the image itself is packed once and
+    # then reused from the disk cache.
+    @staticmethod
+    def tile_origin(block_id):
+        # Bottom left corner of a block's tile in atlas UV space (v points up, like Panda3D's)
+        slot = block_id - 1
+        column, row = slot % COLUMNS, slot // COLUMNS
+        return (
+            (column * CELL_SIZE + PADDING) / ATLAS_SIZE,
+            1 - (row * CELL_SIZE + PADDING + TILE_SIZE) / ATLAS_SIZE,
+        )
+
+    @staticmethod
+    def uv_rect(block_id):
+        # (u, v, width, height) of a block's tile
+        return TextureAtlas.tile_origin(block_id) + (TILE_UV_SIZE, TILE_UV_SIZE)
+
+    @staticmethod
+    def source_path(texture_path):
+        return os.path.join(application.asset_folder, texture_path)
+
+    @staticmethod
+    def signature():
+        # Changes whenever a source texture or the layout changes, which invalidates the cache
+        sources = []
+        for texture_path in BLOCK_TEXTURES[1:]:
+            stat = os.stat(TextureAtlas.source_path(texture_path))
+            sources.append([texture_path, stat.st_size, stat.st_mtime_ns])
+        return {'version': ATLAS_VERSION, 'tile_size': TILE_SIZE, 'padding': PADDING, 'sources': sources}
+
+    @staticmethod
+    def pack():
+        from PIL import Image
+        atlas = np.zeros((ATLAS_SIZE, ATLAS_SIZE, 4), dtype=np.uint8)
+        for block_id, texture_path in enumerate(BLOCK_TEXTURES):
+            if texture_path is None:
+                continue
+            tile = np.asarray(Image.open(TextureAtlas.source_path(texture_path)).convert('RGBA').resize((TILE_SIZE, TILE_SIZE), Image.LANCZOS))
+            slot = block_id - 1
+            x, y = (slot % COLUMNS) * CELL_SIZE, (slot // COLUMNS) * CELL_SIZE
+            # Blocks repeat their texture, so the border wraps around instead of clamping
+            atlas[y:y + CELL_SIZE, x:x + CELL_SIZE] = np.pad(tile, ((PADDING, PADDING), (PADDING, PADDING), (0, 0)), mode='wrap')
+        return Image.fromarray(atlas, 'RGBA')
+
+    @staticmethod
+    def load(cache_directory=CACHE_DIRECTORY):
+        # Returns the atlas texture, repacking it only when the cached copy is missing or stale
+        image_path = os.path.join(cache_directory, 'atlas.png')
+        info_path = os.path.join(cache_directory, 'atlas.json')
+        signature = TextureAtlas.signature()
+        try:
+            with open(info_path, 'r') as file:
+                cached = json.load(file) == signature and os.path.exists(image_path)
+        except (OSError, ValueError):
+            cached = False
+
+        if not cached:
+            image = TextureAtlas.pack()
+            try:
+                os.makedirs(cache_directory, exist_ok=True)
+                image.save(image_path)
+                with open(info_path, 'w') as file:
+                    json.dump(signature, file)
+            except OSError as e:
+                print(f"Failed to cache texture atlas: {e}")
+                return Texture(image)
+
+        return Texture(os.path.abspath(image_path))
+
+
+# Every block face gets its repeat UVs (in blocks) plus its tile's origin, and wraps inside the tile
+atlas_shader = Shader(name='atlas_shader', language=Shader.GLSL, vertex='''#version 130
+uniform mat4 p3d_ModelViewProjectionMatrix;
+in vec4 p3d_Vertex;
+in vec4 p3d_MultiTexCoord0;
+in vec4 p3d_Color;
+out vec2 local_uv;
+out vec2 tile_origin;
+out vec4 vertex_color;
+
+void main() {
+    gl_Position = p3d_ModelViewProjectionMatrix * p3d_Vertex;
+    local_uv = p3d_MultiTexCoord0.xy;
+    tile_origin = p3d_MultiTexCoord0.zw;
+    vertex_color = p3d_Color;
+}
+''',
+fragment='''#version 140
+uniform sampler2D p3d_Texture0;
+uniform vec4 p3d_ColorScale;
+uniform vec2 tile_size;
+in vec2 local_uv;
+in vec2 tile_origin;
+in vec4 vertex_color;
+out vec4 fragColor;
+
+void main() {
+    vec2 uv = tile_origin + fract(local_uv) * tile_size;
+    // Gradients from the unwrapped UVs, so the jump at tile edges doesn't pick the smallest mip
+    vec4 color = textureGrad(p3d_Texture0, uv, dFdx(local_uv) * tile_size, dFdy(local_uv) * tile_size);
+    if (color.a < 0.5) {
+        discard;  // Glass and leaves are cut out, so chunks stay in the opaque pass
+    }
+    fragColor = vec4(color.rgb, 1.0) * p3d_ColorScale * vertex_color;
+}
+''',
+default_input={
+    'tile_size': Vec2(TILE_UV_SIZE, TILE_UV_SIZE),
+}
+)
@@ -0,0 +1,256 @@
+import argparse
+import json
+import math
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+# Headless: render into an offscreen buffer and skip audio, this has to happen before Ursina loads
+from panda3d.core import loadPrcFileData
+loadPrcFileData('', 'window-type offscreen\naudio-library-name null')
+
+from ursina import Ursina, destroy
+from noise import Noise
+from blocks import BLOCKS
+from world import World, CHUNK_SIZE, MIN_Y
+from edits import EditOverlay
+from regionfile import RegionStore
+from chunkgen import Chunkgen
+from mob import Mob
+from mobmanager import MobManager, ALIVE
+
+DEFAULT_BASELINE = 'benchmark_baseline.json'
+
+
+class BenchPlayer:
+    # Just the player state the world, edit and mob code reads, so the benchmarks don't need a
+    # first person controller (and a mouse) to run
+    def __init__(self, saves):
+        self.world = World()
+        self.saves = saves
+        self.placed_blocks = EditOverlay(saves)
+        self.x, self.y, self.z = 8.0, 20.0, 8.0
+        self.enabled = True
+        self.health = 100
+
+    def decrease_health(self, amount):
+        self.health -= amount
+
+
+class Benchmark:
+    def __init__(self, repeat=5, quick=False):
+        self.repeat = repeat
+        self.quick = quick
+        self.results = {}
+
+    def measure(self, name, run, ops=1, setup=None, teardown=None):
+        # Median of several runs, setup and teardown aren't timed
+        timings = []
+        for _ in range(self.repeat):
+            state = setup() if setup else None
+            start = time.perf_counter()
+            run(state)
+            timings.append(time.perf_counter() - start)
+            if teardown:
+                teardown(state)
+        seconds = statistics.median(timings)
+        self.results[name] = {
+            'seconds': seconds,
+            'ops': ops,
+            'ops_per_second': ops / seconds if seconds else None,
+            'runs': timings,
+        }
+        print(f"{name:<40} {seconds * 1000:10.3f} ms  {ops / seconds if seconds else 0:14.1f} ops/s")
+
+    def bench_noise(self):
+        calls = 1024 if self.quick else 4096
+        points = [(random.uniform(-1000, 1000), random.uniform(-1000, 1000)) for _ in range(calls)]
+
+        def scalar(_):
+            for x, y in points:
+                Noise.perlin_noise(x, y)
+
+        self.measure('noise.perlin_noise', scalar, ops=calls)
+
+        chunks = 16 if self.quick else 64
+        self.measure('noise.heightmap', lambda _: [Noise.heightmap(i * CHUNK_SIZE, 0) for i in range(chunks)], ops=chunks)
+
+    def bench_chunks(self):
+        for radius in ((1, 2) if self.quick else (1, 2, 4)):
+            keys = [(x, z) for x in range(-radius, radius + 1) for z in range(-radius, radius + 1)]
+
+            def setup():
+                directory = tempfile.TemporaryDirectory()
+                saves = RegionStore(directory.name)
+                return directory, saves, Chunkgen(BenchPlayer(saves))
+
+            def generate(state):
+                for chunk_key in keys:
+                    state[2].generate_chunk(chunk_key)
+
+            def unload(state):
+                for chunk_key in keys:
+                    state[2].unload_chunk(chunk_key)
+
+            def setup_loaded():
+                state = setup()
+                generate(state)
+                return state
+
+            def teardown(state):
+                directory, saves, chunkgen = state
+                for chunk_key in list(chunkgen.loaded_chunks):
+                    chunkgen.unload_chunk(chunk_key)
+                chunkgen.scheduler.shutdown()
+                saves.close()
+                directory.cleanup()
+
+            self.measure(f'chunkgen.generate_chunk[{len(keys)}]', generate, ops=len(keys), setup=setup, teardown=teardown)
+            self.measure(f'chunkgen.unload_chunk[{len(keys)}]', unload, ops=len(keys), setup=setup_loaded, teardown=teardown)
+
+    def bench_edits(self):
+        block_ids = [block_type.id for block_type in BLOCKS if block_type.texture]
+        for count in ((10, 1000) if self.quick else (10, 100, 1000, 10000, 100000)):
+            rng = random.Random(count)
+            # Spread over a 16x16 chunk area, like a long play session would
+            edits = [(rng.randrange(-128, 128), rng.randrange(MIN_Y, 64), rng.randrange(-128, 128), rng.choice(block_ids)) for _ in range(count)]
+
+            def setup():
+                directory = tempfile.TemporaryDirectory()
+                saves = RegionStore(directory.name)
+                overlay = EditOverlay(saves)
+                for x, y, z, block_id in edits:
+                    overlay.set(x, y, z, block_id, save=False)
+                return directory, saves, overlay
+
+            def save(state):
+                directory, saves, overlay = state
+                for chunk_key in overlay.chunks:
+                    overlay.save(chunk_key)
+                saves.flush()
+
+            def setup_saved():
+                state = setup()
+                save(state)
+                directory, saves, overlay = state
+                saves.close()
+                return directory, RegionStore(directory.name), list(overlay.chunks)
+
+            def load(state):
+                directory, saves, chunk_keys = state
+                overlay = EditOverlay(saves)
+                for chunk_key in chunk_keys:
+                    overlay.chunk(chunk_key)
+
+            def teardown(state):
+                state[1].close()
+                state[0].cleanup()
+
+            self.measure(f'edits.save[{count}]', save, ops=count, setup=setup, teardown=teardown)
+            self.measure(f'edits.load[{count}]', load, ops=count, setup=setup_saved, teardown=teardown)
+
+    def bench_mobs(self):
+        ticks = 20 if self.quick else 100
+        for count in ((10, 100) if self.quick else (10, 100, 1000)):
+            player = BenchPlayer(None)
+            manager = MobManager(player, max_mobs=count)
+            rng = random.Random(count)
+            for slot in range(count):
+                # Inside follow range, so hostiles chase and passives wander every tick
+                angle = rng.uniform(0, math.tau)
+                manager.positions[slot] = (player.x + 6 * math.cos(angle), player.y, player.z + 6 * math.sin(angle))
+                manager.hostile[slot] = slot % 2 == 0
+                manager.speed[slot] = 0.48 if manager.hostile[slot] else 0.36
+                manager.health[slot] = 15
+                manager.state[slot] = ALIVE
+                manager.pool[slot] = Mob(manager, slot)
+                manager.pool[slot].enabled = True
+
+            def run(_):
+                for _ in range(ticks):
+                    manager.tick(manager.tick_time)
+                    manager.sync_entities()
+
+            self.measure(f'mobs.tick[{count}]', run, ops=ticks * count)
+            for mob in manager.pool:
+                destroy(mob)
+            destroy(manager)
+
+    def run(self, groups):
+        for group in groups:
+            getattr(self, f'bench_{group}')()
+        return {
+            'meta': {
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'machine': platform.machine(),
+                'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                'repeat': self.repeat,
+                'quick': self.quick,
+            },
+            'results': self.results,
+        }
+
+    @staticmethod
+    def compare(results, baseline, tolerance):
+        # Names of the benchmarks more than `tolerance` slower than the baseline
+        regressions = []
+        for name, result in results['results'].items():
+            reference = baseline['results'].get(name)
+            if reference is None:
+                continue
+            change = result['seconds'] / reference['seconds'] - 1 if reference['seconds'] else 0
+            status = 'REGRESSION' if change > tolerance else 'ok'
+            print(f"{name:<40} {change * 100:+8.1f}%  {status}")
+            if change > tolerance:
+                regressions.append(name)
+        return regressions
+
+
+def main(argv=None):
+    groups = ['noise', 'chunks', 'edits', 'mobs']
+    parser = argparse.ArgumentParser(description="Headless MineClone micro-benchmarks")
+    parser.add_argument('groups', nargs='*', help=f"Benchmark groups to run: {', '.join(groups)} (default: all)")
+    parser.add_argument('--output', default='benchmark_results.json', help="Where to write the JSON results")
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help="Baseline JSON to compare against")
+    parser.add_argument('--save-baseline', action='store_true', help="Store these results as the new baseline")
+    parser.add_argument('--tolerance', type=float, default=0.25, help="Allowed slowdown before failing, 0.25 = 25%%")
+    parser.add_argument('--repeat', type=int, default=5, help="Runs per benchmark, the median is reported")
+    parser.add_argument('--quick', action='store_true', help="Smaller sizes, for a fast sanity check")
+    args = parser.parse_args(argv)
+    unknown = [group for group in args.groups if group not in groups]
+    if unknown:
+        parser.error(f"unknown benchmark group(s): {', '.join(unknown)}")
+
+    app = Ursina(window_type='offscreen', development_mode=False)
+    random.seed(0)
+    results = Benchmark(repeat=args.repeat, quick=args.quick).run(args.groups or groups)
+
+    with open(args.output, 'w') as file:
+        json.dump(results, file, indent=2)
+    print(f"Results written to {args.output}")
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as file:
+            json.dump(results, file, indent=2)
+        print(f"Baseline saved to {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}, run with --save-baseline to create one")
+        return 0
+    with open(args.baseline, 'r') as file:
+        baseline = json.load(file)
+    regressions = Benchmark.compare(results, baseline, args.tolerance)
+    if regressions:
+        print(f"{len(regressions)} benchmark(s) regressed more than {args.tolerance * 100:g}%: {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -2,22 +2,56 @@ import json, random
 from ursina import Ursina, Vec3, Button, color, scene, mouse, destroy, application, load_texture, Text, Entity, camera, TextField, window
 from ursina.prefabs.first_person_controller import FirstPersonController
 from noise import Noise
+from world import World, AIR
+from blocks import BLOCKS
+from atlas import TextureAtlas
 
-class Block(Button):
-    def __init__(self, position=Vec3(0, 0, 0), texture_path="textures/grass.png"):
-        super().__init__(
-            color=color.white,
-            model='cube',
-            texture=load_texture(texture_path),
-            position=position,
-            parent=scene,
-            origin_y=0.5
-        )
-        self.texture_path = texture_path
-        self.active = True
+class Block:
+    # Lightweight view over a single voxel of the world store. Blocks are drawn by their
+    # chunk's merged mesh, so this carries no scene node of its own.
+    def __init__(self, world, position=Vec3(0, 0, 0)):
+        self.world = world
+        self.coords = World.block_coords(position)
+
+    @property
+    def position(self):
+        return Vec3(*self.coords)
+
+    @property
+    def x(self):
+        return self.coords[0]
+
+    @property
+    def y(self):
+        return self.coords[1]
+
+    @property
+    def z(self):
+        return self.coords[2]
+
+    @property
+    def block_id(self):
+        return self.world.get_block(*self.coords)
+
+    @property
+    def block_type(self):
+        return BLOCKS[self.block_id]
+
+    @property
+    def texture_path(self):
+        return self.block_type.texture
+
+    @property
+    def uv_rect(self):
+        # Where this block's texture sits in the shared atlas
+        return TextureAtlas.uv_rect(self.block_id)
+
+    @property
+    def active(self):
+        return self.block_id != AIR
 
     def serialize(self):
         return {
             'position': [self.x, self.y, self.z],
-            'texture_path': self.texture_path
-        }
\ No newline at end of file
+            'block': self.block_id
+        }
@@ -0,0 +1,75 @@
+class BlockType:
+    # Everything the game knows about one kind of block. Voxels only store the small integer ID.
+    def __init__(self, block_id, key, name, texture=None, solid=True, transparent=False, falls=False):
+        self.id = block_id
+        self.key = key  # Short name used in code, e.g. 'stone_bricks'
+        self.name = name  # Shown to the player
+        self.texture = texture  # Texture path, None for air
+        self.solid = solid  # Collides with players and mobs
+        self.transparent = transparent  # Doesn't hide its neighbours' faces or stop light
+        self.falls = falls  # Drops down when there's nothing under it
+
+    def __repr__(self):
+        return f"BlockType({self.id}, {self.key!r})"
+
+
+class BlockRegistry:
+    # Block ID -> BlockType. IDs are handed out in registration order and end up in save files and
+    # on the wire, so new blocks only ever go at the end.
+    def __init__(self):
+        self.types = []
+        self.keys = {}  # Key -> BlockType
+        self.textures = {}  # Texture path -> BlockType, for saves from before block IDs
+
+    def register(self, key, name, texture=None, solid=True, transparent=False, falls=False):
+        if len(self.types) >= 256:
+            raise ValueError(f"No block ID left for {key}, voxels are one byte")
+        if key in self.keys:
+            raise ValueError(f"Block {key} is already registered")
+        block_type = BlockType(len(self.types), key, name, texture, solid, transparent, falls)
+        self.types.append(block_type)
+        self.keys[key] = block_type
+        if texture:
+            self.textures[texture] = block_type
+        return block_type.id
+
+    def __getitem__(self, block_id):
+        return self.types[block_id]
+
+    def __len__(self):
+        return len(self.types)
+
+    def __iter__(self):
+        return iter(self.types)
+
+    def __contains__(self, block_id):
+        return 0 <= block_id < len(self.types)
+
+    def id(self, key):
+        return self.keys[key].id
+
+    def from_texture(self, texture_path):
+        # Block ID of a texture path, None if no block uses it
+        block_type = self.textures.get(texture_path)
+        return block_type.id if block_type else None
+
+    def lookup(self, attribute):
+        # Per-ID table of one property, indexed straight by voxel values
+        return [getattr(block_type, attribute) for block_type in self.types]
+
+
+BLOCKS = BlockRegistry()
+AIR = BLOCKS.register('air', "Air", solid=False, transparent=True)
+GRASS = BLOCKS.register('grass', "Grass", "textures/grass.png")
+GRAVEL = BLOCKS.register('gravel', "Gravel", "textures/gravel.png", falls=True)
+STONE = BLOCKS.register('stone', "Stone", "textures/stone.png")
+STONE_BRICKS = BLOCKS.register('stone_bricks', "Stone Bricks", "textures/stone_bricks.png")
+LOG = BLOCKS.register('log', "Log", "textures/log.png")
+WOOD = BLOCKS.register('wood', "Wood", "textures/wood.png")
+GLASS = BLOCKS.register('glass', "Glass", "textures/glass.png", transparent=True)
+LEAVES = BLOCKS.register('leaves', "Leaves", "textures/leaves.png", transparent=True)
+DIRT = BLOCKS.register('dirt', "Dirt", "textures/dirt.png")
+COAL_ORE = BLOCKS.register('coal_ore', "Coal Ore", "textures/coal_ore.png")
+IRON_ORE = BLOCKS.register('iron_ore', "Iron Ore", "textures/iron_ore.png")
+COPPER_ORE = BLOCKS.register('copper_ore', "Copper Ore", "textures/copper_ore.png")
+DIAMOND_ORE = BLOCKS.register('diamond_ore', "Diamond Ore", "textures/diamond_ore.png")
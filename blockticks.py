@@ -0,0 +1,104 @@
+import heapq
+from blocks import BLOCKS, AIR
+from world import Chunk, CHUNK_SIZE, MIN_Y, MAX_Y
+
+FALL_DELAY = 2  # Ticks before an unsupported block drops a cell, so a falling column is visible
+
+# Block ID -> ticks from a neighbour change to its update. Only these blocks ever get scheduled.
+TICK_DELAYS = {block_type.id: FALL_DELAY for block_type in BLOCKS if block_type.falls}
+
+# A changed cell and the six around it
+NEIGHBOURHOOD = [(0, 0, 0), (1, 0, 0), (-1, 0, 0), (0, 1, 0), (0, -1, 0), (0, 0, 1), (0, 0, -1)]
+
+
+class BlockTicker:
+    # Scheduled block updates. Nothing scans the world for blocks with behaviour: every change
+    # schedules the changed cell and its neighbours, if their block type has a rule, on a priority
+    # queue of (due tick, position). Each tick runs at most `budget` due updates, so a big cascade
+    # spreads over several ticks instead of stalling one. Updates still pending when a chunk
+    # unloads are saved with its edits and picked up again when it loads.
+    def __init__(self, world, edits, set_block, tick_rate=20, budget=64):
+        self.world = world
+        self.edits = edits  # EditOverlay the pending updates are saved with
+        self.set_block = set_block  # Makes a change a rule decided on: (x, y, z, block ID)
+        self.tick_time = 1 / tick_rate
+        self.budget = budget  # Updates per tick, the rest wait for the next one
+        self.accumulator = 0.0
+        self.tick = 0
+        self.queue = []  # Heap of (due tick, x, y, z), may hold entries that were since replaced
+        self.scheduled = {}  # Chunk key -> {voxel index: due tick}, the live entries of loaded chunks
+
+    def pending_count(self):
+        return sum(len(pending) for pending in self.scheduled.values())
+
+    def schedule(self, x, y, z, delay):
+        chunk_key = (x // CHUNK_SIZE, z // CHUNK_SIZE)
+        if chunk_key not in self.world.chunks or not MIN_Y <= y < MAX_Y:
+            return
+        pending = self.scheduled.setdefault(chunk_key, {})
+        index = Chunk.index(x % CHUNK_SIZE, y, z % CHUNK_SIZE)
+        due = self.tick + delay
+        if pending.get(index, due + 1) <= due:
+            return  # Already coming up at least as soon
+        pending[index] = due
+        heapq.heappush(self.queue, (due, x, y, z))
+
+    def notify(self, x, y, z):
+        # A block changed: whatever around it has a rule gets a look
+        for dx, dy, dz in NEIGHBOURHOOD:
+            delay = TICK_DELAYS.get(self.world.get_block(x + dx, y + dy, z + dz))
+            if delay is not None:
+                self.schedule(x + dx, y + dy, z + dz, delay)
+
+    def step(self, dt):
+        # Advances by a frame of dt seconds at the fixed tick rate, returns how many updates ran
+        self.accumulator = min(self.accumulator + dt, self.tick_time * 5)
+        updates = 0
+        while self.accumulator >= self.tick_time:
+            self.tick += 1
+            updates += self.run_tick()
+            self.accumulator -= self.tick_time
+        return updates
+
+    def run_tick(self):
+        updates = 0
+        while self.queue and self.queue[0][0] <= self.tick and updates < self.budget:
+            due, x, y, z = heapq.heappop(self.queue)
+            pending = self.scheduled.get((x // CHUNK_SIZE, z // CHUNK_SIZE))
+            index = Chunk.index(x % CHUNK_SIZE, y, z % CHUNK_SIZE)
+            if pending is None or pending.get(index) != due:
+                continue  # Rescheduled, or its chunk was unloaded (and took it along)
+            del pending[index]
+            self.update_block(x, y, z)
+            updates += 1
+        return updates
+
+    def update_block(self, x, y, z):
+        block_id = self.world.get_block(x, y, z)
+        if BLOCKS[block_id].falls and y > MIN_Y and self.world.get_block(x, y - 1, z) == AIR:
+            self.change(x, y, z, AIR)
+            self.change(x, y - 1, z, block_id)
+
+    def change(self, x, y, z, block_id):
+        self.set_block(x, y, z, block_id)
+        self.notify(x, y, z)
+
+    def load_chunk(self, chunk_key):
+        # Resume the updates that were pending when the chunk was saved
+        origin_x, origin_z = chunk_key[0] * CHUNK_SIZE, chunk_key[1] * CHUNK_SIZE
+        for index, delay in self.edits.get_ticks(chunk_key).items():
+            local_x, y, local_z = Chunk.unpack_index(index)
+            self.schedule(origin_x + local_x, y, origin_z + local_z, delay)
+
+    def save_chunk(self, chunk_key):
+        pending = self.scheduled.get(chunk_key, {})
+        self.edits.set_ticks(chunk_key, {index: max(0, due - self.tick) for index, due in pending.items()})
+
+    def unload_chunk(self, chunk_key):
+        # Called before the edits are unloaded, so the pending updates go out with them
+        self.save_chunk(chunk_key)
+        self.scheduled.pop(chunk_key, None)
+
+    def save(self):
+        for chunk_key in list(self.scheduled):
+            self.save_chunk(chunk_key)
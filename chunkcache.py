@@ -0,0 +1,61 @@
+import zlib
+from collections import OrderedDict
+from palette import SectionPalette
+
+ENTRY_OVERHEAD = 200  # Rough bytes of bookkeeping per cached chunk (key tuple, dict slot)
+
+class ChunkCache:
+    # Voxel data of recently unloaded chunks, least recently used evicted first once the
+    # total size goes over the byte budget. Chunks are kept as section palettes, zlib compressed
+    # on top unless `compress` is off.
+    def __init__(self, max_bytes=32 * 1024 * 1024, compress=True, compression_level=1):
+        self.max_bytes = max_bytes
+        self.compress = compress
+        self.compression_level = compression_level
+        self.entries = OrderedDict()  # Chunk key -> stored bytes, oldest first
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __contains__(self, chunk_key):
+        return chunk_key in self.entries
+
+    def __len__(self):
+        return len(self.entries)
+
+    def put(self, chunk_key, blocks):
+        self.discard(chunk_key)
+        data = SectionPalette.encode(blocks)
+        if self.compress:
+            data = zlib.compress(data, self.compression_level)
+        self.entries[chunk_key] = data
+        self.size += len(data) + ENTRY_OVERHEAD
+        while self.size > self.max_bytes and self.entries:
+            evicted_key, evicted = self.entries.popitem(last=False)
+            self.size -= len(evicted) + ENTRY_OVERHEAD
+            self.evictions += 1
+
+    def take(self, chunk_key):
+        # Chunk bytes as a fresh bytearray, removed from the cache since the chunk is live again
+        data = self.entries.pop(chunk_key, None)
+        if data is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.size -= len(data) + ENTRY_OVERHEAD
+        return SectionPalette.decode(zlib.decompress(data) if self.compress else data)
+
+    def discard(self, chunk_key):
+        data = self.entries.pop(chunk_key, None)
+        if data is not None:
+            self.size -= len(data) + ENTRY_OVERHEAD
+
+    def stats(self):
+        return {
+            'chunks': len(self.entries),
+            'bytes': self.size,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+        }
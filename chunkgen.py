@@ -1,126 +1,385 @@
-from ursina import Vec3, scene, destroy
-import random
-from noise import Noise
+from ursina import Vec3, scene, destroy, camera
+import math
+import time
+from collections import deque
 from block import Block
+from blockticks import BlockTicker
+from chunkcache import ChunkCache
+from atlas import TextureAtlas
+from chunkmodel import ChunkModel
+from lighting import LightEngine
+from lod import LodMesher, LodModel
+from chunkscheduler import ChunkScheduler
+from client import RemoteScheduler
+from culling import Culler
+from mesher import Mesher
+from raycast import VoxelRaycast
+from world import World, Chunk, CHUNK_SIZE, AIR
+from worldgen import WorldGen, GeneratedChunk, DEFAULT_SEED
+from profiler import profiler
 
 class Chunkgen:
-    def __init__(self, player):
+    def __init__(self, player, render_distance=4, lod_distance=12, lod_step=4, budget_ms=4.0, workers=None, use_processes=False, cache_bytes=32 * 1024 * 1024, seed=DEFAULT_SEED, client=None):
         self.player = player
-        self.chunk_size = 16  # Increased chunk size for larger terrain features
-        self.loaded_chunks = {}  # Dictionary to store loaded chunks
+        self.world = player.world
+        self.chunk_size = CHUNK_SIZE  # Increased chunk size for larger terrain features
+        self.loaded_chunks = {}  # Chunk key -> ChunkModel drawing it
+        self.atlas = TextureAtlas.load()  # Every block texture in one image, shared by all chunk models
+        self.budget = budget_ms / 1000  # Seconds per frame spent loading, installing and unloading chunks
+        self.worldgen = WorldGen(seed)  # Same seed, same terrain, so chunks can always be regenerated
+        if client is not None:
+            # A world server generates the chunks, the local generator only feeds the LOD surfaces
+            self.scheduler = RemoteScheduler(client, workers=workers)
+            self.scheduler.on_edit = self.apply_edit
+            self.ticker = None  # The server runs the block updates too
+        else:
+            self.scheduler = ChunkScheduler(self.worldgen.generate, workers=workers, use_processes=use_processes)
+            self.ticker = BlockTicker(self.world, player.placed_blocks, self.tick_block)
+        self.disconnected = False  # The world server went away, nothing more will stream in
+        self.ticked = set()  # Chunks block updates changed since the last rebuild
+        self.ready = []  # Generated chunks waiting to be installed, nearest first
+        self.cache = ChunkCache(max_bytes=cache_bytes)  # Recently unloaded chunks, so revisits skip generation
+        self.wanted = set()  # Chunks within the render distance of the player
+        self.cache_queue = deque()  # Wanted chunks to restore from the cache, nearest first
+        self.unload_queue = deque()  # Chunks past the keep distance, farthest first
+        self.mesh_dirty = set()  # Streamed chunks waiting for a background mesh build
+        self.meshing = {}  # Chunk key -> Future of its background mesh build
+        self.lod_step = lod_step  # Columns per heightmap sample in distant chunks
+        self.lod_models = {}  # Chunk key -> LodModel standing in for a distant chunk
+        self.lod_building = {}  # Chunk key -> Future of its LOD mesh
+        self.lod_wanted = set()  # Chunks between the render and LOD distances
+        self.lod_queue = deque()  # Wanted LOD chunks without a model yet, nearest first
+        self.lod_unload_queue = deque()  # LOD models past the LOD keep distance
+        self.lighting = LightEngine(self.world)  # Per chunk sky and block light, baked into the meshes
+        self.culler = Culler()  # Hides chunk sections outside the view or behind solid ground
+        self.set_render_distance(render_distance, lod_distance)  # Radii in chunks
 
     def generate_chunk(self, chunk_key):
-        chunk_position = Vec3(chunk_key[0] * self.chunk_size, 0, chunk_key[1] * self.chunk_size)
-
-        # Track blocks to destroy
-        blocks_to_destroy = []
-
-        # Generate terrain for the chunk
-        for i in range(self.chunk_size):
-            for j in range(self.chunk_size):
-                noise_val = random.random()  # Replace with your noise function
-                height = int(noise_val * 20)
-
-                for y in range(height + 1):
-                    position = chunk_position + Vec3(j, y, i)
-                    block_exists = any(block.position == position for block in self.player.world_blocks if block.active)
-
-                    if not block_exists:
-                        texture_path = 'textures/stone.png'  # Example texture path
-                        block = Block(position=position, texture_path=texture_path)
-                        self.player.world_blocks.append(block)
-                        block.reparentTo(scene)
-
-                # Example: Simulate occasional destruction of blocks
-                if random.random() < 0.01:  # Adjust probability as needed
-                    block_to_destroy = next((block for block in self.player.world_blocks if block.position == position), None)
-                    if block_to_destroy:
-                        blocks_to_destroy.append(block_to_destroy)
-
-        # Destroy collected blocks
-        for block in blocks_to_destroy:
-            if block in self.player.world_blocks:
-                self.player.world_blocks.remove(block)
-            block.removeNode()
-
-        self.loaded_chunks[chunk_key] = True
-
-        # Example: Additional terrain modifications
-        self.add_trees(chunk_position)
-        self.add_structures(chunk_position)
-        self.add_graves(chunk_position)
-
-    def add_trees(self, chunk_position):
-        # Placeholder for adding trees
-        for _ in range(1):  # This value holds how many trees should be in a chunk
-            x = chunk_position.x + random.randint(0, self.chunk_size - 1)
-            z = chunk_position.z + random.randint(0, self.chunk_size - 1)
-            position = Vec3(x, self.get_height_at(x, z), z)
-            self.place_tree(position)
-
-    def place_tree(self, position):
-        # Placeholder for tree generation logic
-        trunk_height = 5
-        for i in range(trunk_height):
-            trunk = Block(position=position + Vec3(0, i, 0), texture_path='textures/log.png')
-            self.player.world_blocks.append(trunk)
-            trunk.parent = scene
-
-        # Add leaves (simple cube around the top)
-        for x in range(-1, 2):
-            for z in range(-1, 2):
-                for y in range(trunk_height, trunk_height + 3):
-                    if not (x == 0 and z == 0 and y == trunk_height):
-                        leaves = Block(position=position + Vec3(x, y, z), texture_path='textures/leaves.png')
-                        self.player.world_blocks.append(leaves)
-                        leaves.parent = scene
-
-    def add_structures(self, chunk_position):
-        # Placeholder for adding structures
-        pass
-
-    def add_graves(self, chunk_position):
-        # Placeholder for adding graves
-        pass
+        # Synchronous path, for when a chunk is needed right now
+        for touched_key in self.install_chunk(self.worldgen.generate(chunk_key)):
+            self.rebuild_chunk(touched_key)
+
+    def install_chunk(self, generated):
+        # Adds the voxels to the world and returns the chunks whose meshes are now out of date
+        chunk = Chunk(generated.key, generated.blocks)
+        self.world.add_chunk(chunk)
+
+        # Player edits go on top of the generated terrain, cached chunks already contain them
+        if not generated.cached:
+            self.player.placed_blocks.apply(chunk)
+        if self.ticker:
+            self.ticker.load_chunk(generated.key)
+
+        self.loaded_chunks[generated.key] = ChunkModel(chunk, self.atlas)
+
+        # Light last, so it floods in from the neighbours as they are now
+        return {generated.key} | self.lighting.add_chunk(chunk)
+
+    def rebuild_chunk(self, chunk_key):
+        # Synchronous rebuild, replaces any background build of the same chunk still in flight
+        self.meshing.pop(chunk_key, None)
+        self.mesh_dirty.discard(chunk_key)
+        model = self.loaded_chunks.get(chunk_key)
+        chunk = self.world.get_chunk(chunk_key)
+        if model and chunk:
+            with profiler.scope('mesh'):
+                model.set_mesh(Mesher.build(self.world, chunk, light=self.lighting.mesh_light(chunk_key)))
+            profiler.count('meshes built')
+            self.culler.set_chunk(chunk_key, model)
+            self.drop_lod(chunk_key)
+
+    def rebuild_around(self, x, z, relit=()):
+        # Chunks that only changed light get rebuilt in the background
+        self.mesh_dirty.update(relit)
+        for chunk_key in World.edited_chunks(x, z):
+            self.rebuild_chunk(chunk_key)
 
     def get_height_at(self, x, z):
-        noise_val = Noise.perlin_noise(x, z)
-        return int(noise_val * 5)
-
-    def update_terrain(self):
-        player_chunk_x = int(self.player.x / self.chunk_size)
-        player_chunk_z = int(self.player.z / self.chunk_size)
-
-        # Load chunks around the player if not already loaded
-        for dx in range(-1, 2):
-            for dz in range(-1, 2):
-                chunk_key = (player_chunk_x + dx, player_chunk_z + dz)
-                if chunk_key not in self.loaded_chunks:
-                    self.generate_chunk(chunk_key)
-
-        # Unload chunks that are far from the player
-        chunks_to_remove = []
-        for chunk_key in list(self.loaded_chunks.keys()):  # Use list() to iterate over a copy of keys
-            if abs(chunk_key[0] - player_chunk_x) > 1 or abs(chunk_key[1] - player_chunk_z) > 1:
-                chunks_to_remove.append(chunk_key)
-
-        for chunk_key in chunks_to_remove:
-            self.unload_chunk(chunk_key)
-                
-    def unload_chunk(self, chunk_key):
-        chunk_position = Vec3(chunk_key[0] * self.chunk_size, 0, chunk_key[1] * self.chunk_size)
+        return self.worldgen.get_height_at(x, z)
+
+    def hovered_block(self, reach=8.0):
+        # Returns (Block, face normal) for the voxel under the crosshair, or None. Walks the voxel
+        # grid directly, so it costs the same however many chunks are loaded.
+        hit_info = VoxelRaycast.cast(self.world, camera.world_position, camera.forward, reach)
+        if not hit_info.hit:
+            return None
+        return Block(self.world, Vec3(*hit_info.position)), Vec3(*hit_info.normal)
+
+    def place_block(self, position, block_id, rebuild=True):
+        x, y, z = World.block_coords(position)
+        chunk, local = self.world.locate(x, y, z)
+        if chunk is None or chunk.get(*local) != AIR or not chunk.set(*local, block_id):
+            return None
+        relit = self.lighting.update_block(x, y, z)
+        if rebuild:
+            self.rebuild_around(x, z, relit)
+        return Block(self.world, Vec3(x, y, z))
+
+    def apply_edit(self, x, y, z, block_id):
+        # An edit another player made, relayed by the world server
+        chunk_key = (x // CHUNK_SIZE, z // CHUNK_SIZE)
+        if chunk_key not in self.loaded_chunks:
+            # Waiting to install: patch it. Cached: that copy is stale now, the server has the edit.
+            for generated in self.ready:
+                if generated.key == chunk_key:
+                    generated.blocks[Chunk.index(x % CHUNK_SIZE, y, z % CHUNK_SIZE)] = block_id
+            self.cache.discard(chunk_key)
+            return
+        if self.world.get_block(x, y, z) != block_id and self.world.set_block(x, y, z, block_id):
+            self.rebuild_around(x, z, self.lighting.update_block(x, y, z))
+
+    def notify_block(self, x, y, z):
+        # A player edit: neighbours with block update rules (falling gravel) get scheduled
+        if self.ticker:
+            self.ticker.notify(x, y, z)
+
+    def tick_block(self, x, y, z, block_id):
+        # Change made by a block update. Saved like an edit, meshes are rebuilt once per frame.
+        if self.world.set_block(x, y, z, block_id):
+            self.player.placed_blocks.set(x, y, z, block_id)
+            self.mesh_dirty.update(self.lighting.update_block(x, y, z))
+            self.ticked.update(World.edited_chunks(x, z))
+
+    def update_ticks(self, dt):
+        if not self.ticker:
+            return
+        profiler.count('block updates', self.ticker.step(dt))
+        for chunk_key in self.ticked:
+            self.rebuild_chunk(chunk_key)
+        self.ticked.clear()
+
+    def remove_block(self, position):
+        x, y, z = World.block_coords(position)
+        chunk, local = self.world.locate(x, y, z)
+        if chunk is None or chunk.get(*local) == AIR:
+            return False
+        chunk.set(*local, AIR)
+        self.rebuild_around(x, z, self.lighting.update_block(x, y, z))
+        return True
+
+    @staticmethod
+    def spiral_offsets(radius):
+        # Chunk offsets inside a circle of `radius` chunks, nearest first and ring by ring
+        offsets = [(dx, dz) for dx in range(-radius, radius + 1) for dz in range(-radius, radius + 1) if dx * dx + dz * dz <= radius * radius + radius]
+        offsets.sort(key=lambda offset: (offset[0] * offset[0] + offset[1] * offset[1], math.atan2(offset[1], offset[0])))
+        return offsets
+
+    def set_render_distance(self, render_distance, lod_distance=None):
+        # Full detail chunks out to render_distance, coarse heightmap chunks from there out to
+        # lod_distance (no LOD ring if it isn't larger)
+        self.render_distance = render_distance
+        if lod_distance is not None:
+            self.lod_distance = lod_distance
+        self.offsets = self.spiral_offsets(render_distance)
+        full_offsets = set(self.offsets)
+        self.lod_offsets = [offset for offset in self.spiral_offsets(self.lod_distance) if offset not in full_offsets]
+        # Chunks are kept until they're a ring past their distance, so walking back and forth over
+        # a chunk border doesn't switch the same chunks every time
+        keep = render_distance + 1
+        self.keep_distance = keep * keep + keep
+        lod_keep = self.lod_distance + 1
+        self.lod_keep_distance = lod_keep * lod_keep + lod_keep
+        self.center = None  # Restream on the next update
+
+    def update_terrain(self, wait=True):
+        if self.disconnected:
+            return
+        player_chunk = World.chunk_key(self.player.x, self.player.z)
+        if player_chunk != self.center:
+            self.stream_around(player_chunk)
+
+        finished = self.scheduler.poll()
+        if finished:
+            self.ready.extend(generated for generated in finished if generated.key in self.wanted)
+            self.ready.sort(key=lambda generated: self.scheduler.distance(generated.key))
 
-        # Remove blocks from the scene and deactivate them
-        blocks_to_remove = []
-        for block in self.player.world_blocks:
-            if chunk_position.x <= block.position.x < chunk_position.x + self.chunk_size and \
-            chunk_position.z <= block.position.z < chunk_position.z + self.chunk_size:
-                destroy(block)
-                blocks_to_remove.append(block)
+        # The player collides with the voxels, and can't stand on a chunk that isn't there, so that
+        # one is worth a stall. Its mesh can arrive from the workers like any other. Without `wait`
+        # (loading behind the menu) it's streamed in like the rest instead.
+        if player_chunk not in self.loaded_chunks and wait:
+            if self.ready and self.ready[0].key == player_chunk:
+                generated = self.ready.pop(0)
+            else:
+                blocks = self.cache.take(player_chunk)
+                if blocks is not None:
+                    generated = GeneratedChunk(player_chunk, blocks, cached=True)
+                else:
+                    try:
+                        generated = self.scheduler.wait(player_chunk)
+                    except ConnectionError as e:
+                        print(f"Stopped streaming terrain: {e}")
+                        self.disconnected = True
+                        return
+            self.install(generated)
 
-        # Remove the blocks from the world_blocks list
-        for block in blocks_to_remove:
-            self.player.world_blocks.remove(block)
+        self.stream()
+
+        with profiler.scope('culling'):
+            self.culler.update()
+
+    def spawn_ready(self):
+        # The chunk under the player is loaded and drawn, enough to start playing
+        player_chunk = World.chunk_key(self.player.x, self.player.z)
+        return player_chunk in self.loaded_chunks and player_chunk in self.culler.chunks
+
+    def stream_around(self, center):
+        # Only runs when the player enters another chunk: works out what to load and unload and
+        # queues it, the queues are then drained a little every frame by stream()
+        self.center = center
+        self.scheduler.set_center(center)
+        wanted = [(center[0] + dx, center[1] + dz) for dx, dz in self.offsets]
+        self.wanted = set(wanted)
+        self.scheduler.retain(self.wanted)
+
+        self.scheduler.release([generated.key for generated in self.ready if generated.key not in self.wanted])
+        self.ready = [generated for generated in self.ready if generated.key in self.wanted]
+        self.ready.sort(key=lambda generated: self.scheduler.distance(generated.key))
+        ready_keys = {generated.key for generated in self.ready}
+
+        # Chunks still in the cache skip generation and only need meshing, the rest go to the workers
+        self.cache_queue = deque()
+        for chunk_key in wanted:
+            if chunk_key in self.loaded_chunks or chunk_key in ready_keys:
+                continue
+            if chunk_key in self.cache:
+                self.cache_queue.append(chunk_key)
+            else:
+                self.scheduler.request(chunk_key)
+
+        far_chunks = [chunk_key for chunk_key in self.loaded_chunks if self.scheduler.distance(chunk_key) > self.keep_distance]
+        far_chunks.sort(key=self.scheduler.distance, reverse=True)
+        self.unload_queue = deque(far_chunks)
+
+        # Distant rings get heightmap stand-ins. A full chunk that drops out of detail range turns
+        # into one as it unloads, and an LOD chunk is only removed once its full mesh is up.
+        lod_wanted = [(center[0] + dx, center[1] + dz) for dx, dz in self.lod_offsets]
+        self.lod_wanted = set(lod_wanted)
+        self.lod_queue = deque(chunk_key for chunk_key in lod_wanted if chunk_key not in self.lod_models and chunk_key not in self.loaded_chunks)
+        for chunk_key in [key for key in self.lod_building if key not in self.lod_wanted]:
+            self.lod_building.pop(chunk_key).cancel()
+        self.lod_unload_queue = deque(chunk_key for chunk_key in self.lod_models if self.scheduler.distance(chunk_key) > self.lod_keep_distance)
+
+    def stream(self):
+        # Unload, install and restore cached chunks and upload finished meshes until this frame's
+        # budget is spent, always doing at least one step so streaming never stalls
+        deadline = time.perf_counter() + self.budget
+        self.submit_meshes()
+        self.submit_lods()
+        meshed = [chunk_key for chunk_key, future in self.meshing.items() if future.done()]
+        lods_built = [chunk_key for chunk_key, future in self.lod_building.items() if future.done()]
+        while True:
+            if self.unload_queue:
+                chunk_key = self.unload_queue.popleft()
+                if chunk_key in self.loaded_chunks:
+                    self.unload_chunk(chunk_key)
+                    if chunk_key in self.lod_wanted:
+                        self.build_lod(chunk_key)
+            elif self.lod_unload_queue:
+                self.drop_lod(self.lod_unload_queue.popleft())
+            elif meshed:
+                self.upload_mesh(meshed.pop())
+            elif self.cache_queue and (not self.ready or self.scheduler.distance(self.cache_queue[0]) <= self.scheduler.distance(self.ready[0].key)):
+                chunk_key = self.cache_queue.popleft()
+                blocks = self.cache.take(chunk_key)
+                if blocks is not None and chunk_key not in self.loaded_chunks:
+                    self.install(GeneratedChunk(chunk_key, blocks, cached=True))
+            elif self.ready:
+                self.install(self.ready.pop(0))
+            elif lods_built:
+                self.upload_lod(lods_built.pop())
+            else:
+                break
+            if time.perf_counter() > deadline:
+                break
+
+    def install(self, generated):
+        with profiler.scope('install chunk'):
+            self.mesh_dirty.update(self.install_chunk(generated))
+        profiler.count('chunks installed')
+
+    def submit_meshes(self):
+        # Meshing is the slow part of a chunk, so streamed chunks are meshed on the workers from a
+        # snapshot of their voxels. Nearest first, and a chunk edited while its build is running
+        # gets built again once that build lands.
+        if not self.mesh_dirty or len(self.meshing) >= self.scheduler.workers:
+            return
+        for chunk_key in sorted(self.mesh_dirty - self.meshing.keys(), key=self.scheduler.distance):
+            if len(self.meshing) >= self.scheduler.workers:
+                break
+            self.mesh_dirty.discard(chunk_key)
+            chunk = self.world.get_chunk(chunk_key)
+            if chunk is None or chunk_key not in self.loaded_chunks:
+                continue
+            self.meshing[chunk_key] = self.scheduler.executor.submit(Mesher.build_padded, Mesher.padded_voxels(self.world, chunk), True, self.lighting.mesh_light(chunk_key))
+
+    def upload_mesh(self, chunk_key):
+        future = self.meshing.pop(chunk_key, None)
+        if future is None:
+            return  # Unloaded or rebuilt synchronously since the build finished
+        try:
+            mesh = future.result()
+        except Exception as e:
+            print(f"Failed to mesh chunk {chunk_key}: {e}")
+            return
+        model = self.loaded_chunks.get(chunk_key)
+        if model:
+            with profiler.scope('mesh upload'):
+                model.set_mesh(mesh)
+            profiler.count('meshes built')
+            self.culler.set_chunk(chunk_key, model)
+            self.drop_lod(chunk_key)
+
+    def submit_lods(self):
+        while self.lod_queue and len(self.lod_building) < self.scheduler.workers:
+            chunk_key = self.lod_queue.popleft()
+            if chunk_key in self.lod_wanted and chunk_key not in self.lod_models and chunk_key not in self.loaded_chunks:
+                self.lod_building[chunk_key] = self.scheduler.executor.submit(LodMesher.build, self.worldgen, chunk_key, self.lod_step)
+
+    def upload_lod(self, chunk_key):
+        future = self.lod_building.pop(chunk_key, None)
+        if future is None or future.cancelled() or chunk_key not in self.lod_wanted or chunk_key in self.loaded_chunks:
+            return
+        try:
+            mesh = future.result()
+        except Exception as e:
+            print(f"Failed to build LOD for chunk {chunk_key}: {e}")
+            return
+        self.set_lod(chunk_key, mesh)
+
+    def build_lod(self, chunk_key):
+        # Synchronous, so a chunk leaving detail range never leaves a hole behind
+        self.lod_building.pop(chunk_key, None)
+        self.set_lod(chunk_key, LodMesher.build(self.worldgen, chunk_key, self.lod_step))
+
+    def set_lod(self, chunk_key, mesh):
+        with profiler.scope('lod upload'):
+            model = self.lod_models.get(chunk_key)
+            if model is None:
+                model = self.lod_models[chunk_key] = LodModel(chunk_key, self.atlas)
+            model.set_mesh(mesh)
+        profiler.count('lods built')
+        self.culler.set_lod(chunk_key, model)
+
+    def drop_lod(self, chunk_key):
+        model = self.lod_models.pop(chunk_key, None)
+        if model:
+            self.culler.remove_lod(chunk_key)
+            destroy(model)
+
+    def unload_chunk(self, chunk_key):
+        # Dropping the chunk from the world store releases all of its voxels at once
+        profiler.count('chunks unloaded')
+        self.meshing.pop(chunk_key, None)
+        self.mesh_dirty.discard(chunk_key)
+        chunk = self.world.remove_chunk(chunk_key)
+        if chunk:
+            self.cache.put(chunk_key, chunk.blocks)
+        if self.ticker:
+            self.ticker.unload_chunk(chunk_key)
+        self.scheduler.release([chunk_key])
+        self.player.placed_blocks.unload(chunk_key)
+        self.lighting.remove_chunk(chunk_key)
+        self.culler.remove_chunk(chunk_key)
 
         # Remove the chunk from loaded_chunks dictionary
-        del self.loaded_chunks[chunk_key]
+        destroy(self.loaded_chunks.pop(chunk_key))
@@ -0,0 +1,27 @@
+from ursina import Entity, Mesh, color, scene, destroy
+from atlas import atlas_shader
+from mesher import ChunkMeshData
+
+class ChunkModel(Entity):
+    # All the geometry of one chunk, drawn with the shared block atlas and shader. Every section
+    # with faces in it is its own child mesh, so the culler can hide them one by one. No collider,
+    # the player collides with the voxels directly.
+    def __init__(self, chunk, texture):
+        super().__init__(parent=scene, position=(chunk.origin_x, 0, chunk.origin_z), texture=texture, shader=atlas_shader, color=color.white)
+        self.chunk_key = chunk.key
+        self.section_models = {}  # Section index -> Entity drawing it
+        self.connectivity = None  # Per section face connectivity from the last mesh
+
+    def set_mesh(self, data):
+        for section_model in self.section_models.values():
+            destroy(section_model)
+        self.section_models = {}
+        self.connectivity = data.connectivity
+        for index in data.sections:
+            vertices, triangles = data.section_buffers(index)
+            self.section_models[index] = Entity(parent=self, texture=self.texture, shader=atlas_shader, model=Mesh(
+                vertex_buffer=vertices.tobytes(),
+                vertex_buffer_length=len(vertices),
+                vertex_buffer_format=ChunkMeshData.FORMAT,
+                triangles=triangles
+            ))
\ No newline at end of file
@@ -0,0 +1,102 @@
+import heapq
+import itertools
+import os
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+class ChunkScheduler:
+    # Runs chunk generation on a worker pool, nearest chunks first. The main thread only
+    # ever touches finished results through poll()/wait().
+    def __init__(self, generate, workers=None, use_processes=False):
+        self.generate = generate  # Picklable callable chunk_key -> result when using processes
+        self.workers = workers or max(1, min(4, (os.cpu_count() or 2) - 1))
+        executor_class = ProcessPoolExecutor if use_processes else ThreadPoolExecutor
+        self.executor = executor_class(max_workers=self.workers)
+        self.center = (0, 0)
+        self.queue = []  # Heap of (distance, sequence, chunk_key), entries whose sequence is stale are skipped
+        self.queued = {}  # Chunk key -> sequence of its live heap entry
+        self.running = {}  # Chunk key -> Future
+        self.discarded = set()  # Running chunks that were cancelled after they started
+        self.sequence = itertools.count()
+
+    def distance(self, chunk_key):
+        dx = chunk_key[0] - self.center[0]
+        dz = chunk_key[1] - self.center[1]
+        return dx * dx + dz * dz
+
+    def is_pending(self, chunk_key):
+        return (chunk_key in self.queued or chunk_key in self.running) and chunk_key not in self.discarded
+
+    def pending_count(self):
+        return len(self.queued) + len(self.running) - len(self.discarded)
+
+    def request(self, chunk_key):
+        if self.is_pending(chunk_key):
+            return
+        self.discarded.discard(chunk_key)
+        if chunk_key in self.running:
+            return  # Un-cancelled while still running, its result is wanted again
+        sequence = next(self.sequence)
+        self.queued[chunk_key] = sequence
+        heapq.heappush(self.queue, (self.distance(chunk_key), sequence, chunk_key))
+
+    def cancel(self, chunk_key):
+        if self.queued.pop(chunk_key, None) is not None:
+            return
+        future = self.running.get(chunk_key)
+        if future and not future.cancel():
+            self.discarded.add(chunk_key)
+        elif future:
+            del self.running[chunk_key]
+
+    def retain(self, wanted):
+        # Cancel everything that is no longer wanted, e.g. after the player moved away
+        for chunk_key in [key for key in itertools.chain(self.queued, self.running) if key not in wanted]:
+            self.cancel(chunk_key)
+
+    def release(self, chunk_keys):
+        # Finished chunks aren't kept here, nothing to let go of
+        pass
+
+    def set_center(self, center):
+        if center == self.center:
+            return
+        self.center = center
+        self.queue = [(self.distance(key), sequence, key) for key, sequence in self.queued.items()]
+        heapq.heapify(self.queue)
+
+    def submit(self, chunk_key):
+        del self.queued[chunk_key]
+        self.running[chunk_key] = self.executor.submit(self.generate, chunk_key)
+
+    def pump(self):
+        while self.queue and len(self.running) < self.workers:
+            distance, sequence, chunk_key = heapq.heappop(self.queue)
+            if self.queued.get(chunk_key) == sequence:
+                self.submit(chunk_key)
+
+    def poll(self):
+        # Returns the results that finished since the last call, nearest first
+        finished = []
+        for chunk_key, future in list(self.running.items()):
+            if future.done():
+                del self.running[chunk_key]
+                if chunk_key in self.discarded:
+                    self.discarded.discard(chunk_key)
+                elif not future.cancelled():
+                    finished.append(future.result())
+        self.pump()
+        finished.sort(key=lambda result: self.distance(result.key))
+        return finished
+
+    def wait(self, chunk_key):
+        # Block until one chunk is generated, for when the game can't go on without it
+        self.request(chunk_key)
+        if chunk_key in self.queued:
+            self.submit(chunk_key)
+        self.discarded.discard(chunk_key)
+        result = self.running.pop(chunk_key).result()
+        self.pump()
+        return result
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,204 @@
+import asyncio
+import os
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from protocol import Protocol, DISCONNECTED, WELCOME, REQUEST, CANCEL, CHUNK, EDIT, BLOCK, DAMAGE, HURT
+from world import Chunk, CHUNK_SIZE
+from worldgen import GeneratedChunk
+
+
+class WorldClient:
+    # Connection to a WorldServer. The socket lives on an asyncio loop in a background thread,
+    # which also decompresses the chunk snapshots. The game thread sends with plain calls and
+    # runs the handlers of everything received once per frame in process().
+    def __init__(self, host, port, timeout=5.0):
+        self.inbox = queue.SimpleQueue()  # (message type, handler arguments), in arrival order
+        self.handlers = {}  # Message type -> callable taking the decoded message
+        self.handlers[DISCONNECTED] = self.disconnected
+        self.connected = False
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, name='world-client', daemon=True)
+        self.thread.start()
+        try:
+            self.client_id, self.seed, self.max_mobs = asyncio.run_coroutine_threadsafe(self.connect(host, port), self.loop).result(timeout)
+        except BaseException:
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            raise
+
+    async def connect(self, host, port):
+        self.reader, self.writer = await asyncio.open_connection(host, port)
+        message_type, payload = await Protocol.read(self.reader)
+        if message_type != WELCOME:
+            raise ConnectionError(f"Expected a welcome from the server, got message type {message_type}")
+        self.connected = True
+        self.receiver = asyncio.create_task(self.receive())
+        return Protocol.decode(message_type, payload)
+
+    async def receive(self):
+        try:
+            while True:
+                message_type, payload = await Protocol.read(self.reader)
+                self.inbox.put((message_type, Protocol.decode(message_type, payload)))
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError) as e:
+            self.inbox.put((DISCONNECTED, (e,)))
+
+    def send(self, frame):
+        if self.connected:
+            self.loop.call_soon_threadsafe(self.writer.write, frame)
+
+    def process(self, block=False, timeout=None):
+        # Runs the handlers of every message received so far. With `block`, waits for at least one.
+        try:
+            message = self.inbox.get(block, timeout)
+        except queue.Empty:
+            return
+        while True:
+            message_type, args = message
+            handler = self.handlers.get(message_type)
+            if handler is not None:
+                handler(*args)
+            try:
+                message = self.inbox.get_nowait()
+            except queue.Empty:
+                return
+
+    def disconnected(self, error):
+        if self.connected:
+            self.connected = False
+            print(f"Lost connection to the world server: {error or 'closed'}")
+
+    def edit(self, x, y, z, block_id):
+        self.send(Protocol.encode_block(EDIT, x, y, z, block_id))
+
+    def send_position(self, x, y, z):
+        self.send(Protocol.encode_position(x, y, z))
+
+    def damage_mob(self, slot, damage_amount):
+        self.send(Protocol.encode_damage(slot, damage_amount))
+
+    def close(self, timeout=1.0):
+        self.connected = False
+        asyncio.run_coroutine_threadsafe(self.disconnect(), self.loop)
+        self.thread.join(timeout)
+
+    async def disconnect(self):
+        self.receiver.cancel()
+        self.writer.close()
+        try:
+            await self.writer.wait_closed()
+        except ConnectionError:
+            pass
+        self.loop.stop()
+
+
+class RemoteScheduler:
+    # Stands in for ChunkScheduler when a world server generates the chunks: requests go to the
+    # server (batched once per frame) and its snapshots come back as GeneratedChunks. The local
+    # pool is still there for meshing and LOD surfaces.
+    def __init__(self, client, workers=None):
+        self.client = client
+        self.workers = workers or max(1, min(4, (os.cpu_count() or 2) - 1))
+        self.executor = ThreadPoolExecutor(max_workers=self.workers)
+        self.center = (0, 0)
+        self.pending = set()  # Requested and not arrived yet
+        self.requests = []  # Requests not sent yet
+        self.releases = set()  # Chunks the game dropped after they arrived, not reported yet
+        self.received = {}  # Chunk key -> GeneratedChunk, until the next poll()
+        self.on_edit = None  # Called with (x, y, z, block ID) for every edit another player makes
+        client.handlers[CHUNK] = self.receive_chunk
+        client.handlers[BLOCK] = self.receive_edit
+
+    def distance(self, chunk_key):
+        dx = chunk_key[0] - self.center[0]
+        dz = chunk_key[1] - self.center[1]
+        return dx * dx + dz * dz
+
+    def is_pending(self, chunk_key):
+        return chunk_key in self.pending
+
+    def pending_count(self):
+        return len(self.pending)
+
+    def request(self, chunk_key):
+        self.releases.discard(chunk_key)
+        if chunk_key not in self.pending:
+            self.pending.add(chunk_key)
+            self.requests.append(chunk_key)
+
+    def retain(self, wanted):
+        cancelled = [chunk_key for chunk_key in self.pending if chunk_key not in wanted]
+        if cancelled:
+            self.pending.difference_update(cancelled)
+            self.requests = [chunk_key for chunk_key in self.requests if chunk_key in self.pending]
+            self.client.send(Protocol.encode_keys(CANCEL, cancelled))
+
+    def release(self, chunk_keys):
+        # The server keeps every chunk it sent until it hears the client let go of it
+        self.releases.update(chunk_keys)
+
+    def set_center(self, center):
+        self.center = center
+
+    def flush_requests(self):
+        if self.releases:
+            self.client.send(Protocol.encode_keys(CANCEL, list(self.releases)))
+            self.releases = set()
+        # Nearest first, the server answers in about the order it's asked
+        if self.requests:
+            self.requests.sort(key=self.distance)
+            self.client.send(Protocol.encode_keys(REQUEST, self.requests))
+            self.requests = []
+
+    def receive_chunk(self, chunk_key, blocks):
+        if chunk_key in self.pending:
+            self.pending.discard(chunk_key)
+            # Edits are already in the snapshot, so it's installed like a cached chunk
+            self.received[chunk_key] = GeneratedChunk(chunk_key, blocks, cached=True)
+
+    def receive_edit(self, x, y, z, block_id):
+        generated = self.received.get((x // CHUNK_SIZE, z // CHUNK_SIZE))
+        if generated is not None:
+            generated.blocks[Chunk.index(x % CHUNK_SIZE, y, z % CHUNK_SIZE)] = block_id
+        if self.on_edit is not None:
+            self.on_edit(x, y, z, block_id)
+
+    def poll(self):
+        self.flush_requests()
+        self.client.process()
+        finished = sorted(self.received.values(), key=lambda generated: self.distance(generated.key))
+        self.received = {}
+        return finished
+
+    def wait(self, chunk_key):
+        # Block until the server sends one chunk (and handle whatever else arrives meanwhile)
+        self.request(chunk_key)
+        self.flush_requests()
+        while chunk_key not in self.received:
+            if not self.client.connected:
+                raise ConnectionError("Not connected to the world server")
+            self.client.process(block=True, timeout=0.1)
+        return self.received.pop(chunk_key)
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+class RemoteEdits:
+    # Stands in for EditOverlay when a world server stores the edits: they're sent to the server,
+    # and chunk snapshots already include them
+    def __init__(self, client):
+        self.client = client
+        self.chunks = {}
+
+    def set(self, x, y, z, block_id, save=True):
+        self.client.edit(x, y, z, block_id)
+
+    def get(self, x, y, z):
+        return None
+
+    def apply(self, chunk):
+        pass
+
+    def unload(self, chunk_key):
+        pass
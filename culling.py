@@ -0,0 +1,186 @@
+import math
+import time
+from collections import deque
+import numpy as np
+from ursina import camera, scene
+from world import CHUNK_SIZE, CHUNK_HEIGHT, MIN_Y, SECTION_HEIGHT, SECTIONS
+from mesher import ALL_FACES, SECTION_FACES
+
+# Section faces in connectivity order (-x, +x, -y, +y, -z, +z) as steps to the neighbour behind them
+FACE_STEPS = [(-1, 0, 0), (1, 0, 0), (0, -1, 0), (0, 1, 0), (0, 0, -1), (0, 0, 1)]
+OPPOSITE = [1, 0, 3, 2, 5, 4]
+OPEN_SECTION = (ALL_FACES,) * SECTION_FACES  # Sections without connectivity yet are treated as see-through
+
+# Half sizes of a section's bounding box and of a whole column's (for LOD models)
+SECTION_EXTENTS = (CHUNK_SIZE / 2, SECTION_HEIGHT / 2, CHUNK_SIZE / 2)
+COLUMN_CENTER_Y = MIN_Y - 1 + CHUNK_HEIGHT / 2
+COLUMN_EXTENTS = (CHUNK_SIZE / 2, CHUNK_HEIGHT / 2, CHUNK_SIZE / 2)
+
+
+class Culler:
+    # Decides which chunk sections get drawn. Every frame each section's box is tested against the
+    # camera frustum, and a search through the sections' face connectivity (starting from the
+    # camera's) finds the ones a line of sight could reach, so caves and the ground under the
+    # player aren't drawn from the surface. LOD chunks are only frustum culled.
+    def __init__(self, search_interval=0.5):
+        self.chunks = {}  # Chunk key -> ChunkModel
+        self.lods = {}  # Chunk key -> LodModel
+        self.entries = {}  # Chunk key -> (nodes, sections, centers, extents) of its drawn sections, or its LOD model
+        self.search_interval = search_interval  # Seconds between searches while new chunks keep streaming in
+        self.nodes = []  # Drawn entities, parallel to the arrays below
+        self.node_sections = []  # (chunk x, section, chunk z) per node, None for LOD models
+        self.node_chunks = np.zeros(0, dtype=np.int64)  # Index of each node's chunk, -1 for LOD models
+        self.centers = np.zeros((0, 3))
+        self.extents = np.zeros((0, 3))
+        self.shown = np.zeros(0, dtype=bool)
+        self.hidden = set()  # Nodes currently hidden, new nodes start out shown
+        self.nodes_dirty = True
+        self.reachable = None  # Sections the last search reached, None draws every section in the frustum
+        self.searched_chunks = set()  # Chunks that were loaded at the last search, newer ones are drawn until the next
+        self.reachable_mask = np.zeros(0, dtype=bool)
+        self.search_origin = None
+        self.search_due = 0.0  # perf_counter time of the next search, inf while nothing changed
+        self.stats = {'visible chunks': 0, 'visible sections': 0, 'frustum culled': 0, 'occlusion culled': 0, 'visible lods': 0}
+
+    def set_chunk(self, chunk_key, model):
+        # Call whenever a chunk's mesh (and with it its connectivity) changes. A new chunk can wait
+        # for the next regular search, an edited one may have opened a view and is searched right away.
+        self.chunks[chunk_key] = model
+        chunk_x, chunk_z = chunk_key
+        origin_x, origin_z = chunk_x * CHUNK_SIZE - 0.5, chunk_z * CHUNK_SIZE - 0.5
+        indices = list(model.section_models)
+        self.entries[chunk_key] = (
+            [model.section_models[index] for index in indices],
+            [(chunk_x, index, chunk_z) for index in indices],
+            [(origin_x + CHUNK_SIZE / 2, MIN_Y - 1 + (index + 0.5) * SECTION_HEIGHT, origin_z + CHUNK_SIZE / 2) for index in indices],
+            [SECTION_EXTENTS] * len(indices),
+        )
+        self.nodes_dirty = True
+        now = time.perf_counter()
+        self.search_due = min(self.search_due, now if chunk_key in self.searched_chunks else now + self.search_interval)
+
+    def remove_chunk(self, chunk_key):
+        if self.chunks.pop(chunk_key, None) is not None:
+            self.entries.pop(chunk_key, None)
+            self.nodes_dirty = True
+            self.search_due = min(self.search_due, time.perf_counter() + self.search_interval)
+
+    def set_lod(self, chunk_key, model):
+        self.lods[chunk_key] = model
+        center = (chunk_key[0] * CHUNK_SIZE - 0.5 + CHUNK_SIZE / 2, COLUMN_CENTER_Y, chunk_key[1] * CHUNK_SIZE - 0.5 + CHUNK_SIZE / 2)
+        self.entries[('lod', chunk_key)] = ([model], [None], [center], [COLUMN_EXTENTS])
+        self.nodes_dirty = True
+
+    def remove_lod(self, chunk_key):
+        if self.lods.pop(chunk_key, None) is not None:
+            self.entries.pop(('lod', chunk_key), None)
+            self.nodes_dirty = True
+
+    @staticmethod
+    def camera_section(position):
+        # Chunk (x, z) and section index of the cell the camera is in
+        return (
+            math.floor((position[0] + 0.5) / CHUNK_SIZE),
+            math.floor((position[1] - MIN_Y + 1) / SECTION_HEIGHT),
+            math.floor((position[2] + 0.5) / CHUNK_SIZE),
+        )
+
+    def connectivity(self, section):
+        model = self.chunks.get((section[0], section[2]))
+        if model is None or model.connectivity is None:
+            return OPEN_SECTION
+        return model.connectivity[section[1]]
+
+    def search(self, origin):
+        # Breadth first through the loaded sections, only leaving a section through a face its
+        # entry face can see, and never stepping back towards the camera. Returns None when the
+        # camera isn't inside the loaded world, then nothing is occlusion culled.
+        if (origin[0], origin[2]) not in self.chunks or not 0 <= origin[1] < SECTIONS:
+            return None
+        reached = {origin}
+        queue = deque([(origin, -1, 0)])  # Section, face it was entered through, faces stepped out of so far
+        while queue:
+            section, entry, directions = queue.popleft()
+            visible_faces = ALL_FACES if entry < 0 else self.connectivity(section)[entry]
+            for face in range(SECTION_FACES):
+                if not visible_faces & (1 << face) or directions & (1 << OPPOSITE[face]):
+                    continue
+                dx, dy, dz = FACE_STEPS[face]
+                neighbour = (section[0] + dx, section[1] + dy, section[2] + dz)
+                if neighbour in reached or not 0 <= neighbour[1] < SECTIONS or (neighbour[0], neighbour[2]) not in self.chunks:
+                    continue
+                reached.add(neighbour)
+                queue.append((neighbour, OPPOSITE[face], directions | 1 << face))
+        return reached
+
+    def rebuild_nodes(self):
+        nodes, sections, chunks, centers, extents = [], [], [], [], []
+        for entry_index, (entry_nodes, entry_sections, entry_centers, entry_extents) in enumerate(self.entries.values()):
+            nodes += entry_nodes
+            sections += entry_sections
+            owner = entry_index if entry_sections and entry_sections[0] is not None else -1
+            chunks += [owner] * len(entry_nodes)
+            centers += entry_centers
+            extents += entry_extents
+        self.nodes = nodes
+        self.node_sections = sections
+        self.node_chunks = np.array(chunks, dtype=np.int64)
+        self.centers = np.array(centers, dtype=np.float64).reshape(-1, 3)
+        self.extents = np.array(extents, dtype=np.float64).reshape(-1, 3)
+        hidden = self.hidden
+        self.shown = np.array([node not in hidden for node in nodes], dtype=bool)
+        self.hidden = {node for node in nodes if node in hidden}  # Forget destroyed nodes
+        self.update_reachable_mask()
+        self.nodes_dirty = False
+
+    def update_reachable_mask(self):
+        reachable = self.reachable
+        if reachable is None:
+            self.reachable_mask = np.ones(len(self.nodes), dtype=bool)
+        else:
+            searched = self.searched_chunks
+            self.reachable_mask = np.array([section is None or section in reachable or (section[0], section[2]) not in searched for section in self.node_sections], dtype=bool)
+
+    def frustum_mask(self):
+        # Box against each frustum plane: outside if even its nearest corner is in front of the plane
+        bounds = camera.lens.makeBounds()
+        bounds.xform(camera.getMat(scene))
+        planes = np.array([tuple(bounds.getPlane(i)) for i in range(6)], dtype=np.float64)
+        distances = self.centers @ planes[:, :3].T + planes[:, 3]
+        radii = self.extents @ np.abs(planes[:, :3]).T
+        return (distances - radii <= 0).all(axis=1)
+
+    def update(self):
+        if self.nodes_dirty:
+            self.rebuild_nodes()
+
+        origin = self.camera_section(camera.world_position)
+        if origin != self.search_origin or time.perf_counter() >= self.search_due:
+            self.reachable = self.search(origin)
+            self.searched_chunks = set(self.chunks)
+            self.search_origin = origin
+            self.search_due = math.inf
+            self.update_reachable_mask()
+
+        if not self.nodes:
+            return
+        in_frustum = self.frustum_mask()
+        visible = in_frustum & self.reachable_mask
+        for index in np.flatnonzero(visible != self.shown).tolist():
+            node = self.nodes[index]
+            if visible[index]:
+                node.visible = True
+                self.hidden.discard(node)
+            else:
+                node.visible = False
+                self.hidden.add(node)
+        self.shown = visible
+
+        sections = self.node_chunks >= 0
+        self.stats = {
+            'visible chunks': np.unique(self.node_chunks[visible & sections]).size,
+            'visible sections': int((visible & sections).sum()),
+            'frustum culled': int((~in_frustum & sections).sum()),
+            'occlusion culled': int((in_frustum & ~self.reachable_mask).sum()),
+            'visible lods': int((visible & ~sections).sum()),
+        }
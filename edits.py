@@ -0,0 +1,99 @@
+import struct
+import numpy as np
+from world import Chunk, CHUNK_SIZE, MIN_Y, MAX_Y
+
+RECORD = struct.Struct('<BhBB')  # Local x, y, local z, block ID (0 = removed)
+TICK_RECORD = struct.Struct('<BhBH')  # Local x, y, local z, ticks until a scheduled block update
+# Payloads with pending block updates start with TICKS_MARKER and the edit count, then the edits,
+# then the updates. Edits only payloads are just the edits, an edit never starts with 0xFF.
+TICKS_HEADER = struct.Struct('<BI')
+TICKS_MARKER = 0xFF
+
+class EditOverlay:
+    # Player edits indexed by chunk key and voxel index, layered over generated terrain.
+    # Removals are kept as AIR entries so they survive regeneration too. Block updates a
+    # BlockTicker still had pending for the chunk are saved along with them.
+    def __init__(self, store):
+        self.store = store  # RegionStore the overlays are saved to
+        self.chunks = {}  # Chunk key -> {voxel index: block ID}, loaded on demand
+        self.ticks = {}  # Chunk key -> {voxel index: ticks until due}, loaded with the overlay
+
+    @staticmethod
+    def encode(overlay, ticks=None):
+        start = TICKS_HEADER.size if ticks else 0
+        payload = bytearray(start + RECORD.size * len(overlay) + (TICK_RECORD.size * len(ticks) if ticks else 0))
+        if ticks:
+            TICKS_HEADER.pack_into(payload, 0, TICKS_MARKER, len(overlay))
+        for i, (index, block_id) in enumerate(overlay.items()):
+            local_x, y, local_z = Chunk.unpack_index(index)
+            RECORD.pack_into(payload, start + i * RECORD.size, local_x, y, local_z, block_id)
+        if ticks:
+            start += RECORD.size * len(overlay)
+            for i, (index, delay) in enumerate(ticks.items()):
+                local_x, y, local_z = Chunk.unpack_index(index)
+                TICK_RECORD.pack_into(payload, start + i * TICK_RECORD.size, local_x, y, local_z, min(delay, 0xFFFF))
+        return bytes(payload)
+
+    @staticmethod
+    def decode(payload):
+        # (edits, pending block updates)
+        ticks = {}
+        if payload[0] == TICKS_MARKER:
+            _, count = TICKS_HEADER.unpack_from(payload)
+            start = TICKS_HEADER.size + count * RECORD.size
+            ticks = {Chunk.index(local_x, y, local_z): delay for local_x, y, local_z, delay in TICK_RECORD.iter_unpack(payload[start:])}
+            payload = payload[TICKS_HEADER.size:start]
+        return {Chunk.index(local_x, y, local_z): block_id for local_x, y, local_z, block_id in RECORD.iter_unpack(payload)}, ticks
+
+    def chunk(self, chunk_key):
+        overlay = self.chunks.get(chunk_key)
+        if overlay is None:
+            payload = self.store.load_chunk(chunk_key)
+            overlay, ticks = self.decode(payload) if payload else ({}, {})
+            self.chunks[chunk_key] = overlay
+            if ticks:
+                self.ticks[chunk_key] = ticks
+        return overlay
+
+    def get(self, x, y, z):
+        # Edited block ID at a position, or None if the player never touched it
+        return self.chunk((x // CHUNK_SIZE, z // CHUNK_SIZE)).get(Chunk.index(x % CHUNK_SIZE, y, z % CHUNK_SIZE))
+
+    def set(self, x, y, z, block_id, save=True):
+        if not MIN_Y <= y < MAX_Y:
+            return
+        chunk_key = (x // CHUNK_SIZE, z // CHUNK_SIZE)
+        self.chunk(chunk_key)[Chunk.index(x % CHUNK_SIZE, y, z % CHUNK_SIZE)] = block_id
+        if save:
+            self.save(chunk_key)
+
+    def save(self, chunk_key):
+        # Only this chunk is marked dirty, the region writer batches it to disk in the background
+        self.store.save_chunk(chunk_key, self.encode(self.chunks[chunk_key], self.ticks.get(chunk_key)))
+
+    def get_ticks(self, chunk_key):
+        # Saved pending block updates, {voxel index: ticks until due}
+        self.chunk(chunk_key)
+        return self.ticks.get(chunk_key, {})
+
+    def set_ticks(self, chunk_key, ticks):
+        # Replace a chunk's pending block updates, saved only if they changed
+        self.chunk(chunk_key)
+        if ticks != self.ticks.get(chunk_key, {}):
+            if ticks:
+                self.ticks[chunk_key] = ticks
+            else:
+                self.ticks.pop(chunk_key, None)
+            self.save(chunk_key)
+
+    def apply(self, chunk):
+        # Merge a chunk's edits into its freshly generated voxels in one vectorized pass
+        overlay = self.chunk(chunk.key)
+        if overlay:
+            blocks = np.frombuffer(chunk.blocks, dtype=np.uint8)
+            blocks[np.fromiter(overlay.keys(), dtype=np.intp, count=len(overlay))] = np.fromiter(overlay.values(), dtype=np.uint8, count=len(overlay))
+
+    def unload(self, chunk_key):
+        # Already handed to the store on every change, so nothing is lost
+        self.chunks.pop(chunk_key, None)
+        self.ticks.pop(chunk_key, None)
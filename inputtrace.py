@@ -0,0 +1,102 @@
+import atexit
+import struct
+import time
+import zlib
+
+MAGIC = b'MCTR'
+VERSION = 1
+HEADER = struct.Struct('<4sHqfI')  # Magic, version, world seed, seconds per frame, frame count
+FRAME = struct.Struct('<fffffB')  # Player x, y, z, yaw, camera pitch, input events this frame
+NAME_COUNT = struct.Struct('<H')
+
+
+class InputTrace:
+    # A play session as the player's pose at the end of every frame plus the input events of that
+    # frame, enough to drive Player again frame for frame (see replay.py). Stored as a small
+    # header and a zlib compressed body: the distinct input names, then per frame one FRAME record
+    # followed by a byte per event indexing those names.
+    def __init__(self, seed, frame_time=1 / 60):
+        self.seed = seed  # Replays generate the same terrain
+        self.frame_time = frame_time  # Average seconds per recorded frame, replays step this fixed dt
+        self.frames = []  # (x, y, z, yaw, pitch, (input names))
+
+    def add_frame(self, x, y, z, yaw, pitch, keys=()):
+        self.frames.append((x, y, z, yaw, pitch, tuple(keys)))
+
+    def save(self, path):
+        names = sorted({key for frame in self.frames for key in frame[5]})
+        if len(names) > 256:
+            raise ValueError(f"Trace has {len(names)} distinct inputs, at most 256 fit")
+        ids = {name: i for i, name in enumerate(names)}
+        body = bytearray(NAME_COUNT.pack(len(names)))
+        for name in names:
+            encoded = name.encode('utf-8')
+            body += bytes((len(encoded),)) + encoded
+        for x, y, z, yaw, pitch, keys in self.frames:
+            keys = keys[:255]
+            body += FRAME.pack(x, y, z, yaw, pitch, len(keys))
+            body += bytes(ids[key] for key in keys)
+        with open(path, 'wb') as file:
+            file.write(HEADER.pack(MAGIC, VERSION, self.seed, self.frame_time, len(self.frames)))
+            file.write(zlib.compress(bytes(body)))
+
+    @staticmethod
+    def load(path):
+        # Raises ValueError if the file isn't a trace this version can read
+        with open(path, 'rb') as file:
+            data = file.read()
+        if len(data) < HEADER.size:
+            raise ValueError(f"{path} is too short to be an input trace")
+        magic, version, seed, frame_time, frame_count = HEADER.unpack_from(data)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a version {VERSION} input trace")
+        try:
+            body = memoryview(zlib.decompress(data[HEADER.size:]))
+            offset = NAME_COUNT.size
+            names = []
+            for _ in range(NAME_COUNT.unpack_from(body)[0]):
+                length = body[offset]
+                names.append(bytes(body[offset + 1:offset + 1 + length]).decode('utf-8'))
+                offset += 1 + length
+            trace = InputTrace(seed, frame_time)
+            for _ in range(frame_count):
+                x, y, z, yaw, pitch, key_count = FRAME.unpack_from(body, offset)
+                offset += FRAME.size
+                trace.add_frame(x, y, z, yaw, pitch, [names[i] for i in body[offset:offset + key_count]])
+                offset += key_count
+        except (zlib.error, struct.error, IndexError, UnicodeDecodeError) as e:
+            raise ValueError(f"{path} is corrupt: {e}")
+        return trace
+
+
+class InputRecorder:
+    # Captures a session into an InputTrace while it's played: Player hands it every input event
+    # and its pose once per frame. Saved when the game quits.
+    def __init__(self, path, seed):
+        self.path = path
+        self.trace = InputTrace(seed)
+        self.keys = []  # Input events of the frame in progress
+        self.start = None  # Time of the first frame, the menu before it isn't part of the session
+        self.saved = False
+        atexit.register(self.save)
+
+    def key(self, key):
+        self.keys.append(key)
+
+    def frame(self, x, y, z, yaw, pitch):
+        if self.start is None:
+            self.start = time.perf_counter()
+        self.trace.add_frame(x, y, z, yaw, pitch, self.keys)
+        self.keys = []
+
+    def save(self):
+        if self.saved or not self.trace.frames:
+            return
+        self.saved = True
+        if len(self.trace.frames) > 1:
+            self.trace.frame_time = (time.perf_counter() - self.start) / (len(self.trace.frames) - 1)
+        try:
+            self.trace.save(self.path)
+            print(f"Recorded {len(self.trace.frames)} frames to {self.path}")
+        except (OSError, ValueError) as e:
+            print(f"Failed to save input trace to {self.path}: {e}")
@@ -0,0 +1,231 @@
+from collections import deque
+import numpy as np
+from world import World, CHUNK_SIZE, CHUNK_HEIGHT, CHUNK_VOLUME, MIN_Y, MAX_Y, TRANSPARENT_BLOCKS, Chunk
+from blocks import LEAVES
+
+MAX_LIGHT = 15
+SKY, BLOCK = 0, 1  # Light channels: daylight from above, and light given off by blocks
+
+# Light a block takes away as it passes through, on top of the one level every step costs.
+# Anything solid stops it completely.
+OPACITY = np.full(256, MAX_LIGHT, dtype=np.uint8)
+OPACITY[0] = 0
+for _block_id in TRANSPARENT_BLOCKS:
+    OPACITY[_block_id] = 0
+OPACITY[LEAVES] = 1
+
+# Light level a block gives off. None of the current blocks glow, but the block channel is
+# propagated the same way as skylight as soon as one does.
+EMISSION = np.zeros(256, dtype=np.uint8)
+
+NEIGHBOURS = [(1, 0, 0), (-1, 0, 0), (0, 1, 0), (0, -1, 0), (0, 0, 1), (0, 0, -1)]
+
+# Side neighbours as (dx, dz, their edge's slot in a padded [y][z][x] array, that edge in theirs)
+SIDES = [
+    (-1, 0, (slice(1, -1), slice(1, -1), 0), (slice(None), slice(None), -1)),
+    (1, 0, (slice(1, -1), slice(1, -1), -1), (slice(None), slice(None), 0)),
+    (0, -1, (slice(1, -1), 0, slice(1, -1)), (slice(None), -1, slice(None))),
+    (0, 1, (slice(1, -1), -1, slice(1, -1)), (slice(None), 0, slice(None))),
+]
+
+
+class ChunkLight:
+    # Light levels of one chunk, one byte per voxel per channel, in the same layout as Chunk.blocks
+    def __init__(self):
+        self.channels = [bytearray(CHUNK_VOLUME), bytearray(CHUNK_VOLUME)]
+
+    def view(self, channel):
+        # [y][z][x] numpy view, writes go straight into the channel
+        return np.frombuffer(self.channels[channel], dtype=np.uint8).reshape(CHUNK_HEIGHT, CHUNK_SIZE, CHUNK_SIZE)
+
+
+class LightEngine:
+    # Skylight and block light for every loaded chunk. A new chunk gets its skylight from its
+    # column heights and block light from its glowing blocks in a few numpy ops, then both are
+    # flood filled (BFS) only from the cells that can still light up a neighbour. Edits relight
+    # incrementally: a removal queue darkens what the old block lit, a re-add queue floods back in
+    # from the edges of the darkened area.
+    def __init__(self, world):
+        self.world = world
+        self.chunks = {}  # Chunk key -> ChunkLight
+
+    def add_chunk(self, chunk):
+        # Lights a chunk that was just added to the world. Returns the chunk keys whose light
+        # changed, their meshes are out of date.
+        light = self.chunks[chunk.key] = ChunkLight()
+        voxels = np.frombuffer(chunk.blocks, dtype=np.uint8).reshape(CHUNK_HEIGHT, CHUNK_SIZE, CHUNK_SIZE)
+        opacity = OPACITY[voxels]
+        # Full daylight down every column until the first block that dims it, the flood fill
+        # carries it sideways under overhangs from there
+        shaded = np.logical_or.accumulate((opacity > 0)[::-1], axis=0)[::-1]
+        light.view(SKY)[...] = np.where(shaded, 0, MAX_LIGHT)
+        light.view(BLOCK)[...] = EMISSION[voxels]
+
+        touched = {chunk.key}
+        for channel in (SKY, BLOCK):
+            touched |= self.spread(channel, self.seeds(chunk, channel, opacity))
+        return touched
+
+    def remove_chunk(self, chunk_key):
+        self.chunks.pop(chunk_key, None)
+
+    def padded(self, chunk_key, channel):
+        # The channel with one cell of border on every side taken from the loaded neighbours,
+        # indexed [y][z][x]. Above the world is daylight, unloaded chunks give no light.
+        padded = np.zeros((CHUNK_HEIGHT + 2, CHUNK_SIZE + 2, CHUNK_SIZE + 2), dtype=np.uint8)
+        if channel == SKY:
+            padded[-1] = MAX_LIGHT
+        padded[1:-1, 1:-1, 1:-1] = self.chunks[chunk_key].view(channel)
+        chunk_x, chunk_z = chunk_key
+        for dx, dz, target, source in SIDES:
+            neighbour = self.chunks.get((chunk_x + dx, chunk_z + dz))
+            if neighbour is not None:
+                padded[target] = neighbour.view(channel)[source]
+        return padded
+
+    def mesh_light(self, chunk_key):
+        # Brightest of both channels around a chunk, indexed [x][y][z] like Mesher.padded_voxels.
+        # Chunks without light yet (or off the loaded edge) count as fully lit.
+        if chunk_key not in self.chunks:
+            return np.full((CHUNK_SIZE + 2, CHUNK_HEIGHT + 2, CHUNK_SIZE + 2), MAX_LIGHT, dtype=np.uint8)
+        light = np.maximum(self.padded(chunk_key, SKY), self.padded(chunk_key, BLOCK))
+        chunk_x, chunk_z = chunk_key
+        for dx, dz, ring in ((-1, 0, (slice(None), slice(None), 0)), (1, 0, (slice(None), slice(None), -1)),
+                             (0, -1, (slice(None), 0, slice(None))), (0, 1, (slice(None), -1, slice(None)))):
+            if (chunk_x + dx, chunk_z + dz) not in self.chunks:
+                light[ring] = MAX_LIGHT
+        return light.transpose(2, 0, 1)
+
+    def seeds(self, chunk, channel, opacity):
+        # Cells, in this chunk and along the facing edges of its neighbours, whose light should
+        # reach further than it does. Everything else is already consistent.
+        light = self.padded(chunk.key, channel).astype(np.int16)
+        if not light.any():
+            return deque()  # Usually the case for block light, nothing around glows
+        blocks = np.full(light.shape, MAX_LIGHT, dtype=np.uint8)
+        blocks[1:-1, 1:-1, 1:-1] = opacity
+        blocks[-1] = 0  # Open sky above the world
+        chunk_x, chunk_z = chunk.key
+        for dx, dz, target, source in SIDES:
+            neighbour = self.world.get_chunk((chunk_x + dx, chunk_z + dz))
+            if neighbour is not None and neighbour.key in self.chunks:
+                voxels = np.frombuffer(neighbour.blocks, dtype=np.uint8).reshape(CHUNK_HEIGHT, CHUNK_SIZE, CHUNK_SIZE)
+                blocks[target] = OPACITY[voxels[source]]
+
+        # A cell is a seed if some open neighbour is darker than what it would pass on
+        seed = np.zeros(light.shape, dtype=bool)
+        inner = (slice(1, -1),) * 3
+        for dx, dy, dz in NEIGHBOURS:
+            near = (slice(1 - dy, light.shape[0] - 1 - dy), slice(1 - dz, light.shape[1] - 1 - dz), slice(1 - dx, light.shape[2] - 1 - dx))
+            # Cells of the padded array whose neighbour in this direction is in the chunk
+            passed = light[near] - 1 - blocks[inner]
+            if channel == SKY and dy == -1:
+                passed = np.where((light[near] == MAX_LIGHT) & (blocks[inner] == 0), MAX_LIGHT, passed)
+            seed[near] |= (blocks[inner] < MAX_LIGHT) & (passed > light[inner])
+            # And cells in the chunk whose neighbour in this direction is anywhere in the padding
+            far = (slice(1 + dy, light.shape[0] - 1 + dy), slice(1 + dz, light.shape[1] - 1 + dz), slice(1 + dx, light.shape[2] - 1 + dx))
+            passed = light[inner] - 1 - blocks[far]
+            if channel == SKY and dy == -1:
+                passed = np.where((light[inner] == MAX_LIGHT) & (blocks[far] == 0), MAX_LIGHT, passed)
+            seed[inner] |= (blocks[far] < MAX_LIGHT) & (passed > light[far])
+
+        # Only the chunk, its four side neighbours and the open sky above can pass light on
+        seed[0] = False
+        seed[:, 0, 0] = seed[:, 0, -1] = seed[:, -1, 0] = seed[:, -1, -1] = False
+        ys, zs, xs = np.nonzero(seed)
+        origin_x, origin_z = chunk.origin_x - 1, chunk.origin_z - 1
+        return deque(zip((xs + origin_x).tolist(), (ys + MIN_Y - 1).tolist(), (zs + origin_z).tolist()))
+
+    def get(self, channel, x, y, z):
+        light = self.chunks.get((x // CHUNK_SIZE, z // CHUNK_SIZE))
+        if light is None or not MIN_Y <= y < MAX_Y:
+            return MAX_LIGHT if channel == SKY and y >= MAX_Y else 0
+        return light.channels[channel][Chunk.index(x % CHUNK_SIZE, y, z % CHUNK_SIZE)]
+
+    def spread(self, channel, queue):
+        # Flood fill outwards from every queued cell. Returns the chunks whose light changed.
+        touched = set()
+        chunks = self.chunks
+        world_chunks = self.world.chunks
+        while queue:
+            x, y, z = queue.popleft()
+            level = self.get(channel, x, y, z)
+            if level <= 1:
+                continue
+            for dx, dy, dz in NEIGHBOURS:
+                ny = y + dy
+                if not MIN_Y <= ny < MAX_Y:
+                    continue
+                nx, nz = x + dx, z + dz
+                chunk_key = (nx // CHUNK_SIZE, nz // CHUNK_SIZE)
+                light = chunks.get(chunk_key)
+                if light is None:
+                    continue
+                index = Chunk.index(nx % CHUNK_SIZE, ny, nz % CHUNK_SIZE)
+                opacity = OPACITY[world_chunks[chunk_key].blocks[index]]
+                if opacity >= MAX_LIGHT:
+                    continue
+                if channel == SKY and dy == -1 and level == MAX_LIGHT and opacity == 0:
+                    new_level = MAX_LIGHT  # Daylight falls straight down without fading
+                else:
+                    new_level = level - 1 - opacity
+                values = light.channels[channel]
+                if new_level > values[index]:
+                    values[index] = new_level
+                    queue.append((nx, ny, nz))
+                    touched.update(World.edited_chunks(nx, nz))
+        return touched
+
+    def darken(self, channel, queue):
+        # Removal pass: clears every cell that got its light through the queued (x, y, z, level)
+        # cells. Lit cells found along the edge go back out in the returned re-add queue.
+        touched = set()
+        refill = deque()
+        chunks = self.chunks
+        while queue:
+            x, y, z, level = queue.popleft()
+            for dx, dy, dz in NEIGHBOURS:
+                ny = y + dy
+                if not MIN_Y <= ny < MAX_Y:
+                    continue
+                nx, nz = x + dx, z + dz
+                light = chunks.get((nx // CHUNK_SIZE, nz // CHUNK_SIZE))
+                if light is None:
+                    continue
+                index = Chunk.index(nx % CHUNK_SIZE, ny, nz % CHUNK_SIZE)
+                values = light.channels[channel]
+                neighbour_level = values[index]
+                if neighbour_level == 0:
+                    continue
+                if neighbour_level < level or (channel == SKY and dy == -1 and level == MAX_LIGHT and neighbour_level == MAX_LIGHT):
+                    values[index] = 0
+                    queue.append((nx, ny, nz, neighbour_level))
+                    touched.update(World.edited_chunks(nx, nz))
+                else:
+                    refill.append((nx, ny, nz))
+        return touched, refill
+
+    def update_block(self, x, y, z):
+        # Relights around a block that was just placed or removed. Returns the touched chunk keys.
+        chunk_key = (x // CHUNK_SIZE, z // CHUNK_SIZE)
+        light = self.chunks.get(chunk_key)
+        if light is None or not MIN_Y <= y < MAX_Y:
+            return set()
+        index = Chunk.index(x % CHUNK_SIZE, y, z % CHUNK_SIZE)
+        block_id = self.world.chunks[chunk_key].blocks[index]
+        touched = set(World.edited_chunks(x, z))
+        for channel in (SKY, BLOCK):
+            values = light.channels[channel]
+            level = values[index]
+            refill = deque()
+            if level:
+                values[index] = 0
+                darkened, refill = self.darken(channel, deque([(x, y, z, level)]))
+                touched |= darkened
+            if channel == BLOCK and EMISSION[block_id]:
+                values[index] = EMISSION[block_id]
+                refill.append((x, y, z))
+            # Light flows back in from around the cell, if the new block lets any through
+            refill.extend((x + dx, y + dy, z + dz) for dx, dy, dz in NEIGHBOURS)
+            touched |= self.spread(channel, refill)
+        return touched
@@ -0,0 +1,62 @@
+from ursina import Entity, Mesh, color, scene
+from atlas import atlas_shader
+from mesher import ChunkMeshData
+from blocks import DIRT
+from world import CHUNK_SIZE, MIN_Y
+
+SKIRT = 4  # Extra wall depth along chunk edges, hides cracks against chunks at another detail level
+WALL_BLOCK = DIRT
+
+
+class LodMesher:
+    # Coarse stand-in for a distant chunk: the terrain heightmap sampled every `step` columns,
+    # drawn as flat-topped cells with walls where neighbouring cells differ. Built straight from
+    # the noise, so no voxels are generated or kept for it.
+    @staticmethod
+    def build(worldgen, chunk_key, step=4):
+        cells = CHUNK_SIZE // step
+        # One extra ring of samples around the chunk, for the walls along its edges
+        heights = worldgen.sample_heights(chunk_key[0] * CHUNK_SIZE - step, chunk_key[1] * CHUNK_SIZE - step, size=CHUNK_SIZE + 2 * step, step=step)
+        tops = worldgen.surface_block(heights).tolist()  # Same grass or gravel the full chunk gets
+        heights = heights.tolist()
+        mesh = ChunkMeshData()
+
+        for i in range(cells):
+            for j in range(cells):
+                height = heights[i + 1][j + 1]
+                x, z = i * step, j * step
+                mesh.add_quad(tops[i + 1][j + 1], 1, 1, height - MIN_Y, z, x, step, step)
+
+                for di, dj, axis, direction in ((1, 0, 0, 1), (-1, 0, 0, -1), (0, 1, 2, 1), (0, -1, 2, -1)):
+                    neighbour = heights[i + 1 + di][j + 1 + dj]
+                    if neighbour >= height:
+                        continue  # The neighbour's own wall covers this side
+                    edge = not (0 <= i + di < cells and 0 <= j + dj < cells)
+                    bottom = neighbour + 1 - (SKIRT if edge else 0)
+                    wall_height = height - bottom + 1
+                    if axis == 0:
+                        layer = x + step - 1 if direction > 0 else x
+                        mesh.add_quad(WALL_BLOCK, 0, direction, layer, bottom - MIN_Y, z, wall_height, step)
+                    else:
+                        layer = z + step - 1 if direction > 0 else z
+                        mesh.add_quad(WALL_BLOCK, 2, direction, layer, x, bottom - MIN_Y, step, wall_height)
+
+        return mesh.pack()
+
+
+class LodModel(Entity):
+    # Distant chunk drawn from its LodMesher surface. No collider, it's never within reach.
+    def __init__(self, chunk_key, texture):
+        super().__init__(parent=scene, position=(chunk_key[0] * CHUNK_SIZE, 0, chunk_key[1] * CHUNK_SIZE), texture=texture, shader=atlas_shader, color=color.white)
+        self.chunk_key = chunk_key
+
+    def set_mesh(self, data):
+        if not data.quad_count:
+            self.model = None
+            return
+        self.model = Mesh(
+            vertex_buffer=data.vertices.tobytes(),
+            vertex_buffer_length=len(data.vertices),
+            vertex_buffer_format=ChunkMeshData.FORMAT,
+            triangles=data.triangles
+        )
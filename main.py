@@ -1,11 +1,20 @@
+import argparse
+import time
+STARTED = time.perf_counter()  # Before the engine import, which is a good part of startup
+
 from ursina import Ursina, Sky
-from player import Player
-from mob import Mob
 from mainmenu import MainMenu
+from startup import StartupTimer, Loader
 
 class Main:
     @staticmethod
     def main():
+        timer = StartupTimer(STARTED)
+        parser = argparse.ArgumentParser(description="MineClone")
+        parser.add_argument('--connect', metavar='HOST:PORT', help="Join a world server started with server.py instead of playing locally")
+        parser.add_argument('--record', metavar='PATH', help="Record the session's input to a trace file that replay.py can play back")
+        args = parser.parse_args()
+
         app = Ursina(
             title="MineClone",
             icon="res/icon.ico",
@@ -19,7 +28,6 @@ class Main:
             resizable=True,  # Allow the window to be resizable
             show_ursina_splash=False,  # Disable Ursina splash screen
             quality_level=0,  # Set quality level (0 - low, 3 - high)
-            max_entities_in_view=1000,  # Adjust based on performance needs
             anti_aliasing=True  # Enable anti-aliasing
         )
 
@@ -27,13 +35,11 @@ class Main:
         # just add the texture= argument to Sky())
         sky = Sky()
         app.sky = sky
+        timer.mark('window')
 
-        # Create player and initialize game components
-        player = Player()
-        menu = MainMenu(player, app)
-
-        # Spawn mobs
-        Mob.spawn_continuous_mobs(player)
+        # The menu goes up first, the player, mobs and spawn area load behind it
+        menu = MainMenu(app)
+        loader = Loader(menu, timer, server_address=args.connect, record=args.record)
 
         app.run()
 
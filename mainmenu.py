@@ -1,13 +1,13 @@
 from ursina import Button
+from ursina import Text
 from ursina import color
 from ursina import application
-from utils import Utils
 
 class MainMenu():
-    def __init__(self, player, app):
-        self.player = player
+    def __init__(self, app):
         self.app = app
-        player.enabled = False
+        self.player = None  # Handed over by the startup loader once the spawn chunk is ready
+        self.start_requested = False  # Start was clicked while still loading
         # Create menu buttons with correct function assignments
         self.start_button = Button(
             text='Start Game',
@@ -23,10 +23,27 @@ class MainMenu():
             position=(0, 0.0),
             on_click=application.quit
         )
+        self.message = Text(text='', origin=(0, 0), position=(0, 0.25), color=color.red)
+
+    def show_error(self, message):
+        # Loading hit a problem the player should hear about. A start clicked while loading is
+        # dropped, they decide again with the message in front of them.
+        self.message.text = message
+        self.start_requested = False
+        self.start_button.text = 'Start Game'
+
+    def set_player(self, player):
+        self.player = player
+        if self.start_requested:
+            self.start_game()
 
     def start_game(self):
-        for box in self.player.boxes:
-            box.enabled = True
+        if self.player is None:
+            # Starts by itself as soon as the spawn chunk is in
+            self.start_requested = True
+            self.start_button.text = 'Loading...'
+            return
         self.player.enabled = True
         self.start_button.enabled = False
-        self.quit_button.enabled = False
\ No newline at end of file
+        self.quit_button.enabled = False
+        self.message.enabled = False
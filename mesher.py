@@ -0,0 +1,271 @@
+import numpy as np
+from world import CHUNK_SIZE, CHUNK_HEIGHT, MIN_Y, SECTION_HEIGHT, SECTIONS, TRANSPARENT_BLOCKS, BLOCK_TEXTURES
+from atlas import TextureAtlas
+
+# Lookup table so a whole neighbour slab can be tested for opacity in one numpy op
+OPAQUE = np.ones(256, dtype=bool)
+OPAQUE[0] = False
+for _block_id in TRANSPARENT_BLOCKS:
+    OPAQUE[_block_id] = False
+
+# (axis, direction) for +x, -x, +y, -y, +z, -z. The face's u/v axes are the next two axes
+# in cyclic order, so u x v always points along +axis.
+DIRECTIONS = [(0, 1), (0, -1), (1, 1), (1, -1), (2, 1), (2, -1)]
+
+# Corner offsets of a quad in (u, v) steps, and its two triangles
+QUAD_DU = np.array([0, 1, 1, 0])
+QUAD_DV = np.array([0, 0, 1, 1])
+QUAD_TRIANGLES = np.array([0, 1, 2, 0, 2, 3])
+
+# Grid axes used as texture (u, v) for faces along x, y and z
+UV_AXES = np.array([(2, 1), (0, 2), (0, 1)])
+
+# Block ID -> bottom left of its tile in the texture atlas
+TILE_ORIGINS = np.zeros((256, 2), dtype=np.float32)
+for _block_id in range(1, len(BLOCK_TEXTURES)):
+    TILE_ORIGINS[_block_id] = TextureAtlas.tile_origin(_block_id)
+
+# Brightness of each light level, and the fixed shade of faces by (axis, direction) so the sides
+# of a block read apart even in full daylight
+LIGHT_BRIGHTNESS = (0.8 ** np.arange(15, -1, -1)).astype(np.float32)
+FACE_SHADE = np.array([(0.8, 0.8), (0.5, 1.0), (0.6, 0.6)], dtype=np.float32)  # [axis][direction > 0]
+FULL_LIGHT = 15
+
+# Section faces for the culling connectivity: -x, +x, -y, +y, -z, +z
+SECTION_FACES = 6
+ALL_FACES = (1 << SECTION_FACES) - 1
+
+# Voxel (x, y, z) spans [x - .5, x + .5] x [y - 1, y] x [z - .5, z + .5] (blocks use origin_y=.5)
+CELL_OFFSET = (-0.5, MIN_Y - 1, -0.5)
+
+
+class ChunkMeshData:
+    # All the faces of one chunk, packed into a single interleaved vertex buffer (position, atlas
+    # UVs, normal, baked light colour) so the whole chunk is one mesh with one texture
+    FORMAT = 'p3f,t4f,n3f,c4f'
+    STRIDE = 14
+
+    def __init__(self):
+        self.quads = []  # (block ID, axis, direction, layer, u, v, u size, v size, light level)
+        self.vertices = None  # float32 [vertex][STRIDE], filled in by pack()
+        self.triangles = None  # uint32 indices
+        self.sections = {}  # Section index -> (first quad, end quad), pack() sorts the quads by section
+        self.connectivity = None  # Per section, which of its faces see each other (see Mesher.connectivity)
+
+    def add_quad(self, block_id, axis, direction, layer, u, v, u_size, v_size, light=FULL_LIGHT):
+        self.quads.append((block_id, axis, direction, layer, u, v, u_size, v_size, light))
+
+    @property
+    def quad_count(self):
+        return len(self.quads)
+
+    def pack(self):
+        # Turns every quad into four vertices in one vectorized pass
+        quads = np.array(self.quads, dtype=np.int32).reshape(-1, 9)
+        # Group the quads by the section they lie in (quads never cross one, see build_padded)
+        section = np.choose(quads[:, 1], (quads[:, 4], quads[:, 3], quads[:, 5])) // SECTION_HEIGHT
+        order = np.argsort(section, kind='stable')
+        quads, section = quads[order], section[order]
+        present, starts = np.unique(section, return_index=True)
+        ends = np.append(starts[1:], len(quads))
+        self.sections = {int(index): (int(start), int(end)) for index, start, end in zip(present, starts, ends)}
+        block_ids, axis, direction, layer, u, v, u_size, v_size, light = quads.T
+        rows = np.arange(len(quads))[:, None]
+        corners = np.arange(4)[None, :]
+
+        # Integer grid corners: the face plane on its axis, the rectangle on the next two axes
+        points = np.zeros((len(quads), 4, 3), dtype=np.int32)
+        points[rows, corners, axis[:, None]] = (layer + (direction > 0))[:, None]
+        points[rows, corners, ((axis + 1) % 3)[:, None]] = u[:, None] + QUAD_DU * u_size[:, None]
+        points[rows, corners, ((axis + 2) % 3)[:, None]] = v[:, None] + QUAD_DV * v_size[:, None]
+
+        # Textures repeat once per voxel, with world y as "up" on the sides
+        uvs = np.stack((points[rows, corners, UV_AXES[axis, 0][:, None]], points[rows, corners, UV_AXES[axis, 1][:, None]]), axis=-1)
+
+        # Ursina is left handed: front faces wind clockwise when seen from the normal's side
+        flip = direction > 0
+        points[flip] = points[flip, ::-1]
+        uvs[flip] = uvs[flip, ::-1]
+
+        normals = np.zeros((len(quads), 3), dtype=np.float32)
+        normals[rows[:, 0], axis] = direction
+
+        brightness = LIGHT_BRIGHTNESS[light] * FACE_SHADE[axis, (direction > 0).astype(np.int64)]
+
+        vertices = np.empty((len(quads), 4, self.STRIDE), dtype=np.float32)
+        vertices[:, :, 0:3] = points + CELL_OFFSET
+        vertices[:, :, 3:5] = uvs
+        vertices[:, :, 5:7] = TILE_ORIGINS[block_ids][:, None, :]
+        vertices[:, :, 7:10] = normals[:, None, :]
+        vertices[:, :, 10:13] = brightness[:, None, None]
+        vertices[:, :, 13] = 1.0
+        self.vertices = vertices.reshape(-1, self.STRIDE)
+        self.triangles = (rows * 4 + QUAD_TRIANGLES).astype(np.uint32).ravel()
+        return self
+
+    def section_buffers(self, index):
+        # (vertices, triangles) of just one section's quads, indexed from zero
+        start, end = self.sections[index]
+        triangles = (np.arange(end - start)[:, None] * 4 + QUAD_TRIANGLES).astype(np.uint32).ravel()
+        return self.vertices[start * 4:end * 4], triangles
+
+
+class Mesher:
+    @staticmethod
+    def voxels(chunk):
+        # View the chunk bytes as [x][y][z] without copying
+        return np.frombuffer(chunk.blocks, dtype=np.uint8).reshape(CHUNK_HEIGHT, CHUNK_SIZE, CHUNK_SIZE).transpose(2, 0, 1)
+
+    @staticmethod
+    def padded_voxels(world, chunk):
+        # One voxel of border on every side, filled from loaded neighbours. Missing neighbours
+        # count as air so the edge of the loaded world stays closed.
+        padded = np.zeros((CHUNK_SIZE + 2, CHUNK_HEIGHT + 2, CHUNK_SIZE + 2), dtype=np.uint8)
+        padded[1:-1, 1:-1, 1:-1] = Mesher.voxels(chunk)
+        chunk_x, chunk_z = chunk.key
+        neighbours = [
+            (0, slice(1, -1), Mesher.border(world, (chunk_x - 1, chunk_z), 0, -1)),
+            (-1, slice(1, -1), Mesher.border(world, (chunk_x + 1, chunk_z), 0, 0)),
+            (slice(1, -1), 0, Mesher.border(world, (chunk_x, chunk_z - 1), 2, -1)),
+            (slice(1, -1), -1, Mesher.border(world, (chunk_x, chunk_z + 1), 2, 0)),
+        ]
+        for x_index, z_index, border in neighbours:
+            if border is not None:
+                padded[x_index, 1:-1, z_index] = border
+        return padded
+
+    @staticmethod
+    def border(world, chunk_key, axis, index):
+        neighbour = world.get_chunk(chunk_key)
+        if neighbour is None:
+            return None
+        voxels = Mesher.voxels(neighbour)
+        return voxels[index] if axis == 0 else voxels[:, :, index]
+
+    @staticmethod
+    def build(world, chunk, greedy=True, light=None):
+        # Returns the chunk's ChunkMeshData in chunk-local coordinates
+        return Mesher.build_padded(Mesher.padded_voxels(world, chunk), greedy, light)
+
+    @staticmethod
+    def build_padded(padded, greedy=True, light=None):
+        # Works only on its own copy of the voxels (and light, padded the same way, see
+        # LightEngine.mesh_light), so it can run on a worker. No light means full daylight.
+        voxels = padded[1:-1, 1:-1, 1:-1]
+        mesh = ChunkMeshData()
+
+        for axis, direction in DIRECTIONS:
+            shift = [slice(1, -1)] * 3
+            shift[axis] = slice(1 + direction, padded.shape[axis] - 1 + direction)
+            neighbour = padded[tuple(shift)]
+            # Air has no faces of its own, whatever is next to it
+            hidden = OPAQUE[neighbour] | (neighbour == voxels) | (voxels == 0)
+            # A face is lit by the cell in front of it. Faces only merge with equally lit ones,
+            # so the light level rides along above the block ID.
+            front_light = FULL_LIGHT if light is None else light[tuple(shift)].astype(np.int32)
+            faces = np.where(hidden, 0, voxels.astype(np.int32) | (front_light << 8))
+
+            for layer in np.flatnonzero(faces.any(axis=tuple(a for a in range(3) if a != axis))):
+                # Side faces are merged one section at a time, so every quad stays inside the
+                # section that gets culled with it
+                if axis == 0:
+                    masks = [(faces[layer, bottom:bottom + SECTION_HEIGHT], bottom, 0) for bottom in range(0, CHUNK_HEIGHT, SECTION_HEIGHT)]
+                elif axis == 1:
+                    masks = [(faces[:, layer, :].T, 0, 0)]
+                else:
+                    masks = [(faces[:, bottom:bottom + SECTION_HEIGHT, layer], 0, bottom) for bottom in range(0, CHUNK_HEIGHT, SECTION_HEIGHT)]
+                for mask, u_offset, v_offset in masks:
+                    if not mask.any():
+                        continue
+                    for face, u, v, u_size, v_size in Mesher.merge_faces(mask.tolist(), greedy):
+                        mesh.add_quad(face & 0xff, axis, direction, int(layer), u + u_offset, v + v_offset, u_size, v_size, face >> 8)
+
+        mesh.connectivity = Mesher.connectivity(voxels)
+        return mesh.pack()
+
+    @staticmethod
+    def connectivity(voxels):
+        # Flood fills the see-through cells of every section and returns, per section, a bitmask per
+        # face (-x, +x, -y, +y, -z, +z) of the faces it reaches. Culling uses it to skip sections
+        # that can't be seen through, like everything under solid ground.
+        sections = ~OPAQUE[voxels].reshape(CHUNK_SIZE, SECTIONS, SECTION_HEIGHT, CHUNK_SIZE).transpose(1, 0, 2, 3)
+        open_counts = sections.reshape(SECTIONS, -1).sum(axis=1)
+        result = [(0,) * SECTION_FACES if count == 0 else (ALL_FACES,) * SECTION_FACES for count in open_counts.tolist()]
+        mixed = [index for index, count in enumerate(open_counts.tolist()) if 0 < count < sections[0].size]
+        if not mixed:
+            return result
+
+        # Every open cell takes the smallest label among its open neighbours until nothing changes,
+        # with pointer jumping so long winding caves don't need one pass per cell
+        cells = sections[mixed]
+        closed = np.iinfo(np.int32).max
+        labels = np.where(cells, np.arange(cells.size, dtype=np.int32).reshape(cells.shape), closed)
+        while True:
+            previous = labels
+            labels = labels.copy()
+            for axis in (1, 2, 3):
+                low = [slice(None)] * 4
+                high = [slice(None)] * 4
+                low[axis] = slice(None, -1)
+                high[axis] = slice(1, None)
+                low, high = tuple(low), tuple(high)
+                np.minimum(labels[low], previous[high], out=labels[low])
+                np.minimum(labels[high], previous[low], out=labels[high])
+            labels[~cells] = closed
+            flat = labels.ravel()
+            open_labels = flat[flat != closed]
+            flat[flat != closed] = flat[open_labels]
+            if np.array_equal(labels, previous):
+                break
+
+        face_slices = [(0, slice(None), slice(None)), (-1, slice(None), slice(None)), (slice(None), 0, slice(None)),
+                       (slice(None), -1, slice(None)), (slice(None), slice(None), 0), (slice(None), slice(None), -1)]
+        for position, index in enumerate(mixed):
+            face_labels = []
+            for face_slice in face_slices:
+                face = labels[position][face_slice]
+                face_labels.append(np.unique(face[face != closed]))
+            masks = []
+            for face, own in enumerate(face_labels):
+                mask = 0
+                if len(own):
+                    for other, other_labels in enumerate(face_labels):
+                        if other == face or np.intersect1d(own, other_labels, assume_unique=True).size:
+                            mask |= 1 << other
+                masks.append(mask)
+            result[index] = tuple(masks)
+        return result
+
+    @staticmethod
+    def merge_faces(mask, greedy=True):
+        # Greedy rectangle merging of equal, non-zero IDs in a 2D mask[u][v]
+        rows = len(mask)
+        columns = len(mask[0])
+        for u in range(rows):
+            row = mask[u]
+            if not any(row):
+                continue
+            v = 0
+            while v < columns:
+                block_id = row[v]
+                if block_id == 0:
+                    v += 1
+                    continue
+
+                v_size = 1
+                if greedy:
+                    while v + v_size < columns and row[v + v_size] == block_id:
+                        v_size += 1
+
+                u_size = 1
+                if greedy:
+                    while u + u_size < rows and all(mask[u + u_size][k] == block_id for k in range(v, v + v_size)):
+                        u_size += 1
+
+                for du in range(u_size):
+                    merged_row = mask[u + du]
+                    for k in range(v, v + v_size):
+                        merged_row[k] = 0
+
+                yield block_id, u, v, u_size, v_size
+                v += v_size
@@ -0,0 +1,120 @@
+import numpy as np
+from ursina import Entity, Vec3, time
+from mob import Mob
+from mobsim import MobSimulation, FREE, ALIVE, DYING
+from profiler import profiler
+from protocol import MOBS
+
+HOSTILE_TEXTURE = "textures/zombie.png"
+PASSIVE_TEXTURE = "textures/sheep.png"
+
+
+class MobManager(Entity):
+    # Draws the mobs of a MobSimulation. Single player runs the simulation right here; connected to
+    # a world server, the server runs it and this mirrors the snapshots it sends. Mob entities are
+    # only views, pooled one per slot and recycled instead of being created and destroyed.
+    def __init__(self, player, max_mobs=20, tick_rate=20, spawn_interval=(5, 10), client=None):
+        super().__init__()
+        self.player = player
+        if client is not None:
+            max_mobs = client.max_mobs  # Slot for slot with the server's population
+        self.sim = MobSimulation(player.world, max_mobs=max_mobs, tick_rate=tick_rate, spawn_interval=spawn_interval)
+        self.client = client  # WorldClient when the server owns the mobs
+        self.pool = [None] * max_mobs  # Slot -> Mob entity, created the first time the slot is used
+        self.textures = [None] * max_mobs  # Texture each pooled entity currently shows
+        if client is not None:
+            client.handlers[MOBS] = self.receive
+
+    # The simulation arrays, views and benchmarks index them by slot
+    @property
+    def max_mobs(self):
+        return self.sim.max_mobs
+
+    @property
+    def tick_time(self):
+        return self.sim.tick_time
+
+    @property
+    def positions(self):
+        return self.sim.positions
+
+    @property
+    def health(self):
+        return self.sim.health
+
+    @property
+    def state(self):
+        return self.sim.state
+
+    @property
+    def hostile(self):
+        return self.sim.hostile
+
+    @property
+    def speed(self):
+        return self.sim.speed
+
+    @property
+    def alive_count(self):
+        return self.sim.alive_count
+
+    def update(self):
+        if not self.player.enabled or self.client is not None:
+            return
+        with profiler.scope('mobs'):
+            self.step()
+
+    def step(self):
+        hits, ticks = self.sim.step(time.dt, self.player_positions())
+        profiler.count('mob ticks', ticks)
+        if hits[0]:
+            self.player.decrease_health(int(hits[0]))
+        if ticks:
+            self.sync_entities()
+
+    def player_positions(self):
+        return np.array(((self.player.x, self.player.y, self.player.z),))
+
+    def tick(self, dt):
+        hits = self.sim.tick(dt, self.player_positions())
+        if hits[0]:
+            self.player.decrease_health(int(hits[0]))
+
+    def receive(self, slots, states, hostile, positions, health):
+        # Mob snapshot from the server, replaces the whole population
+        self.sim.state[:] = FREE
+        self.sim.state[slots] = states
+        self.sim.hostile[slots] = hostile
+        self.sim.positions[slots] = positions
+        self.sim.health[slots] = health
+        self.sync_entities()
+
+    def sync_entities(self):
+        # Entities follow their slots: shown with the right texture while in use, pooled once free
+        active = self.sim.state != FREE
+        for slot, position in zip(np.flatnonzero(active).tolist(), self.sim.positions[active].tolist()):
+            mob = self.pool[slot]
+            if mob is None:
+                mob = self.pool[slot] = Mob(self, slot)
+            texture = HOSTILE_TEXTURE if self.sim.hostile[slot] else PASSIVE_TEXTURE
+            if self.textures[slot] != texture:
+                mob.texture = self.textures[slot] = texture
+            mob.position = Vec3(*position)
+            mob.enabled = True
+        for slot in np.flatnonzero(~active).tolist():
+            if self.pool[slot] is not None and self.pool[slot].enabled:
+                self.pool[slot].enabled = False
+
+    def damage_mob(self, slot, damage_amount):
+        if self.client is not None:
+            self.client.damage_mob(slot, damage_amount)
+        else:
+            self.sim.damage_mob(slot, damage_amount)
+
+    def hit_boxes(self):
+        # (mob, min corner, max corner) of every live mob, for the crosshair ray test
+        return [
+            (self.pool[slot], tuple(self.sim.positions[slot] - 0.5), tuple(self.sim.positions[slot] + 0.5))
+            for slot in np.flatnonzero(self.sim.state == ALIVE).tolist()
+            if self.pool[slot] is not None
+        ]
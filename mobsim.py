@@ -0,0 +1,226 @@
+import math
+import random
+import numpy as np
+from pathfinding import Pathfinder, SOLID
+from world import CHUNK_SIZE, CHUNK_HEIGHT, MIN_Y
+
+GRAVITY = 32  # Blocks per second squared, same as the player
+JUMP_SPEED = math.sqrt(2 * GRAVITY * 1.25)  # Clears one block
+EPSILON = 1e-4
+
+# Mob states
+FREE = 0  # Slot is in the pool
+ALIVE = 1
+DYING = 2  # Dead, waiting for the death delay before going back to the pool
+
+
+class MobSimulation:
+    # Every mob's state in arrays indexed by slot, advanced by one vectorized tick at a fixed rate.
+    # No scene objects, so it runs the same inside the game and in the headless world server.
+    # Each mob reacts to whichever player is nearest to it, hostile ones walk the flow field
+    # towards that player and jump where it climbs. Mobs are unit cubes centred on their position.
+    def __init__(self, world, max_mobs=20, tick_rate=20, spawn_interval=(5, 10)):
+        self.world = world
+        self.max_mobs = max_mobs  # Population cap, also the size of every array
+        self.tick_time = 1 / tick_rate
+        self.spawn_interval = spawn_interval
+        self.accumulator = 0.0
+        self.spawn_timer = 0.0  # Spawn the first mob straight away
+        self.rng = np.random.default_rng()
+
+        self.max_follow_distance = 10
+        self.despawn_distance = self.max_follow_distance + 5
+        self.damage = 10
+        self.attack_cooldown = 1.0  # Seconds between hits from the same mob
+        self.death_delay = 1.0
+
+        self.positions = np.zeros((max_mobs, 3))
+        self.velocities = np.zeros((max_mobs, 3))
+        self.health = np.zeros(max_mobs)
+        self.state = np.zeros(max_mobs, dtype=np.uint8)
+        self.hostile = np.zeros(max_mobs, dtype=bool)
+        self.speed = np.zeros(max_mobs)  # Units per second
+        self.following = np.zeros(max_mobs, dtype=bool)
+        self.grounded = np.zeros(max_mobs, dtype=bool)
+        self.timers = np.zeros(max_mobs)  # Attack cooldown while alive, death delay while dying
+
+        # Routes around the terrain, shared by every mob chasing the same player
+        self.paths = Pathfinder(world, radius=self.despawn_distance + 1)
+
+    @property
+    def alive_count(self):
+        return int(np.count_nonzero(self.state == ALIVE))
+
+    def step(self, dt, players):
+        # Advances the simulation by a frame of dt seconds around the (n, 3) player positions.
+        # Returns the damage dealt to each player, and how many ticks ran.
+        hits = np.zeros(len(players))
+        if not len(players):
+            return hits, 0
+
+        self.spawn_timer -= dt
+        if self.spawn_timer <= 0:
+            x, _, z = players[random.randrange(len(players))]
+            self.spawn(x, z)
+            self.spawn_timer = random.uniform(*self.spawn_interval)
+
+        # Fixed timestep, decoupled from the frame rate. Cap the catch-up after a long stall.
+        self.accumulator = min(self.accumulator + dt, self.tick_time * 5)
+        ticks = 0
+        while self.accumulator >= self.tick_time:
+            hits += self.tick(self.tick_time, players)
+            self.accumulator -= self.tick_time
+            ticks += 1
+        return hits, ticks
+
+    def spawn(self, near_x, near_z):
+        # Returns the slot of a new mob somewhere around (near_x, near_z), or None
+        free = np.flatnonzero(self.state == FREE)
+        if not len(free):
+            return None  # At the population cap
+
+        x = near_x + random.uniform(-10, 10)
+        z = near_z + random.uniform(-10, 10)
+        block_x, block_z = round(x), round(z)
+        top = self.world.top_block(block_x, block_z)
+        if top is None:
+            return None  # Column isn't loaded (or is empty), try again next time
+
+        hostile = random.choice([True, False])
+        slot = int(free[0])
+        self.positions[slot] = (x, top + 0.5, z)
+        self.velocities[slot] = 0
+        self.health[slot] = 15 if hostile else 10
+        self.hostile[slot] = hostile
+        self.speed[slot] = 0.48 if hostile else 0.36
+        self.following[slot] = False
+        self.grounded[slot] = True
+        self.timers[slot] = 0
+        self.state[slot] = ALIVE
+        return slot
+
+    def tick(self, dt, players):
+        # One fixed step. Returns the contact damage dealt to each player.
+        players = np.asarray(players, dtype=np.float64).reshape(-1, 3)
+        alive = self.state == ALIVE
+        # Everything below works against the player nearest to each mob
+        player_offsets = players[None, :, :] - self.positions[:, None, :]
+        player_distances = np.linalg.norm(player_offsets, axis=2)
+        nearest = player_distances.argmin(axis=1)
+        slots = np.arange(self.max_mobs)
+        offsets = player_offsets[slots, nearest]
+        distances = player_distances[slots, nearest]
+
+        # Hostile mobs within range follow the flow field to the player, passive ones wander
+        chasing = alive & self.hostile & (distances < self.max_follow_distance)
+        self.following = (self.following | chasing) & ~(distances > self.max_follow_distance + 2) & alive
+        flat = offsets.copy()
+        flat[:, 1] = 0
+        jump = self.steer(flat, chasing, nearest, players)
+        flat_length = np.linalg.norm(flat, axis=1)
+        towards = np.divide(flat, flat_length[:, None], out=np.zeros_like(flat), where=flat_length[:, None] > 0)
+
+        wander = alive & ~self.hostile
+        random_steps = self.rng.uniform(-1, 1, (self.max_mobs, 3))
+        random_steps[:, 1] = 0
+
+        # Only the flat part is steered, the vertical part is the mobs' own jumps and falls
+        walk = np.zeros((self.max_mobs, 3))
+        walk[chasing] = towards[chasing] * self.speed[chasing, None]
+        walk[wander] = random_steps[wander] * self.speed[wander, None]
+        self.velocities[:, [0, 2]] = walk[:, [0, 2]]
+        self.move(np.flatnonzero(alive), jump, dt)
+
+        # Contact damage: mob cube overlapping the player's box, once per cooldown
+        self.timers[alive] -= dt
+        touching = alive & (np.abs(offsets[:, 0]) < 0.9) & (np.abs(offsets[:, 2]) < 0.9) & \
+            (offsets[:, 1] < 0.5) & (offsets[:, 1] > -2.3) & (self.timers <= 0)
+        self.timers[touching] = self.attack_cooldown
+        hits = np.bincount(nearest[touching], minlength=len(players)) * self.damage
+
+        # Too far away or out of health: start dying, once
+        dead = alive & ((distances > self.despawn_distance) | (self.health <= 0))
+        self.state[dead] = DYING
+        self.timers[dead] = self.death_delay
+
+        # Finished dying: back to the pool
+        dying = self.state == DYING
+        self.timers[dying & ~dead] -= dt
+        self.state[dying & (self.timers <= 0)] = FREE
+        return hits
+
+    def steer(self, flat, chasing, nearest, players):
+        # Points the chasers' flat offsets at the next column of their player's flow field, so they
+        # walk around what they can't climb. Returns which of them need to jump for that step.
+        jump = np.zeros(self.max_mobs, dtype=bool)
+        self.paths.retain([Pathfinder.column(x, z) for x, _, z in players.tolist()])
+        for player in np.unique(nearest[chasing]).tolist():
+            field = self.paths.field(players[player, 0], players[player, 2])
+            slots = np.flatnonzero(chasing & (nearest == player))
+            routed, next_x, next_z, jump[slots] = field.steer(self.positions[slots, 0], self.positions[slots, 2])
+            # No route (out of the field, or already next to the player): straight at the player
+            routed_slots = slots[routed]
+            flat[routed_slots, 0] = next_x[routed] - self.positions[routed_slots, 0]
+            flat[routed_slots, 2] = next_z[routed] - self.positions[routed_slots, 2]
+        return jump
+
+    def columns(self, x, z):
+        # Block IDs of the voxel columns under arrays of positions, [y][mob], and which are loaded
+        cells_x = np.floor(x + 0.5).astype(np.int64)
+        cells_z = np.floor(z + 0.5).astype(np.int64)
+        columns = np.zeros((CHUNK_HEIGHT, len(cells_x)), dtype=np.uint8)
+        loaded = np.zeros(len(cells_x), dtype=bool)
+        chunks_x, chunks_z = cells_x // CHUNK_SIZE, cells_z // CHUNK_SIZE
+        for chunk_key in set(zip(chunks_x.tolist(), chunks_z.tolist())):
+            chunk = self.world.chunks.get(chunk_key)
+            if chunk is None:
+                continue
+            group = (chunks_x == chunk_key[0]) & (chunks_z == chunk_key[1])
+            view = np.frombuffer(chunk.blocks, dtype=np.uint8).reshape(CHUNK_HEIGHT, CHUNK_SIZE, CHUNK_SIZE)
+            columns[:, group] = view[:, cells_z[group] % CHUNK_SIZE, cells_x[group] % CHUNK_SIZE]
+            loaded[group] = True
+        return columns, loaded
+
+    def move(self, slots, jump, dt):
+        # Moves mobs through the voxels: walls stop the flat move, grounded mobs jump where their
+        # route climbs (or anything walks into a wall), then gravity drops them onto the floor.
+        # Mobs in columns that aren't loaded just keep their height.
+        if not len(slots):
+            return
+        old = self.positions[slots]
+        new = old + self.velocities[slots] * dt
+        rows = np.arange(len(slots))
+        # The voxel a mob's body is in: the one just above the block it's standing on
+        body = np.clip(np.floor(old[:, 1] - 0.5 + EPSILON).astype(np.int64) + 1 - MIN_Y, 0, CHUNK_HEIGHT - 1)
+        columns, loaded = self.columns(new[:, 0], new[:, 2])
+        blocked = loaded & SOLID[columns[body, rows]]
+        if blocked.any():
+            new[blocked, 0] = old[blocked, 0]
+            new[blocked, 2] = old[blocked, 2]
+            columns[:, blocked], loaded[blocked] = self.columns(old[blocked, 0], old[blocked, 2])
+
+        launch = self.grounded[slots] & (jump[slots] | blocked)
+        self.velocities[slots[launch], 1] = JUMP_SPEED
+        vertical = self.velocities[slots, 1]
+        falling = loaded & (launch | ~self.grounded[slots])
+        vertical[falling] -= GRAVITY * dt
+        vertical[~loaded] = 0
+        new[:, 1] = old[:, 1] + vertical * dt
+
+        # Land on the highest solid block under the body, columns that are all air have no floor
+        below = SOLID[columns] & (np.arange(CHUNK_HEIGHT)[:, None] < body[None, :])
+        floor = np.where(below.any(axis=0), CHUNK_HEIGHT - 1 - below[::-1].argmax(axis=0) + MIN_Y, -np.inf)
+        landed = loaded & (new[:, 1] - 0.5 <= floor + EPSILON) & (vertical <= 0)
+        new[landed, 1] = floor[landed] + 0.5
+        vertical[landed] = 0
+        # Walking off a ledge starts a fall
+        self.grounded[slots] = landed | (~loaded & self.grounded[slots])
+        self.velocities[slots, 1] = vertical
+        self.positions[slots] = new
+
+    def damage_mob(self, slot, damage_amount):
+        if not 0 <= slot < self.max_mobs or self.state[slot] != ALIVE:
+            return
+        self.health[slot] -= damage_amount
+        if self.health[slot] > 0:
+            print(f"Mob received {damage_amount} damage! Health: {self.health[slot]:g}")
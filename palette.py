@@ -0,0 +1,80 @@
+import numpy as np
+from world import CHUNK_VOLUME, CHUNK_SIZE, SECTION_HEIGHT, SECTIONS
+
+SECTION_VOLUME = CHUNK_SIZE * CHUNK_SIZE * SECTION_HEIGHT
+INDEX_BITS = (1, 2, 4, 8)  # Index widths, powers of two so an index never straddles a byte
+
+
+class SectionPalette:
+    # Compact form of a chunk's voxels, like Minecraft's section palettes: each 16-high section
+    # lists the block IDs it uses, and its voxels become indices into that list packed into just
+    # enough bits. A section of one block (all air, all stone) is two bytes, one with stone and a
+    # few ores or dirt a quarter of the raw size. Chunks stay a flat bytearray while loaded,
+    # since meshing and lighting index it directly; this is the form they're kept in while
+    # cached and sent in over the network.
+    #
+    # Per section: index bits (0 for a single block), palette length - 1, the palette, then
+    # SECTION_VOLUME indices packed lowest bits first.
+    @staticmethod
+    def index_bits(palette_size):
+        if palette_size == 1:
+            return 0
+        return next(bits for bits in INDEX_BITS if palette_size <= 1 << bits)
+
+    @staticmethod
+    def encode(blocks):
+        sections = np.frombuffer(blocks, dtype=np.uint8).reshape(SECTIONS, SECTION_VOLUME)
+        # Which IDs each section uses, counted for all of them in one pass
+        used = np.bincount((sections + (np.arange(SECTIONS, dtype=np.uint16) << 8)[:, None]).ravel(), minlength=SECTIONS * 256).reshape(SECTIONS, 256) > 0
+        remap = np.zeros(256, dtype=np.uint8)
+        parts = []
+        for section, section_used in zip(sections, used):
+            palette = np.flatnonzero(section_used).astype(np.uint8)
+            bits = SectionPalette.index_bits(len(palette))
+            parts.append(bytes((bits, len(palette) - 1)))
+            parts.append(palette.tobytes())
+            if bits:
+                remap[palette] = np.arange(len(palette), dtype=np.uint8)
+                indices = remap[section]
+                if bits < 8:
+                    # Pack 8 // bits neighbouring indices into each byte
+                    columns = indices.reshape(-1, 8 // bits)
+                    indices = columns[:, 0].copy()
+                    for column in range(1, 8 // bits):
+                        indices |= columns[:, column] << (column * bits)
+                parts.append(indices.tobytes())
+        return b''.join(parts)
+
+    @staticmethod
+    def decode(data):
+        # Fresh bytearray of the chunk's voxels, raises ValueError if the data doesn't add up
+        data = memoryview(data)
+        blocks = bytearray(CHUNK_VOLUME)
+        sections = np.frombuffer(blocks, dtype=np.uint8).reshape(SECTIONS, SECTION_VOLUME)
+        offset = 0
+        for section in sections:
+            if offset + 2 > len(data):
+                raise ValueError("Chunk data ends mid section")
+            bits, palette_size = data[offset], data[offset + 1] + 1
+            offset += 2
+            if bits != SectionPalette.index_bits(palette_size):
+                raise ValueError(f"Section of {palette_size} blocks can't use {bits} bit indices")
+            palette = np.frombuffer(data, dtype=np.uint8, count=palette_size, offset=offset) if offset + palette_size <= len(data) else None
+            offset += palette_size
+            packed_size = SECTION_VOLUME * bits // 8
+            if palette is None or offset + packed_size > len(data):
+                raise ValueError("Chunk data ends mid section")
+            if not bits:
+                section[:] = palette[0]
+                continue
+            indices = np.frombuffer(data, dtype=np.uint8, count=packed_size, offset=offset)
+            offset += packed_size
+            if bits < 8:
+                shifts = np.arange(0, 8, bits, dtype=np.uint8)
+                indices = ((indices[:, None] >> shifts) & ((1 << bits) - 1)).reshape(-1)
+            if indices.max() >= palette_size:
+                raise ValueError("Section index is outside its palette")
+            section[:] = palette[indices]
+        if offset != len(data):
+            raise ValueError(f"{len(data) - offset} bytes left over after the last section")
+        return blocks
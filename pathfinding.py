@@ -0,0 +1,130 @@
+import math
+from collections import deque
+import numpy as np
+from world import CHUNK_SIZE, CHUNK_HEIGHT, MIN_Y, SOLID_BLOCKS
+
+MAX_CLIMB = 1  # Blocks a mob can jump up in one step
+MAX_DROP = 3  # Blocks it will step down
+NO_GROUND = MIN_Y - 1000  # Height of columns with nothing to stand on, or not loaded
+
+# Block ID -> collides, so a whole slab of voxels is tested in one numpy op
+SOLID = np.zeros(256, dtype=bool)
+SOLID[list(SOLID_BLOCKS)] = True
+
+STEPS = [(1, 0), (-1, 0), (0, 1), (0, -1)]
+
+
+class FlowField:
+    # Walking route towards one target column from every column within `radius` of it, found with
+    # a single breadth first search over the surface heightmap. A column can be walked from to a
+    # neighbour at most MAX_CLIMB higher (with a jump) or MAX_DROP lower. Each column keeps the
+    # neighbour to step to next, and whether that step needs a jump, so any number of mobs can
+    # follow the field by lookup.
+    def __init__(self, world, target_x, target_z, radius):
+        self.target = (target_x, target_z)
+        self.size = 2 * radius + 1
+        self.origin_x = target_x - radius
+        self.origin_z = target_z - radius
+        # Chunks the heightmap was read from, with their revision at the time
+        self.sources = {}
+        for chunk_x in range(self.origin_x // CHUNK_SIZE, (self.origin_x + self.size - 1) // CHUNK_SIZE + 1):
+            for chunk_z in range(self.origin_z // CHUNK_SIZE, (self.origin_z + self.size - 1) // CHUNK_SIZE + 1):
+                chunk = world.chunks.get((chunk_x, chunk_z))
+                self.sources[(chunk_x, chunk_z)] = (chunk, chunk.revision if chunk else None)
+        self.heights = self.surface()
+        self.build()
+
+    def surface(self):
+        # [x][z] height of the top solid block of each column, like WorldGen's heightmap
+        heights = np.full((self.size, self.size), NO_GROUND, dtype=np.int32)
+        for (chunk_x, chunk_z), (chunk, _) in self.sources.items():
+            if chunk is None:
+                continue
+            x0 = max(self.origin_x, chunk_x * CHUNK_SIZE)
+            x1 = min(self.origin_x + self.size, (chunk_x + 1) * CHUNK_SIZE)
+            z0 = max(self.origin_z, chunk_z * CHUNK_SIZE)
+            z1 = min(self.origin_z + self.size, (chunk_z + 1) * CHUNK_SIZE)
+            view = np.frombuffer(chunk.blocks, dtype=np.uint8).reshape(CHUNK_HEIGHT, CHUNK_SIZE, CHUNK_SIZE)
+            solid = SOLID[view[:, z0 - chunk_z * CHUNK_SIZE:z1 - chunk_z * CHUNK_SIZE, x0 - chunk_x * CHUNK_SIZE:x1 - chunk_x * CHUNK_SIZE]]
+            top = CHUNK_HEIGHT - 1 - solid[::-1].argmax(axis=0) + MIN_Y
+            heights[x0 - self.origin_x:x1 - self.origin_x, z0 - self.origin_z:z1 - self.origin_z] = np.where(solid.any(axis=0), top, NO_GROUND).T
+        return heights
+
+    def build(self):
+        # Breadth first out from the target, along steps a mob could take towards it
+        size = self.size
+        heights = self.heights.ravel().tolist()
+        distance = [-1] * (size * size)
+        next_cell = list(range(size * size))
+        target = (size // 2) * size + size // 2
+        if heights[target] != NO_GROUND:
+            distance[target] = 0
+            queue = deque([target])
+            while queue:
+                cell = queue.popleft()
+                x, z = divmod(cell, size)
+                height = heights[cell]
+                for dx, dz in STEPS:
+                    nx, nz = x + dx, z + dz
+                    if not (0 <= nx < size and 0 <= nz < size):
+                        continue
+                    neighbour = nx * size + nz
+                    if distance[neighbour] >= 0 or heights[neighbour] == NO_GROUND:
+                        continue
+                    # A mob on the neighbour walks onto this cell
+                    if height - heights[neighbour] <= MAX_CLIMB and heights[neighbour] - height <= MAX_DROP:
+                        distance[neighbour] = distance[cell] + 1
+                        next_cell[neighbour] = cell
+                        queue.append(neighbour)
+        self.distance = np.array(distance, dtype=np.int32).reshape(size, size)
+        next_cell = np.array(next_cell, dtype=np.int32)
+        self.next_x, self.next_z = (a.reshape(size, size) for a in np.divmod(next_cell, size))
+        self.jump = (self.heights.ravel()[next_cell] > self.heights.ravel()).reshape(size, size)
+
+    def is_current(self, world):
+        # Still matches the blocks: the same chunks are loaded and none of them has changed
+        for chunk_key, (chunk, revision) in self.sources.items():
+            current = world.chunks.get(chunk_key)
+            if current is not chunk or (chunk is not None and chunk.revision != revision):
+                return False
+        return True
+
+    def steer(self, x, z):
+        # For arrays of positions: which have a route, the centre of the column to head for next,
+        # and whether getting there takes a jump. The target column itself has no next step.
+        cells_x = np.floor(x + 0.5).astype(np.int64) - self.origin_x
+        cells_z = np.floor(z + 0.5).astype(np.int64) - self.origin_z
+        inside = (cells_x >= 0) & (cells_x < self.size) & (cells_z >= 0) & (cells_z < self.size)
+        cells_x = np.clip(cells_x, 0, self.size - 1)
+        cells_z = np.clip(cells_z, 0, self.size - 1)
+        routed = inside & (self.distance[cells_x, cells_z] > 0)
+        next_x = self.next_x[cells_x, cells_z] + self.origin_x
+        next_z = self.next_z[cells_x, cells_z] + self.origin_z
+        return routed, next_x, next_z, routed & self.jump[cells_x, cells_z]
+
+
+class Pathfinder:
+    # Shared route finding for mobs: one FlowField per target column, reused until the target
+    # moves to another column or a block in its area changes. Every mob chasing the same player
+    # reads the same field, so an update costs the area of the field however many are chasing.
+    def __init__(self, world, radius=16):
+        self.world = world
+        self.radius = radius
+        self.fields = {}  # Target column -> FlowField
+        self.builds = 0
+
+    @staticmethod
+    def column(x, z):
+        return math.floor(x + 0.5), math.floor(z + 0.5)
+
+    def field(self, x, z):
+        target = self.column(x, z)
+        field = self.fields.get(target)
+        if field is None or not field.is_current(self.world):
+            field = self.fields[target] = FlowField(self.world, *target, self.radius)
+            self.builds += 1
+        return field
+
+    def retain(self, targets):
+        # Forget the fields of every other target column, e.g. the ones players have left
+        self.fields = {target: field for target, field in self.fields.items() if target in targets}
@@ -0,0 +1,116 @@
+import math
+from world import CHUNK_SIZE, MIN_Y, MAX_Y, SOLID_BLOCKS
+
+# Voxel (x, y, z) spans [x - .5, x + .5] x [y - 1, y] x [z - .5, z + .5], so a coordinate plus
+# its axis' shift floors to the cell index
+CELL_SHIFT = (0.5, 1.0, 0.5)
+EPSILON = 1e-4  # Gap kept to a face after hitting it, so resting contact never counts as overlap
+
+
+class VoxelBody:
+    # Axis aligned box moved through the chunk voxels. Every axis is swept on its own against the
+    # solid cells the box would pass through, so collision only costs a handful of voxel lookups
+    # however many blocks are loaded. Positions are the bottom centre of the box.
+    def __init__(self, world, width=0.6, height=1.8, step_height=1.0):
+        self.world = world
+        self.half_width = width / 2
+        self.height = height
+        self.step_height = step_height  # Ledges up to this high are walked up without jumping
+        self.velocity_y = 0.0
+        self.grounded = False
+
+    def solid(self, x, y, z):
+        chunk = self.world.chunks.get((x // CHUNK_SIZE, z // CHUNK_SIZE))
+        if chunk is None:
+            return True  # Not streamed in yet, walls it off instead of letting the player fall in
+        if not MIN_Y <= y < MAX_Y:
+            return False
+        return chunk.blocks[chunk.index(x % CHUNK_SIZE, y, z % CHUNK_SIZE)] in SOLID_BLOCKS
+
+    def bounds(self, position):
+        x, y, z = position
+        return (x - self.half_width, y, z - self.half_width), (x + self.half_width, y + self.height, z + self.half_width)
+
+    @staticmethod
+    def cell_range(low, high, axis):
+        # Cells the open interval (low, high) overlaps on an axis
+        shift = CELL_SHIFT[axis]
+        return range(math.floor(low + shift + EPSILON), math.floor(high + shift - EPSILON) + 1)
+
+    def overlaps(self, position):
+        low, high = self.bounds(position)
+        return any(
+            self.solid(x, y, z)
+            for x in self.cell_range(low[0], high[0], 0)
+            for y in self.cell_range(low[1], high[1], 1)
+            for z in self.cell_range(low[2], high[2], 2)
+        )
+
+    def sweep(self, position, axis, delta):
+        # How far the box can move along one axis, up to delta, before it touches a solid cell
+        if delta == 0:
+            return 0.0
+        low, high = self.bounds(position)
+        others = [a for a in range(3) if a != axis]
+        cross = [self.cell_range(low[a], high[a], a) for a in others]
+        shift = CELL_SHIFT[axis]
+        if delta > 0:
+            leading = high[axis]
+            cells = range(math.floor(leading + shift + EPSILON), math.floor(leading + delta + shift - EPSILON) + 1)
+        else:
+            leading = low[axis]
+            cells = range(math.floor(leading + shift - EPSILON), math.floor(leading + delta + shift + EPSILON) - 1, -1)
+
+        cell = [0, 0, 0]
+        for layer in cells:
+            cell[axis] = layer
+            for first in cross[0]:
+                cell[others[0]] = first
+                for second in cross[1]:
+                    cell[others[1]] = second
+                    if self.solid(*cell):
+                        # Stop just short of the layer's near face, never backwards
+                        if delta > 0:
+                            return max(min(layer - shift - leading - EPSILON, delta), 0.0)
+                        return min(max(layer + 1 - shift - leading + EPSILON, delta), 0.0)
+        return delta
+
+    def slide(self, position, dx, dz):
+        # Horizontal move, x then z, sliding along whatever wall stops one of them
+        x, y, z = position
+        x += self.sweep((x, y, z), 0, dx)
+        z += self.sweep((x, y, z), 2, dz)
+        return x, y, z
+
+    def move(self, position, dx, dy, dz):
+        # Returns the new position and how far it stepped up a ledge (for smoothing the camera)
+        x, y, z = position
+        moved_y = self.sweep((x, y, z), 1, dy)
+        y += moved_y
+        if moved_y != dy:
+            self.grounded = dy < 0
+            self.velocity_y = 0.0
+        elif dy != 0:
+            self.grounded = False
+
+        target = (x + dx, y, z + dz)
+        result = self.slide((x, y, z), dx, dz)
+        stepped = 0.0
+        if self.grounded and self.step_height and result[::2] != target[::2]:
+            # Blocked on the ground: try the same move from up to step_height higher, then settle
+            # back down onto whatever is below, and keep it if that got further
+            rise = self.sweep((x, y, z), 1, self.step_height)
+            raised = self.slide((x, y + rise, z), dx, dz)
+            raised = (raised[0], raised[1] + self.sweep(raised, 1, -rise), raised[2])
+            if (raised[0] - x) ** 2 + (raised[2] - z) ** 2 > (result[0] - x) ** 2 + (result[2] - z) ** 2 + EPSILON:
+                stepped = raised[1] - y
+                result = raised
+        return result, stepped
+
+    def unstick(self, position):
+        # Lifts a box that ended up inside blocks (spawned in terrain, a block placed into it) onto
+        # the next free spot above
+        x, y, z = position
+        while self.overlaps((x, y, z)) and y < MAX_Y:
+            y = math.floor(y) + 1.0
+        return x, y, z
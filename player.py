@@ -1,25 +1,59 @@
 import json
-from ursina import Ursina, Vec3, Button, color, scene, mouse, destroy, application, load_texture, Text, Entity, camera, TextField, window, held_keys, raycast
+import math
+import os
+from ursina import Ursina, Vec3, Button, color, scene, mouse, destroy, application, load_texture, Text, Entity, camera, TextField, window, held_keys, raycast, time, clamp, lerp
 from ursina.prefabs.first_person_controller import FirstPersonController
-from noise import Noise
 from block import Block
 from utils import Utils
 from mob import Mob
 from chunkgen import Chunkgen  # Import the Chunk class
+from worldgen import WorldGen
+from world import World, AIR
+from blocks import BLOCKS, GRASS, GRAVEL, STONE, STONE_BRICKS, LOG, WOOD, GLASS
+from edits import EditOverlay
+from regionfile import RegionStore
+from client import RemoteEdits
+from protocol import HURT
+from raycast import VoxelRaycast
+from physics import VoxelBody
+from profiler import profiler
+
+GRAVITY = 32  # Blocks per second squared
+TERMINAL_VELOCITY = 60
+JUMP_HEIGHT = 1.25
+EYE_HEIGHT = 1.6
+WALK_SPEED = 5
+FLY_SPEED = 10
 
 class Player(FirstPersonController):
-    inventory = ["textures/grass.png", "textures/gravel.png", "textures/stone.png", "textures/stone_bricks.png", "textures/log.png", "textures/wood.png", "textures/glass.png"]
-    inventory_names = ["Grass", "Gravel", "Stone", "Stone Bricks", "Log", "Wood", "Glass"]
+    inventory = [GRASS, GRAVEL, STONE, STONE_BRICKS, LOG, WOOD, GLASS]  # Block IDs, names and textures come from the registry
     inventory_slots = len(inventory)
 
-    def __init__(self):
+    def __init__(self, client=None):
         super().__init__()
-        self.height = 0.6
         self.inventory_index = 0
-        self.world_blocks = []
-        self.boxes = []
-        self.placed_blocks = []  # List to store placed block positions
-        self.create_boxes()
+        self.world = World()  # Chunked voxel store, the source of truth for every block in the world
+        # Collides against the voxels themselves, so chunks don't need colliders at all
+        self.body = VoxelBody(self.world)
+        self.height = self.body.height
+        self.camera_pivot.y = EYE_HEIGHT
+        self.client = client  # WorldClient of the world server this player joined, None plays locally
+        if client:
+            # The server generates the chunks, keeps the edits and runs the mobs
+            client.handlers[HURT] = self.decrease_health
+            self.saves = None
+            self.placed_blocks = RemoteEdits(client)
+            seed = client.seed
+        else:
+            save_directory = os.path.join('saves', 'world')
+            self.saves = RegionStore(save_directory)
+            self.placed_blocks = EditOverlay(self.saves)  # Player edits per chunk, placements and removals
+            # The world's seed is saved with it, so unedited chunks regenerate exactly as they were
+            seed = WorldGen.load_seed(save_directory)
+
+        # Create Chunk instance for terrain management
+        self.chunk_manager = Chunkgen(self, seed=seed, client=self.client)
+        # The spawn area and saved edits are loaded by startup.Loader while the menu is up
 
         # GUI elements
         self.inventory_display = Text(text="Inventory: Grass", origin=(0, 0), x=-0.5, y=0.45, color=color.black, scale=1.5)
@@ -28,107 +62,172 @@ class Player(FirstPersonController):
         self.x_display = Text(text="x: ", origin=(0, 0), x=-0.5, y=0.35, color=color.black, scale=1.5, visible=False)
         self.y_display = Text(text="y: ", origin=(0, 0), x=-0.5, y=0.30, color=color.black, scale=1.5, visible=False)
         self.z_display = Text(text="z: ", origin=(0, 0), x=-0.5, y=0.25, color=color.black, scale=1.5, visible=False)
+        self.profile_display = Text(text="", origin=(-0.5, 0.5), x=-0.85, y=0.2, color=color.black, scale=0.75, visible=False)
+        self.profile_refresh = 0.0  # Seconds until the profiler text is rebuilt, rebuilding it every frame is costly
 
         self.debug_info_visible = False
+        self.hud_values = None  # (health, block name) the HUD text shows
+        self.coordinate_values = None  # (x, y, z) the debug text shows
         self.chat_open = False
         self.chat_command_mode = False
 
         self.health = 100
+        self.damage_amount = 5
+        self.mob_manager = None  # MobManager simulating the mobs around this player
+        self.recorder = None  # InputRecorder capturing this session for replay.py, if recording
         self.god_mode = False
 
-        # Create Chunk instance for terrain management
-        self.chunk_manager = Chunkgen(self)
-
-        # Load previously placed blocks from file on startup
-        self.load_placed_blocks()
+        # Blocks are picked with a voxel raycast, so the mouse doesn't need to test the scene's colliders
+        mouse.traverse_target = None
 
     def load_placed_blocks(self):
+        # Edits live in region files and are merged into each chunk as it streams in, the old
+        # JSON save only needs converting once. Runs off the main thread during startup, before
+        # any chunk is installed.
+        if self.client:
+            return  # The legacy save belongs to the local world
         try:
             with open('placed_blocks.json', 'r') as file:
-                self.placed_blocks = json.load(file)
+                legacy_blocks = json.load(file)
         except FileNotFoundError:
-            self.placed_blocks = []
-
-    def save_placed_blocks(self):
-        with open('placed_blocks.json', 'w') as file:
-            json.dump(self.placed_blocks, file, default=self.Vec3_to_list)
+            return
+
+        for block in legacy_blocks:
+            x, y, z = World.block_coords(block['position'])
+            block_id = block['block'] if 'block' in block else BLOCKS.from_texture(block['texture_path'])
+            if block_id is None:
+                print(f"Skipping saved block with unknown texture {block['texture_path']}")
+                continue
+            self.placed_blocks.set(x, y, z, block_id, save=False)
+        for chunk_key in self.placed_blocks.chunks:
+            self.save_placed_blocks(chunk_key)
+        self.saves.flush()
+        os.replace('placed_blocks.json', 'placed_blocks.json.migrated')
+
+    def save_placed_blocks(self, chunk_key):
+        self.placed_blocks.save(chunk_key)
 
     def place_new_box(self):
-        hit_info = mouse.hovered_entity
-        if hit_info and isinstance(hit_info, Block) and hit_info.active:
-            selected_texture = self.inventory[self.inventory_index]
-            new_position = hit_info.position + mouse.normal
+        target = self.chunk_manager.hovered_block()
+        if target:
+            hit_info, normal = target
+            selected_block = self.inventory[self.inventory_index]
+            new_position = hit_info.position + normal
             try:
-                new_block = Block(position=new_position, texture_path=selected_texture)
-                self.boxes.append(new_block)
-                self.world_blocks.append(new_block)
-
-                # Add to placed_blocks
-                self.placed_blocks.append({
-                    'position': self.Vec3_to_list(new_position),
-                    'texture_path': selected_texture
-                })
-
-                # Save placed_blocks to file
-                self.save_placed_blocks()
+                new_block = self.chunk_manager.place_block(new_position, selected_block)
+                if new_block is None:
+                    return
+
+                # Record the edit in its chunk's overlay, which also queues the chunk for saving
+                self.placed_blocks.set(new_block.x, new_block.y, new_block.z, selected_block)
+                self.chunk_manager.notify_block(new_block.x, new_block.y, new_block.z)
             except Exception as e:
                 print(f"Failed to create new block: {e}")
 
     def remove_box(self):
-        hit_info = mouse.hovered_entity
-        if hit_info and isinstance(hit_info, Block) and hit_info.active:
-            if hit_info in self.boxes:
-                self.boxes.remove(hit_info)
-
-            # Remove from placed_blocks
-            block_to_remove = None
-            for block in self.placed_blocks:
-                if block['position'] == self.Vec3_to_list(hit_info.position):
-                    block_to_remove = block
-                    break
-
-            if block_to_remove:
-                self.placed_blocks.remove(block_to_remove)
+        target = self.chunk_manager.hovered_block()
+        if target:
+            hit_info, normal = target
 
-            # Save updated placed_blocks to file
-            self.save_placed_blocks()
+            # Removals are edits too, so generated blocks stay gone after a reload
+            self.placed_blocks.set(hit_info.x, hit_info.y, hit_info.z, AIR)
 
             self.remove_block(hit_info)
+            self.chunk_manager.notify_block(hit_info.x, hit_info.y, hit_info.z)
 
     # Helper function to convert Vec3 to list for JSON serialization
     def Vec3_to_list(self, vec):
         return [vec.x, vec.y, vec.z]
 
-    def create_boxes(self):
-        for i in range(20):
-            for j in range(20):
-                noise_val = Noise.perlin_noise(i, j)
-                height = int(noise_val * 5)
-                position = Vec3(j, height, i)
-                box = Block(position=position, texture_path='textures/grass.png')
-                self.boxes.append(box)
-
     def update(self):
-        super().update()
-        self.update_gui()
-        self.chunk_manager.update_terrain()  # Use chunk manager for terrain updates
+        profiler.end_frame()
+        if self.client:
+            self.client.send_position(self.x, self.y, self.z)
+        with profiler.scope('controller'):
+            self.update_movement()
+        with profiler.scope('gui'):
+            self.update_gui()
+        with profiler.scope('terrain'):
+            self.chunk_manager.update_terrain()  # Use chunk manager for terrain updates
+        with profiler.scope('block updates'):
+            self.chunk_manager.update_ticks(time.dt)
+        if self.debug_info_visible:
+            with profiler.scope('debug overlay'):
+                self.update_profile_display()
+        if self.recorder:
+            self.recorder.frame(self.x, self.y, self.z, self.rotation_y, self.camera_pivot.rotation_x)
+
+    def update_movement(self):
+        # Mouse look as in FirstPersonController, movement through the voxel body instead of its
+        # raycasts against colliders
+        self.rotation_y += mouse.velocity[0] * self.mouse_sensitivity[1]
+        self.camera_pivot.rotation_x -= mouse.velocity[1] * self.mouse_sensitivity[0]
+        self.camera_pivot.rotation_x = clamp(self.camera_pivot.rotation_x, -90, 90)
+
+        dt = min(time.dt, 0.1)  # A long hitch shouldn't fling the player
+        direction = Vec3(self.forward * (held_keys['w'] - held_keys['s']) + self.right * (held_keys['d'] - held_keys['a'])).normalized()
+        body = self.body
+        if self.god_mode:
+            body.velocity_y = (held_keys['space'] - held_keys['left shift']) * self.speed
+        elif self.gravity:
+            body.velocity_y = max(body.velocity_y - GRAVITY * self.gravity * dt, -TERMINAL_VELOCITY)
+
+        position = body.unstick((self.x, self.y, self.z))
+        (self.x, self.y, self.z), stepped = body.move(position, direction.x * self.speed * dt, body.velocity_y * dt, direction.z * self.speed * dt)
+        self.grounded = body.grounded
+
+        # A step up moves the body at once, the camera catches up over a few frames
+        self.camera_pivot.y = lerp(self.camera_pivot.y - stepped, EYE_HEIGHT, min(dt * 12, 1))
+
+    def mob_in_reach(self, reach=3.0):
+        # Mobs are tested as boxes along the crosshair ray, and count only if no block is in front
+        if self.mob_manager is None:
+            return None
+        boxes = self.mob_manager.hit_boxes()
+        hit_info = VoxelRaycast.cast_boxes(boxes, camera.world_position, camera.forward, reach)
+        if hit_info.hit and hit_info.distance < VoxelRaycast.cast(self.world, camera.world_position, camera.forward, reach).distance:
+            return hit_info.entity
+        return None
 
     def attack(self):
-        hit_info = raycast(self.position, self.forward, distance=3, ignore=[self])
-        if hit_info.hit:
-            if isinstance(hit_info.entity, Mob):
-                mob = hit_info.entity
-                mob.receive_damage(self.damage_amount)
+        mob = self.mob_in_reach()
+        if mob:
+            mob.receive_damage(self.damage_amount)
+            return True
+        return False
 
     def update_gui(self):
-        self.health_display.text = f"Health: {int(self.health)}"
-        self.inventory_display.text = f"Inventory: {self.get_current_block_name()}"
+        # Ursina rebuilds a Text's glyphs on every assignment, so only touch the ones that changed
+        health, block_name = int(self.health), self.get_current_block_name()
+        if (health, block_name) != self.hud_values:
+            self.hud_values = (health, block_name)
+            self.health_display.text = f"Health: {health}"
+            self.inventory_display.text = f"Inventory: {block_name}"
         if self.debug_info_visible:
-            self.x_display.text = f"x: {int(self.x)}"
-            self.y_display.text = f"y: {int(self.y)}"
-            self.z_display.text = f"z: {int(self.z)}"
+            coordinates = (int(self.x), int(self.y), int(self.z))
+            if coordinates != self.coordinate_values:
+                self.coordinate_values = coordinates
+                self.x_display.text = f"x: {coordinates[0]}"
+                self.y_display.text = f"y: {coordinates[1]}"
+                self.z_display.text = f"z: {coordinates[2]}"
+
+    def update_profile_display(self):
+        self.profile_refresh -= time.dt
+        if self.profile_refresh > 0:
+            return
+        self.profile_refresh = 0.25
+        profiler.gauge('entities', len(scene.entities))
+        profiler.gauge('blocks', self.world.block_count())
+        profiler.gauge('loaded chunks', len(self.chunk_manager.loaded_chunks))
+        profiler.gauge('queued chunks', self.chunk_manager.scheduler.pending_count() + len(self.chunk_manager.ready))
+        profiler.gauge('mobs', self.mob_manager.alive_count if self.mob_manager else 0)
+        for name, value in self.chunk_manager.culler.stats.items():
+            profiler.gauge(name, value)
+        self.profile_display.text = "\n".join(profiler.report_lines())
 
     def input(self, key):
+        if self.recorder:
+            self.recorder.key(key)
         if not self.chat_open:
             super().input(key)
 
@@ -139,28 +238,24 @@ class Player(FirstPersonController):
             self.inventory_index = (self.inventory_index + 1) % self.inventory_slots
             self.update_gui()
 
-        if key == 'space':
-            if not self.god_mode:
-                self.jump()
-        if self.god_mode and held_keys['space']:
-            self.y += 1
-
-        if self.god_mode and held_keys['left shift']:
-            self.y -= 1
-
         if self.chat_open:
             if key == 'enter':
                 self.process_chat_command()
 
         if key == 'escape':
+            if self.recorder:
+                self.recorder.save()
+            if self.client:
+                self.client.close()
+            else:
+                self.chunk_manager.ticker.save()  # Updates still pending resume next time
+                self.saves.close()
             application.quit()
         elif key == 'right mouse down':
             self.place_new_box()
         elif key == 'left mouse down':
-            hit_info = mouse.hovered_entity
-            if hit_info and isinstance(hit_info, Block):
+            if not self.attack():
                 self.remove_box()
-                self.attack()
         if key == '/':
             self.toggle_chat()
 
@@ -168,19 +263,15 @@ class Player(FirstPersonController):
             self.toggle_debug_info()
 
     def toggle_debug_info(self):
-        # NEW GUI elements
         self.debug_info_visible = not self.debug_info_visible
-        self.x_display.visible = self.debug_info_visible
-        self.y_display.visible = self.debug_info_visible
-        self.z_display.visible = self.debug_info_visible
-        if self.debug_info_visible:
-            self.x_display.visible = True
-            self.y_display.visible = True
-            self.z_display.visible = True
-        else:
-            self.x_display.visible = False
-            self.y_display.visible = False
-            self.z_display.visible = False
+        self.x_display.visible = not self.x_display.visible
+        self.y_display.visible = not self.y_display.visible
+        self.z_display.visible = not self.z_display.visible
+        self.profile_display.visible = not self.profile_display.visible
+        # Scopes are only timed while the overlay is up
+        profiler.enabled = self.debug_info_visible
+        profiler.reset()
+        self.profile_refresh = 0.0
 
     def toggle_chat(self):
         self.chat_open = not self.chat_open
@@ -196,8 +287,29 @@ class Player(FirstPersonController):
         command = self.chat_display.text.strip().lower()
         if command == '/godmode':
             self.toggle_god_mode()
+        elif command == '/trace':
+            self.toggle_trace()
+        elif command.startswith('/renderdistance'):
+            try:
+                distances = [max(1, int(value)) for value in command.split()[1:3]]
+                self.chunk_manager.set_render_distance(*distances)
+            except (TypeError, ValueError):
+                print("Usage: /renderdistance <chunks> [lod chunks]")
         self.close_chat()
 
+    def toggle_trace(self):
+        # First /trace starts capturing a timeline, the second one writes it out
+        if not profiler.tracing:
+            profiler.start_trace()
+            print("Trace capture started, type /trace again to save it")
+        else:
+            path = os.path.join('traces', time.strftime('trace-%Y%m%d-%H%M%S.json'))
+            try:
+                events = profiler.stop_trace(path)
+                print(f"Saved {events} trace events to {path}")
+            except OSError as e:
+                print(f"Failed to save trace: {e}")
+
     def close_chat(self):
         self.chat_open = False
         self.chat_display.text = ""
@@ -205,25 +317,24 @@ class Player(FirstPersonController):
 
     def toggle_god_mode(self):
         self.god_mode = not self.god_mode
+        self.body.velocity_y = 0.0
         if self.god_mode:
             self.gravity = 0
-            self.speed = 10
-            self.y = self.height
+            self.speed = FLY_SPEED
         else:
             self.gravity = 1
+            self.speed = WALK_SPEED
 
     def jump(self):
-        if not self.god_mode:
-            super().jump()
+        if not self.god_mode and self.body.grounded:
+            self.body.velocity_y = math.sqrt(2 * GRAVITY * JUMP_HEIGHT)
+            self.body.grounded = False
 
     def get_current_block_name(self):
-        return self.inventory_names[self.inventory_index]
+        return BLOCKS[self.inventory[self.inventory_index]].name
 
     def remove_block(self, block):
-        if block in self.world_blocks:
-            self.world_blocks.remove(block)
-            destroy(block)
-            block.active = False
+        self.chunk_manager.remove_block(block.position)
 
     def decrease_health(self, by_how_much):
         self.health -= by_how_much
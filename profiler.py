@@ -0,0 +1,169 @@
+import json
+import os
+import threading
+import time
+from collections import deque
+
+class NullScope:
+    # Shared do-nothing scope handed out while profiling is off, so an instrumented call site
+    # costs one attribute check and an empty with block
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+NULL_SCOPE = NullScope()
+
+
+class Scope:
+    __slots__ = ('profiler', 'name', 'start')
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+        self.start = 0.0
+
+    def __enter__(self):
+        self.profiler.depth += 1
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        end = time.perf_counter()
+        profiler = self.profiler
+        profiler.depth -= 1
+        profiler.add_time(self.name, end - self.start, top_level=profiler.depth == 0)
+        if profiler.tracing:
+            profiler.trace_event(self.name, self.start, end)
+        return False
+
+
+class Profiler:
+    # Named timing scopes and counters, aggregated per frame over a rolling window. Scopes only
+    # cost anything while enabled (the F3 overlay is up) or while a trace is being captured.
+    def __init__(self, window=240, max_trace_events=500000):
+        self.enabled = False
+        self.tracing = False
+        self.window = window  # Frames kept for the rolling statistics
+        self.max_trace_events = max_trace_events
+        self.depth = 0  # Scope nesting, only outermost scopes count towards accounted frame time
+        self.frame_start = None
+        self.frame_times = deque(maxlen=window)
+        self.frame_scopes = {}  # Scope name -> seconds spent in it this frame
+        self.frame_counters = {}  # Counter name -> count this frame
+        self.accounted = 0.0  # Seconds spent in outermost scopes this frame
+        self.scope_history = {}  # Scope name -> deque of per-frame seconds
+        self.counter_history = {}  # Counter name -> deque of per-frame counts
+        self.gauges = {}  # Name -> latest sampled value (entities, chunks, ...)
+        self.trace_events = []
+        self.trace_origin = 0.0
+
+    def scope(self, name):
+        if self.enabled or self.tracing:
+            return Scope(self, name)
+        return NULL_SCOPE
+
+    def add_time(self, name, seconds, top_level=True):
+        self.frame_scopes[name] = self.frame_scopes.get(name, 0.0) + seconds
+        if top_level:
+            self.accounted += seconds
+
+    def count(self, name, amount=1):
+        # Per-frame event counter (chunks installed, mobs spawned, ...)
+        if self.enabled:
+            self.frame_counters[name] = self.frame_counters.get(name, 0) + amount
+
+    def gauge(self, name, value):
+        self.gauges[name] = value
+
+    def end_frame(self):
+        # Called once per frame, closes the previous frame's statistics
+        now = time.perf_counter()
+        if not (self.enabled or self.tracing):
+            self.frame_start = None
+            return
+        if self.frame_start is not None:
+            frame_time = now - self.frame_start
+            self.frame_times.append(frame_time)
+            # Whatever the scopes don't cover is mostly the engine: rendering, physics, input
+            self.frame_scopes['other (render)'] = max(frame_time - self.accounted, 0.0)
+            for name in self.scope_history.keys() | self.frame_scopes.keys():
+                history = self.scope_history.get(name)
+                if history is None:
+                    history = self.scope_history[name] = deque(maxlen=self.window)
+                history.append(self.frame_scopes.get(name, 0.0))
+            for name in self.counter_history.keys() | self.frame_counters.keys():
+                history = self.counter_history.get(name)
+                if history is None:
+                    history = self.counter_history[name] = deque(maxlen=self.window)
+                history.append(self.frame_counters.get(name, 0))
+            if self.tracing:
+                self.trace_event('frame', self.frame_start, now)
+        self.frame_start = now
+        self.frame_scopes = {}
+        self.frame_counters = {}
+        self.accounted = 0.0
+
+    def reset(self):
+        self.frame_start = None
+        self.frame_times.clear()
+        self.scope_history = {}
+        self.counter_history = {}
+
+    @staticmethod
+    def percentile(sorted_values, fraction):
+        if not sorted_values:
+            return 0.0
+        return sorted_values[min(int(fraction * len(sorted_values)), len(sorted_values) - 1)]
+
+    def frame_percentiles(self):
+        times = sorted(self.frame_times)
+        return {name: self.percentile(times, fraction) for name, fraction in (('p50', 0.5), ('p95', 0.95), ('p99', 0.99), ('max', 1.0))}
+
+    def report_lines(self):
+        # Text for the F3 overlay: frame time percentiles, mean/worst time per scope, counters
+        percentiles = self.frame_percentiles()
+        lines = ["frame ms  " + "  ".join(f"{name} {seconds * 1000:.1f}" for name, seconds in percentiles.items())]
+        if percentiles['p50']:
+            lines[0] += f"  ({1 / percentiles['p50']:.0f} fps)"
+        scopes = sorted(self.scope_history.items(), key=lambda item: -sum(item[1]))
+        for name, history in scopes:
+            lines.append(f"{name:<16} {sum(history) / len(history) * 1000:6.2f} ms avg {max(history) * 1000:6.2f} ms max")
+        for name, history in sorted(self.counter_history.items()):
+            lines.append(f"{name:<16} {sum(history) / len(history):6.2f} /frame")
+        for name, value in self.gauges.items():
+            lines.append(f"{name:<16} {value}")
+        return lines
+
+    def start_trace(self):
+        self.trace_events = []
+        self.trace_origin = time.perf_counter()
+        self.tracing = True
+
+    def trace_event(self, name, start, end):
+        # Chrome trace "complete" event, timestamps in microseconds
+        if len(self.trace_events) < self.max_trace_events:
+            self.trace_events.append({
+                'name': name,
+                'ph': 'X',
+                'ts': (start - self.trace_origin) * 1e6,
+                'dur': (end - start) * 1e6,
+                'pid': os.getpid(),
+                'tid': threading.get_ident(),
+            })
+
+    def stop_trace(self, path):
+        # Writes the capture in Chrome's trace event format, open it in chrome://tracing or Perfetto
+        self.tracing = False
+        events, self.trace_events = self.trace_events, []
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, 'w') as file:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, file)
+        return len(events)
+
+
+profiler = Profiler()
@@ -0,0 +1,123 @@
+import struct
+import zlib
+import numpy as np
+from palette import SectionPalette
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 25575
+
+# World server protocol. Every message is a frame: payload length, message type, payload.
+HEADER = struct.Struct('<IB')
+MAX_PAYLOAD = 1 << 20  # Anything longer is a broken or hostile peer
+
+# Message types
+DISCONNECTED = 0  # Never sent, the client queues it locally when the connection drops
+WELCOME = 1  # Server -> client: client ID, world seed, mob slots
+REQUEST = 2  # Client -> server: chunk keys to send
+CANCEL = 3  # Client -> server: chunk keys no longer wanted
+CHUNK = 4  # Server -> client: chunk key, zlib compressed section palettes with every edit applied
+EDIT = 5  # Client -> server: x, y, z, block ID the player placed (or AIR for a removal)
+BLOCK = 6  # Server -> clients: an edit somebody else made
+POSITION = 7  # Client -> server: player position, mobs chase and spawn around it
+MOBS = 8  # Server -> clients: every mob in use
+DAMAGE = 9  # Client -> server: mob slot hit, damage
+HURT = 10  # Server -> client: damage the player took from mobs
+
+WELCOME_RECORD = struct.Struct('<HqI')
+KEY_RECORD = struct.Struct('<ii')
+BLOCK_RECORD = struct.Struct('<iiiB')
+POSITION_RECORD = struct.Struct('<fff')
+DAMAGE_RECORD = struct.Struct('<Hf')
+HURT_RECORD = struct.Struct('<f')
+MAX_MOB_SLOTS = 1 << 16  # Mob slots are sent as u16
+MOB_RECORD = np.dtype([('slot', '<u2'), ('state', 'u1'), ('hostile', '?'), ('position', '<f4', 3), ('health', '<f4')])
+MAX_MOBS = min(MAX_MOB_SLOTS, MAX_PAYLOAD // MOB_RECORD.itemsize)  # So a whole mob snapshot fits in one frame
+
+
+class Protocol:
+    # Encoding of the messages between WorldServer and WorldClient. encode_* return complete
+    # frames, decode() turns a received payload into the arguments of that message's handler.
+    @staticmethod
+    def parse_address(address):
+        # "host:port", "host" or ":port" -> (host, port)
+        host, separator, port = address.rpartition(':')
+        if not separator:
+            host, port = address, ''
+        return host or DEFAULT_HOST, int(port) if port else DEFAULT_PORT
+
+    @staticmethod
+    def frame(message_type, payload=b''):
+        return HEADER.pack(len(payload), message_type) + payload
+
+    @staticmethod
+    async def read(reader):
+        # Next (message type, payload) from an asyncio stream, raises IncompleteReadError at EOF
+        length, message_type = HEADER.unpack(await reader.readexactly(HEADER.size))
+        if length > MAX_PAYLOAD:
+            raise ValueError(f"Message of {length} bytes is too long")
+        return message_type, await reader.readexactly(length)
+
+    @staticmethod
+    def encode_welcome(client_id, seed, max_mobs):
+        return Protocol.frame(WELCOME, WELCOME_RECORD.pack(client_id, seed, max_mobs))
+
+    @staticmethod
+    def encode_keys(message_type, chunk_keys):
+        return Protocol.frame(message_type, b''.join(KEY_RECORD.pack(*chunk_key) for chunk_key in chunk_keys))
+
+    @staticmethod
+    def encode_chunk(chunk_key, blocks, level=1):
+        # Palettes already pack most sections into a bit or two per voxel, and the long runs of
+        # stone and air left in those compress well even at the fastest level
+        return Protocol.frame(CHUNK, KEY_RECORD.pack(*chunk_key) + zlib.compress(SectionPalette.encode(blocks), level))
+
+    @staticmethod
+    def encode_block(message_type, x, y, z, block_id):
+        return Protocol.frame(message_type, BLOCK_RECORD.pack(x, y, z, block_id))
+
+    @staticmethod
+    def encode_position(x, y, z):
+        return Protocol.frame(POSITION, POSITION_RECORD.pack(x, y, z))
+
+    @staticmethod
+    def encode_mobs(slots, states, hostile, positions, health):
+        records = np.zeros(len(slots), dtype=MOB_RECORD)
+        records['slot'] = slots
+        records['state'] = states
+        records['hostile'] = hostile
+        records['position'] = positions
+        records['health'] = health
+        return Protocol.frame(MOBS, records.tobytes())
+
+    @staticmethod
+    def encode_damage(slot, amount):
+        return Protocol.frame(DAMAGE, DAMAGE_RECORD.pack(slot, amount))
+
+    @staticmethod
+    def encode_hurt(amount):
+        return Protocol.frame(HURT, HURT_RECORD.pack(amount))
+
+    @staticmethod
+    def decode(message_type, payload):
+        if message_type == WELCOME:
+            return WELCOME_RECORD.unpack(payload)
+        if message_type in (REQUEST, CANCEL):
+            return ([tuple(chunk_key) for chunk_key in KEY_RECORD.iter_unpack(payload)],)
+        if message_type == CHUNK:
+            try:
+                data = zlib.decompress(payload[KEY_RECORD.size:])
+            except zlib.error as e:
+                raise ValueError(f"Chunk snapshot is corrupt: {e}")
+            return KEY_RECORD.unpack_from(payload), SectionPalette.decode(data)
+        if message_type in (EDIT, BLOCK):
+            return BLOCK_RECORD.unpack(payload)
+        if message_type == POSITION:
+            return POSITION_RECORD.unpack(payload)
+        if message_type == MOBS:
+            records = np.frombuffer(payload, dtype=MOB_RECORD)
+            return records['slot'], records['state'], records['hostile'], records['position'].astype(np.float64), records['health'].astype(np.float64)
+        if message_type == DAMAGE:
+            return DAMAGE_RECORD.unpack(payload)
+        if message_type == HURT:
+            return HURT_RECORD.unpack(payload)
+        raise ValueError(f"Unknown message type {message_type}")
@@ -0,0 +1,93 @@
+import math
+from world import AIR
+
+class VoxelHit:
+    def __init__(self, hit=False, position=None, normal=None, distance=math.inf, entity=None):
+        self.hit = hit
+        self.position = position  # Block coordinates (x, y, z) of the hit voxel
+        self.normal = normal  # Unit normal (x, y, z) of the face that was entered
+        self.distance = distance
+        self.entity = entity  # Set when the ray hit a mob instead of a block
+
+
+class VoxelRaycast:
+    @staticmethod
+    def grid_coords(point):
+        # Voxel (x, y, z) spans [x - .5, x + .5) x [y - 1, y) x [z - .5, z + .5), shift so
+        # every voxel is the unit cube [x, x + 1) x [y, y + 1) x [z, z + 1)
+        return point[0] + 0.5, point[1] + 1.0, point[2] + 0.5
+
+    @staticmethod
+    def cast(world, origin, direction, max_distance=8.0):
+        # Amanatides & Woo grid traversal over the chunk voxel data: one voxel lookup per step,
+        # no colliders involved. Returns the first solid voxel along the ray.
+        length = math.sqrt(direction[0] ** 2 + direction[1] ** 2 + direction[2] ** 2)
+        if length == 0:
+            return VoxelHit()
+        direction = (direction[0] / length, direction[1] / length, direction[2] / length)
+        start = VoxelRaycast.grid_coords(origin)
+
+        cell = [math.floor(axis) for axis in start]
+        step = [0, 0, 0]
+        t_max = [math.inf, math.inf, math.inf]  # Distance along the ray to the next boundary per axis
+        t_delta = [math.inf, math.inf, math.inf]  # Distance along the ray to cross one voxel per axis
+        for axis in range(3):
+            if direction[axis] > 0:
+                step[axis] = 1
+                t_max[axis] = (cell[axis] + 1 - start[axis]) / direction[axis]
+                t_delta[axis] = 1 / direction[axis]
+            elif direction[axis] < 0:
+                step[axis] = -1
+                t_max[axis] = (cell[axis] - start[axis]) / direction[axis]
+                t_delta[axis] = -1 / direction[axis]
+
+        normal = (0, 0, 0)  # Zero when the ray starts inside a block
+        distance = 0.0
+        while distance <= max_distance:
+            if world.get_block(cell[0], cell[1], cell[2]) != AIR:
+                return VoxelHit(True, tuple(cell), normal, distance)
+
+            axis = 0 if t_max[0] < t_max[1] and t_max[0] < t_max[2] else (1 if t_max[1] < t_max[2] else 2)
+            distance = t_max[axis]
+            cell[axis] += step[axis]
+            t_max[axis] += t_delta[axis]
+            normal = [0, 0, 0]
+            normal[axis] = -step[axis]
+            normal = tuple(normal)
+
+        return VoxelHit()
+
+    @staticmethod
+    def cast_boxes(boxes, origin, direction, max_distance=8.0):
+        # Slab test against axis-aligned boxes given as (entity, min corner, max corner).
+        # Used for mobs, which are tested separately from the voxel grid.
+        length = math.sqrt(direction[0] ** 2 + direction[1] ** 2 + direction[2] ** 2)
+        if length == 0:
+            return VoxelHit()
+        inverse = [1 / (axis / length) if axis else math.inf for axis in direction]
+
+        nearest = VoxelHit()
+        for entity, box_min, box_max in boxes:
+            t_near, t_far = 0.0, max_distance
+            near_axis = -1
+            for axis in range(3):
+                if inverse[axis] == math.inf:
+                    if not box_min[axis] <= origin[axis] <= box_max[axis]:
+                        break
+                    continue
+                t1 = (box_min[axis] - origin[axis]) * inverse[axis]
+                t2 = (box_max[axis] - origin[axis]) * inverse[axis]
+                if t1 > t2:
+                    t1, t2 = t2, t1
+                if t1 > t_near:
+                    t_near, near_axis = t1, axis
+                t_far = min(t_far, t2)
+                if t_near > t_far:
+                    break
+            else:
+                if t_near < nearest.distance:
+                    normal = [0, 0, 0]
+                    if near_axis >= 0:
+                        normal[near_axis] = -1 if direction[near_axis] > 0 else 1
+                    nearest = VoxelHit(True, None, tuple(normal), t_near, entity)
+        return nearest
@@ -0,0 +1,284 @@
+import atexit
+import mmap
+import os
+import struct
+import threading
+import zlib
+
+REGION_SIZE = 32  # Chunks per region side
+REGION_CHUNKS = REGION_SIZE * REGION_SIZE
+MAGIC = b'MCRG'
+VERSION = 2
+LEGACY_VERSION = 1  # Single table that every save rewrote along with the whole file, still read
+HEADER = struct.Struct('<4sHH')  # Magic, version, region size
+ENTRY = struct.Struct('<II')  # Payload offset, payload length (0 = chunk not stored)
+TABLE_SIZE = ENTRY.size * REGION_CHUNKS
+SLOT = struct.Struct('<QI')  # Table generation, CRC32 of the table that follows
+SLOT_SIZE = SLOT.size + TABLE_SIZE
+DATA_START = HEADER.size + 2 * SLOT_SIZE
+COMPACT_MIN = 256 * 1024  # Bytes of superseded payloads a region may carry before it's rewritten
+
+
+class RegionFile:
+    # One file holding up to REGION_SIZE x REGION_SIZE chunks: two offset table slots followed by
+    # the zlib-compressed payloads. A single chunk is read by slicing a memory map. Saving appends
+    # the changed payloads and then writes the table into the slot not in use, with a higher
+    # generation. Until that table is complete (its CRC matches) the old one stays current, so a
+    # crash mid-save loses that save and nothing else. Superseded payloads stay behind as dead
+    # space until there's more of it than live data, then the region is compacted.
+    def __init__(self, path):
+        self.path = path
+        self.file = None
+        self.map = None
+        self.version = None
+        self.slot = 0  # Table slot in use
+        self.generation = 0  # Of the table in use
+        self.table_offset = 0  # File offset of the table in use
+        self.dead = 0  # Bytes of payload data no table entry points at
+
+    @staticmethod
+    def chunk_index(chunk_key):
+        return (chunk_key[1] % REGION_SIZE) * REGION_SIZE + chunk_key[0] % REGION_SIZE
+
+    def open(self):
+        if self.map is None and os.path.exists(self.path):
+            self.file = open(self.path, 'rb')
+            self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+            magic, version, region_size = HEADER.unpack_from(self.map, 0)
+            if magic != MAGIC or version not in (VERSION, LEGACY_VERSION) or region_size != REGION_SIZE:
+                self.close()
+                raise ValueError(f"{self.path} is not a version {VERSION} region file")
+            self.version = version
+            if version == LEGACY_VERSION:
+                self.slot, self.generation = 0, 0
+                self.table_offset = HEADER.size
+            else:
+                self.slot, self.generation = self.current_slot()
+                self.table_offset = HEADER.size + self.slot * SLOT_SIZE + SLOT.size
+            data_start = DATA_START if version == VERSION else HEADER.size + TABLE_SIZE
+            self.dead = len(self.map) - data_start - sum(length for _, length in self.entries())
+        return self.map is not None
+
+    def current_slot(self):
+        # The valid table with the highest generation
+        best = None
+        for slot in range(2):
+            offset = HEADER.size + slot * SLOT_SIZE
+            generation, checksum = SLOT.unpack_from(self.map, offset)
+            table = self.map[offset + SLOT.size:offset + SLOT_SIZE]
+            if generation and zlib.crc32(table) == checksum and (best is None or generation > best[1]):
+                best = (slot, generation)
+        if best is None:
+            self.close()
+            raise ValueError(f"{self.path} has no intact offset table")
+        return best
+
+    def close(self):
+        if self.map is not None:
+            self.map.close()
+            self.file.close()
+        self.map = None
+        self.file = None
+
+    def entries(self):
+        # (offset, length) of every chunk index, from the table in use
+        return list(ENTRY.iter_unpack(self.map[self.table_offset:self.table_offset + TABLE_SIZE]))
+
+    def read_raw(self, index):
+        # Compressed payload of one chunk, or None
+        if not self.open():
+            return None
+        offset, length = ENTRY.unpack_from(self.map, self.table_offset + index * ENTRY.size)
+        if length == 0:
+            return None
+        return self.map[offset:offset + length]
+
+    def read(self, index):
+        payload = self.read_raw(index)
+        return zlib.decompress(payload) if payload is not None else None
+
+    def stored_payloads(self):
+        # {index: compressed payload} for every stored chunk, copied out of the map
+        if not self.open():
+            return {}
+        return {index: self.map[offset:offset + length] for index, (offset, length) in enumerate(self.entries()) if length}
+
+    def plan_append(self, changes):
+        # The table to update for an appending save of `changes` ({index: compressed payload or
+        # None}), or None when the region should be written out whole instead: it doesn't exist
+        # yet, is in the old format, or would carry more dead space than live data
+        if not self.open() or self.version != VERSION:
+            return None
+        entries = self.entries()
+        replaced = sum(entries[index][1] for index in changes)
+        live = sum(length for _, length in entries) - replaced + sum(len(payload) for payload in changes.values() if payload is not None)
+        if self.dead + replaced > max(live, COMPACT_MIN):
+            return None
+        return bytearray(self.map[self.table_offset:self.table_offset + TABLE_SIZE]), self.slot, self.generation
+
+    def append(self, plan, changes):
+        # Writes an appending save planned by plan_append(). Doesn't touch the memory map, close()
+        # the region afterwards so the next read maps the new table.
+        table, slot, generation = plan
+        with open(self.path, 'r+b') as file:
+            offset = file.seek(0, os.SEEK_END)
+            for index, payload in changes.items():
+                if payload is None:
+                    ENTRY.pack_into(table, index * ENTRY.size, 0, 0)
+                    continue
+                file.write(payload)
+                ENTRY.pack_into(table, index * ENTRY.size, offset, len(payload))
+                offset += len(payload)
+            file.flush()
+            os.fsync(file.fileno())
+            # Only once the payloads are on disk does the other slot get a table pointing at them
+            file.seek(HEADER.size + (1 - slot) * SLOT_SIZE)
+            file.write(SLOT.pack(generation + 1, zlib.crc32(table)))
+            file.write(table)
+            file.flush()
+            os.fsync(file.fileno())
+
+    def write_temp(self, payloads):
+        # Write a complete new region next to the current one and return its path
+        table = bytearray(TABLE_SIZE)
+        offset = DATA_START
+        for index, payload in payloads.items():
+            ENTRY.pack_into(table, index * ENTRY.size, offset, len(payload))
+            offset += len(payload)
+
+        temp_path = self.path + '.tmp'
+        with open(temp_path, 'wb') as file:
+            file.write(HEADER.pack(MAGIC, VERSION, REGION_SIZE))
+            file.write(SLOT.pack(1, zlib.crc32(table)))
+            file.write(table)
+            file.write(bytes(SLOT_SIZE))  # Second slot empty until the first appending save
+            for payload in payloads.values():
+                file.write(payload)
+            file.flush()
+            os.fsync(file.fileno())
+        return temp_path
+
+    def replace(self, temp_path):
+        # Atomic swap, so a crash mid-write leaves the previous version of the region intact
+        self.close()
+        os.replace(temp_path, self.path)
+
+
+class RegionStore:
+    # Chunk payload storage for a whole world. Writes are buffered per chunk and flushed in
+    # batches by a background thread, only touching the regions that have dirty chunks.
+    def __init__(self, directory, flush_delay=1.0):
+        self.directory = directory
+        self.flush_delay = flush_delay  # Seconds to gather edits before writing them out
+        self.regions = {}  # Region key -> RegionFile
+        self.dirty = {}  # Chunk key -> payload waiting to be written
+        self.writing = {}  # Chunk key -> payload currently being written
+        self.lock = threading.Lock()  # Guards dirty/writing and the region file maps
+        self.write_lock = threading.Lock()  # Only one batch is written at a time
+        self.wake = threading.Condition(self.lock)
+        self.closed = False
+        os.makedirs(directory, exist_ok=True)
+        self.writer = threading.Thread(target=self.run_writer, name='region-writer', daemon=True)
+        self.writer.start()
+        atexit.register(self.close)
+
+    @staticmethod
+    def region_key(chunk_key):
+        return (chunk_key[0] // REGION_SIZE, chunk_key[1] // REGION_SIZE)
+
+    def region(self, region_key):
+        region = self.regions.get(region_key)
+        if region is None:
+            path = os.path.join(self.directory, f'r.{region_key[0]}.{region_key[1]}.region')
+            region = self.regions[region_key] = RegionFile(path)
+        return region
+
+    def load_chunk(self, chunk_key):
+        # Latest payload for a chunk, or None if it was never saved
+        with self.lock:
+            if chunk_key in self.dirty:
+                return self.dirty[chunk_key]
+            if chunk_key in self.writing:
+                return self.writing[chunk_key]
+            return self.region(self.region_key(chunk_key)).read(RegionFile.chunk_index(chunk_key))
+
+    def save_chunk(self, chunk_key, payload):
+        # Queue a chunk for the next batched write, payload None deletes it
+        with self.lock:
+            self.dirty[chunk_key] = payload
+            self.wake.notify()
+
+    def run_writer(self):
+        while True:
+            with self.lock:
+                while not self.dirty and not self.closed:
+                    self.wake.wait()
+                if not self.closed:
+                    # Give further edits a moment to land in the same batch
+                    self.wake.wait(self.flush_delay)
+                closing = self.closed
+            self.write_dirty()
+            if closing:
+                return
+
+    def write_dirty(self):
+        with self.write_lock:
+            with self.lock:
+                self.writing, self.dirty = self.dirty, {}
+                by_region = {}
+                for chunk_key, payload in self.writing.items():
+                    by_region.setdefault(self.region_key(chunk_key), {})[chunk_key] = payload
+
+            for region_key, chunks in by_region.items():
+                try:
+                    self.write_region(region_key, chunks)
+                except OSError as e:
+                    print(f"Failed to save region {region_key}: {e}")
+                    with self.lock:
+                        for chunk_key, payload in chunks.items():
+                            self.dirty.setdefault(chunk_key, payload)
+
+            with self.lock:
+                self.writing = {}
+
+    def write_region(self, region_key, chunks):
+        # Only the dirty chunks are compressed and written, appended after the region's payloads.
+        # Regions that are new, in the old format or mostly dead space are written out whole.
+        changes = {RegionFile.chunk_index(chunk_key): zlib.compress(payload) if payload is not None else None
+                   for chunk_key, payload in chunks.items()}
+        with self.lock:
+            region = self.region(region_key)
+            plan = region.plan_append(changes)
+            if plan is None:
+                payloads = region.stored_payloads()
+        if plan is not None:
+            try:
+                region.append(plan, changes)
+            finally:
+                with self.lock:
+                    region.close()  # Mapped again on the next read, with the new table
+            return
+
+        for index, payload in changes.items():
+            if payload is None:
+                payloads.pop(index, None)
+            else:
+                payloads[index] = payload
+        temp_path = region.write_temp(payloads)
+        with self.lock:
+            region.replace(temp_path)
+
+    def flush(self):
+        # Write everything out now, on the calling thread
+        self.write_dirty()
+
+    def close(self):
+        if self.closed:
+            return
+        with self.lock:
+            self.closed = True
+            self.wake.notify()
+        self.writer.join()
+        with self.lock:
+            for region in self.regions.values():
+                region.close()
@@ -0,0 +1,256 @@
+import argparse
+import json
+import math
+import os
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# Headless: render into an offscreen buffer and skip audio, this has to happen before Ursina loads
+from panda3d.core import loadPrcFileData, ClockObject
+loadPrcFileData('', 'window-type offscreen\naudio-library-name null')
+
+import numpy as np
+from ursina import Ursina, application, mouse
+from inputtrace import InputTrace
+from player import Player, EYE_HEIGHT
+from mobmanager import MobManager
+from profiler import profiler
+from worldgen import WorldGen, DEFAULT_SEED, SEED_FILE
+
+SPIKES = 10  # Worst frames listed in the report
+FRAME_BUCKETS_MS = [8, 16, 33, 50, 100]  # Upper bounds of the frame time histogram buckets
+SKIPPED_KEYS = {'escape'}  # Would quit the replay
+HOUSE_RADIUS = 3  # The sprint-build walls stand this many blocks out from the player
+HOUSE_HEIGHT = 3
+MAX_SITE_SEARCH = 200  # Further blocks sprinted looking for level ground to build on
+TURN_FRAMES = 6  # Frames spent turning to the next block before placing it
+# Counters worth a per second rate in the report
+THROUGHPUT = ['chunks installed', 'chunks unloaded', 'meshes built', 'lods built', 'block updates', 'mob ticks']
+
+# An offscreen buffer has no window to capture the cursor in, so the controller's mouse lock has
+# nothing to do
+type(mouse).locked = property(lambda mouse: False, lambda mouse, value: None)
+
+
+class TraceReplay:
+    # Plays an InputTrace back through the real Player, Chunkgen and MobManager in an offscreen
+    # app, so generation, meshing, unloading, mob spawns and saves all interact like they do in
+    # play. Every run starts from a fresh world of the trace's seed with seeded randomness and
+    # steps a fixed dt per frame; each frame replays that frame's input events, then the player is
+    # put at its recorded pose. Only the background workers' timing differs from run to run.
+    def __init__(self, trace, spikes=SPIKES):
+        self.trace = trace
+        self.spikes = spikes
+        self.frame_times = []  # Wall seconds per replayed frame
+        self.frame_scopes = []  # Profiler scopes of each frame
+        self.frame_counters = []  # Profiler counters of each frame
+        self.frame_accounted = []  # Seconds of each frame inside outermost scopes
+
+    def setup(self, app):
+        # Saves go to a scratch world instead of the player's, created with the trace's seed
+        self.directory = tempfile.TemporaryDirectory()
+        os.chdir(self.directory.name)
+        os.makedirs(os.path.join('saves', 'world'))
+        with open(os.path.join('saves', 'world', SEED_FILE), 'w') as file:
+            json.dump({'seed': self.trace.seed}, file)
+        random.seed(self.trace.seed)
+
+        self.player = player = Player()
+        player.enabled = False  # Until the spawn chunk is in, like behind the menu
+        player.mob_manager = MobManager(player)
+        player.mob_manager.sim.rng = np.random.default_rng(self.trace.seed)
+        self.set_pose(self.trace.frames[0])
+        while not player.chunk_manager.spawn_ready():
+            player.chunk_manager.update_terrain(wait=False)
+            app.step()
+        player.enabled = True
+
+        # Every frame from here on advances the game by exactly one recorded frame time
+        globalClock.setMode(ClockObject.MNonRealTime)
+        globalClock.setDt(self.trace.frame_time)
+        profiler.enabled = True
+        profiler.reset()
+
+    def set_pose(self, frame):
+        x, y, z, yaw, pitch, _ = frame
+        self.player.position = (x, y, z)
+        self.player.rotation_y = yaw
+        self.player.camera_pivot.rotation_x = pitch
+
+    def run(self, app):
+        self.setup(app)
+        player = self.player
+        for frame in self.trace.frames:
+            start = time.perf_counter()
+            for key in frame[5]:
+                if key not in SKIPPED_KEYS:
+                    player.input(key)
+            app.step()
+            self.frame_times.append(time.perf_counter() - start)
+            # Player.update opened a new profiler frame at its start, so this is all of this one
+            self.frame_scopes.append(dict(profiler.frame_scopes))
+            self.frame_counters.append(dict(profiler.frame_counters))
+            self.frame_accounted.append(profiler.accounted)
+            self.set_pose(frame)
+        profiler.enabled = False
+        player.saves.close()
+        return self.results()
+
+    def results(self):
+        times = sorted(self.frame_times)
+        simulated = len(times) * self.trace.frame_time
+        counters = {}
+        for frame_counters in self.frame_counters:
+            for name, count in frame_counters.items():
+                counters[name] = counters.get(name, 0) + count
+
+        buckets = {}
+        low = 0
+        for high in FRAME_BUCKETS_MS + [math.inf]:
+            name = f'{low}-{high} ms' if high != math.inf else f'{low}+ ms'
+            buckets[name] = sum(1 for seconds in times if low <= seconds * 1000 < high)
+            low = high
+
+        worst = sorted(range(len(self.frame_times)), key=lambda i: -self.frame_times[i])[:self.spikes]
+        spikes = []
+        for i in worst:
+            scopes = sorted(self.frame_scopes[i].items(), key=lambda item: -item[1])[:4]
+            spikes.append({
+                'frame': i,
+                'ms': self.frame_times[i] * 1000,
+                'scopes': {name: seconds * 1000 for name, seconds in scopes},
+                # Outside every scope: rendering, engine tasks, waiting on the worker processes
+                'unaccounted_ms': max(self.frame_times[i] - self.frame_accounted[i], 0.0) * 1000,
+                'counters': self.frame_counters[i],
+            })
+
+        return {
+            'meta': {
+                'frames': len(times),
+                'seed': self.trace.seed,
+                'frame_time': self.trace.frame_time,
+                'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            },
+            'wall_seconds': sum(times),
+            'simulated_seconds': simulated,
+            'frame_ms': {
+                'mean': sum(times) / len(times) * 1000,
+                'p50': profiler.percentile(times, 0.5) * 1000,
+                'p90': profiler.percentile(times, 0.9) * 1000,
+                'p99': profiler.percentile(times, 0.99) * 1000,
+                'max': times[-1] * 1000,
+            },
+            'histogram': buckets,
+            'spikes': spikes,
+            'counters': counters,
+            'throughput': {name: counters.get(name, 0) / simulated for name in THROUGHPUT},
+        }
+
+    @staticmethod
+    def print_results(results):
+        meta = results['meta']
+        print(f"{meta['frames']} frames, {results['simulated_seconds']:.1f} s of play in {results['wall_seconds']:.1f} s")
+        print("frame ms  " + "  ".join(f"{name} {ms:.1f}" for name, ms in results['frame_ms'].items()))
+        print("histogram " + "  ".join(f"{name}: {count}" for name, count in results['histogram'].items()))
+        for name, rate in results['throughput'].items():
+            print(f"{name:<20} {results['counters'].get(name, 0):8d} total {rate:8.2f} /s")
+        print("worst frames:")
+        for spike in results['spikes']:
+            scopes = ", ".join(f"{name} {ms:.1f}" for name, ms in spike['scopes'].items())
+            print(f"  #{spike['frame']:<6} {spike['ms']:7.1f} ms  unaccounted {spike['unaccounted_ms']:.1f}, {scopes}")
+
+
+class Scenarios:
+    # Synthetic traces, for benchmarks that shouldn't depend on somebody recording one by hand
+    @staticmethod
+    def sprint_build(seed=DEFAULT_SEED, distance=500, speed=8.0, frame_time=1 / 60):
+        # Sprint `distance` blocks along +x over the terrain, on to the next level spot, then stop
+        # and build the walls of a house around the player, a layer of a new block per round.
+        # Every placement looks straight at the top of the wall column it goes on, worked out from
+        # the terrain height.
+        worldgen = WorldGen(seed)
+        trace = InputTrace(seed, frame_time)
+        x, z = 0.0, 0.0
+        step = speed * frame_time
+        travelled = 0.0
+        while travelled < distance or (travelled < distance + MAX_SITE_SEARCH and not Scenarios.level(worldgen, round(x), round(z))):
+            trace.add_frame(x, worldgen.get_height_at(round(x), round(z)), z, 90, 10)
+            x += step
+            travelled += step
+
+        x, z = round(x), round(z)
+        y = worldgen.get_height_at(x, z)
+        walls = [(x + dx, z + dz) for dx in range(-HOUSE_RADIUS, HOUSE_RADIUS + 1) for dz in range(-HOUSE_RADIUS, HOUSE_RADIUS + 1)
+                 if max(abs(dx), abs(dz)) == HOUSE_RADIUS]
+        walls.sort(key=lambda column: math.atan2(column[0] - x, column[1] - z))  # Turn around once per layer
+        yaw, pitch = 90, 10
+        for layer in range(HOUSE_HEIGHT):
+            if layer:
+                trace.add_frame(x, y, z, yaw, pitch, ['scroll up'])
+            for wall_x, wall_z in walls:
+                top = worldgen.get_height_at(wall_x, wall_z) + layer
+                target_yaw = math.degrees(math.atan2(wall_x - x, wall_z - z))
+                target_pitch = math.degrees(math.atan2(y + EYE_HEIGHT - top, math.hypot(wall_x - x, wall_z - z)))
+                turn = (target_yaw - yaw + 180) % 360 - 180
+                for frame in range(1, TURN_FRAMES + 1):
+                    trace.add_frame(x, y, z, yaw + turn * frame / TURN_FRAMES, pitch + (target_pitch - pitch) * frame / TURN_FRAMES)
+                yaw, pitch = target_yaw, target_pitch
+                trace.add_frame(x, y, z, yaw, pitch, ['right mouse down'])
+        return trace
+
+    @staticmethod
+    def level(worldgen, x, z):
+        # Room for the house: nothing inside it higher than the floor, which would block the view
+        # of the walls or end up with a block placed into the player, and the wall columns at most
+        # a block lower
+        floor = worldgen.get_height_at(x, z)
+        for dx in range(-HOUSE_RADIUS, HOUSE_RADIUS + 1):
+            for dz in range(-HOUSE_RADIUS, HOUSE_RADIUS + 1):
+                height = worldgen.get_height_at(x + dx, z + dz)
+                if height > floor or height < floor - 1:
+                    return False
+        return True
+
+
+SCENARIOS = {'sprint-build': Scenarios.sprint_build}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay a recorded MineClone input trace headless and time every frame")
+    parser.add_argument('trace', help="Trace recorded with main.py --record (or written by --generate)")
+    parser.add_argument('--generate', choices=sorted(SCENARIOS), help="Write this synthetic scenario to the trace path first")
+    parser.add_argument('--seed', type=int, default=DEFAULT_SEED, help="World seed for --generate")
+    parser.add_argument('--distance', type=int, default=500, help="Blocks to sprint for --generate sprint-build")
+    parser.add_argument('--output', default='replay_results.json', help="Where to write the JSON results")
+    parser.add_argument('--spikes', type=int, default=SPIKES, help="Worst frames to list")
+    args = parser.parse_args(argv)
+
+    trace_path = os.path.abspath(args.trace)
+    output_path = os.path.abspath(args.output)
+    if args.generate:
+        SCENARIOS[args.generate](seed=args.seed, distance=args.distance).save(trace_path)
+        print(f"Wrote the {args.generate} scenario to {trace_path}")
+    try:
+        trace = InputTrace.load(trace_path)
+    except (OSError, ValueError) as e:
+        print(f"Failed to load input trace: {e}")
+        return 1
+    if not trace.frames:
+        print(f"{trace_path} has no frames")
+        return 1
+
+    app = Ursina(window_type='offscreen', development_mode=False)
+    application.asset_folder = Path(__file__).resolve().parent  # The replay runs in a scratch directory
+    results = TraceReplay(trace, spikes=args.spikes).run(app)
+    TraceReplay.print_results(results)
+    with open(output_path, 'w') as file:
+        json.dump(results, file, indent=2)
+    print(f"Results written to {output_path}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
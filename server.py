@@ -0,0 +1,223 @@
+import argparse
+import asyncio
+import itertools
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from blocks import BLOCKS
+from blockticks import BlockTicker
+from edits import EditOverlay
+from mobsim import MobSimulation, FREE
+from protocol import Protocol, DEFAULT_HOST, DEFAULT_PORT, MAX_MOBS, REQUEST, CANCEL, EDIT, BLOCK, POSITION, DAMAGE
+from regionfile import RegionStore
+from world import World, Chunk, MIN_Y, MAX_Y
+from worldgen import WorldGen
+
+
+class ClientSession:
+    # One connected game client
+    def __init__(self, client_id, writer):
+        self.id = client_id
+        self.writer = writer
+        self.wanted = set()  # Chunk keys the client asked for and hasn't cancelled or dropped yet
+        self.position = None  # Last reported player position, None until the first report
+
+    def send(self, frame):
+        if not self.writer.is_closing():
+            self.writer.write(frame)
+
+
+class WorldServer:
+    # Headless, authoritative world: generates chunks, stores edits and runs the mobs for any
+    # number of game clients on the same machine, on its own process (and so its own core). Runs
+    # on one asyncio loop, only generation goes to worker threads. Clients get a compressed
+    # snapshot of every chunk they request and after that only the edits other players make.
+    def __init__(self, directory, host=DEFAULT_HOST, port=DEFAULT_PORT, workers=None, max_mobs=20):
+        self.host = host
+        self.port = port
+        self.store = RegionStore(directory)
+        self.edits = EditOverlay(self.store)
+        self.worldgen = WorldGen(WorldGen.load_seed(directory))
+        self.world = World()  # Chunks at least one client wants, with their edits applied
+        self.executor = ThreadPoolExecutor(max_workers=workers or max(1, min(4, (os.cpu_count() or 2) - 1)))
+        self.generating = {}  # Chunk key -> Future of the chunk being generated
+        self.sessions = {}  # Client ID -> ClientSession
+        self.client_ids = itertools.count(1)
+        self.tasks = set()  # Chunk sends in flight, referenced so they aren't collected mid-run
+        self.mobs = MobSimulation(self.world, max_mobs=max_mobs)
+        self.ticker = BlockTicker(self.world, self.edits, self.tick_block)
+
+    async def serve(self):
+        server = await asyncio.start_server(self.handle_client, self.host, self.port)
+        print(f"World server listening on {self.host}:{self.port}")
+        async with server:
+            runners = [asyncio.create_task(self.run_mobs()), asyncio.create_task(self.run_ticks())]
+            try:
+                await server.serve_forever()
+            finally:
+                for runner in runners:
+                    runner.cancel()
+                self.close()
+
+    def close(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        self.ticker.save()
+        self.store.close()
+
+    async def handle_client(self, reader, writer):
+        session = ClientSession(next(self.client_ids), writer)
+        self.sessions[session.id] = session
+        session.send(Protocol.encode_welcome(session.id, self.worldgen.seed, self.mobs.max_mobs))
+        print(f"Client {session.id} connected")
+        try:
+            while True:
+                message_type, payload = await Protocol.read(reader)
+                self.handle_message(session, message_type, Protocol.decode(message_type, payload))
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        except ValueError as e:
+            print(f"Dropping client {session.id}: {e}")
+        finally:
+            del self.sessions[session.id]
+            session.wanted.clear()
+            self.release_chunks()
+            writer.close()
+            print(f"Client {session.id} disconnected")
+
+    def handle_message(self, session, message_type, args):
+        if message_type == REQUEST:
+            # Always answered with a snapshot, even for a chunk the client already has: it asks
+            # again when its own copy went stale
+            for chunk_key in args[0]:
+                session.wanted.add(chunk_key)
+                task = asyncio.create_task(self.send_chunk(session, chunk_key))
+                self.tasks.add(task)
+                task.add_done_callback(self.tasks.discard)
+        elif message_type == CANCEL:
+            session.wanted.difference_update(args[0])
+            self.release_chunks()
+        elif message_type == EDIT:
+            self.edit(session, *args)
+        elif message_type == POSITION:
+            session.position = args
+        elif message_type == DAMAGE:
+            self.mobs.damage_mob(*args)
+        else:
+            raise ValueError(f"Unexpected message type {message_type}")
+
+    async def send_chunk(self, session, chunk_key):
+        chunk = await self.load_chunk(chunk_key)
+        if chunk is None:
+            return
+        if chunk_key not in session.wanted or session.id not in self.sessions:
+            if not any(chunk_key in other.wanted for other in self.sessions.values()):
+                self.unload_chunk(chunk_key)  # Cancelled while it was generating
+            return
+        # Snapshot and send without yielding, so every edit is either in it or broadcast after it
+        session.send(Protocol.encode_chunk(chunk_key, chunk.blocks))
+        try:
+            await session.writer.drain()
+        except ConnectionError:
+            pass
+
+    async def load_chunk(self, chunk_key):
+        chunk = self.world.get_chunk(chunk_key)
+        if chunk is not None:
+            return chunk
+        future = self.generating.get(chunk_key)
+        if future is None:
+            future = self.generating[chunk_key] = asyncio.get_running_loop().run_in_executor(self.executor, self.worldgen.generate, chunk_key)
+        try:
+            generated = await future
+        except Exception as e:
+            print(f"Failed to generate chunk {chunk_key}: {e}")
+            return None
+        finally:
+            self.generating.pop(chunk_key, None)
+        chunk = self.world.get_chunk(chunk_key)
+        if chunk is None:
+            chunk = Chunk(chunk_key, generated.blocks)
+            self.edits.apply(chunk)
+            self.world.add_chunk(chunk)
+            self.ticker.load_chunk(chunk_key)
+        return chunk
+
+    def release_chunks(self):
+        # Forget chunks no client wants any more, they are regenerated from the seed and edits
+        wanted = set().union(*(session.wanted for session in self.sessions.values()))
+        for chunk_key in [key for key in self.world.chunks if key not in wanted]:
+            self.unload_chunk(chunk_key)
+
+    def unload_chunk(self, chunk_key):
+        self.ticker.unload_chunk(chunk_key)
+        self.world.remove_chunk(chunk_key)
+        self.edits.unload(chunk_key)
+
+    def edit(self, session, x, y, z, block_id):
+        if not MIN_Y <= y < MAX_Y or block_id not in BLOCKS:
+            return
+        self.edits.set(x, y, z, block_id)
+        self.world.set_block(x, y, z, block_id)  # Only lands if the chunk is loaded
+        self.ticker.notify(x, y, z)
+        # Everyone else hears about it, clients that don't have the chunk drop any stale copy
+        frame = Protocol.encode_block(BLOCK, x, y, z, block_id)
+        for other in self.sessions.values():
+            if other is not session:
+                other.send(frame)
+
+    def tick_block(self, x, y, z, block_id):
+        # Change made by a block update, everyone hears about it
+        self.edits.set(x, y, z, block_id)
+        self.world.set_block(x, y, z, block_id)
+        frame = Protocol.encode_block(BLOCK, x, y, z, block_id)
+        for session in self.sessions.values():
+            session.send(frame)
+
+    async def run_ticks(self):
+        last = time.perf_counter()
+        while True:
+            await asyncio.sleep(self.ticker.tick_time)
+            now = time.perf_counter()
+            dt, last = now - last, now
+            self.ticker.step(dt)
+
+    async def run_mobs(self):
+        last = time.perf_counter()
+        while True:
+            await asyncio.sleep(self.mobs.tick_time)
+            now = time.perf_counter()
+            dt, last = now - last, now
+            sessions = [session for session in self.sessions.values() if session.position is not None]
+            if not sessions:
+                continue
+            hits, ticks = self.mobs.step(dt, np.array([session.position for session in sessions]))
+            for session, damage in zip(sessions, hits.tolist()):
+                if damage:
+                    session.send(Protocol.encode_hurt(damage))
+            if ticks:
+                slots = np.flatnonzero(self.mobs.state != FREE)
+                frame = Protocol.encode_mobs(slots, self.mobs.state[slots], self.mobs.hostile[slots], self.mobs.positions[slots], self.mobs.health[slots])
+                for session in self.sessions.values():
+                    session.send(frame)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Headless MineClone world server")
+    parser.add_argument('--directory', default=os.path.join('saves', 'world'), help="World save directory")
+    parser.add_argument('--host', default=DEFAULT_HOST)
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--workers', type=int, default=None, help="Chunk generation threads")
+    parser.add_argument('--max-mobs', type=int, default=20, help="Mob population cap shared by all players")
+    args = parser.parse_args(argv)
+    if not 0 <= args.max_mobs <= MAX_MOBS:
+        parser.error(f"--max-mobs must be between 0 and {MAX_MOBS}")
+    try:
+        asyncio.run(WorldServer(args.directory, args.host, args.port, args.workers, max_mobs=args.max_mobs).serve())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
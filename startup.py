@@ -0,0 +1,99 @@
+import threading
+import time
+from ursina import Entity
+from profiler import profiler
+
+
+class StartupTimer:
+    # Seconds from process start to each loading milestone, printed once loading is done and kept
+    # as profiler gauges for the F3 overlay
+    def __init__(self, start):
+        self.start = start  # perf_counter time the process started running our code
+        self.marks = []
+
+    def mark(self, name):
+        self.marks.append((name, time.perf_counter() - self.start))
+
+    def report(self):
+        for name, seconds in self.marks:
+            profiler.gauge(f"startup {name}", f"{seconds:.2f} s")
+        print("Startup: " + ", ".join(f"{name} {seconds:.2f} s" for name, seconds in self.marks))
+
+
+class Loader(Entity):
+    # Brings the game up behind the main menu. The heavy modules, the player and the spawn area are
+    # set up a step per frame, so the menu is on screen before any of them, and terrain streams in
+    # around the spawn point without stalling a frame on it. The menu gets the player as soon as
+    # the chunk under it is loaded and meshed.
+    def __init__(self, menu, timer, server_address=None, record=None):
+        super().__init__()
+        self.menu = menu
+        self.timer = timer
+        self.server_address = server_address  # "host:port" of a world server to join, None plays locally
+        self.record = record  # Path to record an input trace of the session to, for replay.py
+        self.player = None
+        self.edits_loaded = threading.Event()
+        self.steps = self.load()
+
+    def update(self):
+        try:
+            next(self.steps)
+        except StopIteration:
+            self.enabled = False
+
+    def load(self):
+        self.timer.mark('menu')
+        yield  # Let the menu draw before anything else
+
+        from player import Player
+        from mobmanager import MobManager
+        from client import WorldClient
+        from protocol import Protocol
+        from inputtrace import InputRecorder
+        self.timer.mark('modules')
+        yield
+
+        client = None
+        if self.server_address:
+            try:
+                host, port = Protocol.parse_address(self.server_address)
+                client = WorldClient(host, port)
+            except (OSError, TimeoutError, ValueError) as e:
+                # Keeps loading the local world, so Start still has something to start
+                print(f"Failed to join the world server at {self.server_address}: {e}")
+                self.menu.show_error(f"Couldn't join {self.server_address}: {e}\nStart plays locally instead")
+        player = self.player = Player(client)
+        player.enabled = False  # Until the menu starts the game
+        player.mob_manager = MobManager(player, client=player.client)
+        if self.record:
+            player.recorder = InputRecorder(self.record, player.chunk_manager.worldgen.seed)
+        self.timer.mark('player')
+        yield
+
+        # The old JSON save is converted on a worker thread. Chunks merge their saved edits as they
+        # install, so streaming waits for it.
+        threading.Thread(target=self.load_edits, daemon=True).start()
+        while not self.edits_loaded.is_set():
+            yield
+        self.timer.mark('saved edits')
+
+        chunk_manager = player.chunk_manager
+        while not chunk_manager.spawn_ready():
+            chunk_manager.update_terrain(wait=False)
+            yield
+        self.timer.mark('spawn chunk')
+        self.timer.report()
+        self.menu.set_player(player)
+
+        # The rest of the render distance keeps filling in for as long as the menu stays up
+        while not player.enabled:
+            chunk_manager.update_terrain()
+            yield
+
+    def load_edits(self):
+        try:
+            self.player.load_placed_blocks()
+        except Exception as e:
+            print(f"Failed to load placed blocks: {e}")
+        finally:
+            self.edits_loaded.set()
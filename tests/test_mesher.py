@@ -0,0 +1,77 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import random
+import lighting
+from blocks import GLASS, LEAVES, STONE, AIR, LOG
+from lighting import LightEngine, SKY, BLOCK
+from mesher import Mesher
+from world import World
+
+
+def build(blocks, light=True):
+    # Meshes chunk (0, 0) of a world holding `blocks` ({(x, y, z): block ID}), lit like in game
+    world = World()
+    chunk = world.get_or_create_chunk((0, 0))
+    for (x, y, z), block_id in blocks.items():
+        chunk.set(x, y, z, block_id)
+    mesh_light = None
+    if light:
+        engine = LightEngine(world)
+        engine.add_chunk(chunk)
+        mesh_light = engine.mesh_light((0, 0))
+    return Mesher.build_padded(Mesher.padded_voxels(world, chunk), light=mesh_light)
+
+
+def test_single_block_has_six_faces():
+    for block_id in (GLASS, LEAVES, STONE):
+        mesh = build({(8, 10, 8): block_id})
+        assert mesh.quad_count == 6
+        assert all(quad[0] == block_id for quad in mesh.quads)
+
+
+def test_no_quads_for_air():
+    blocks = {(x, 10, z): GLASS for x in range(4) for z in range(4)}
+    blocks.update({(x, 11, 2): LEAVES for x in range(6, 12)})
+    blocks[(5, 9, 5)] = STONE
+    blocks[(1, 10, 1)] = AIR
+    for light in (True, False):
+        mesh = build(blocks, light)
+        assert mesh.quad_count > 0
+        assert not any(quad[0] == AIR for quad in mesh.quads)
+
+
+def test_incremental_light_matches_full_relight(monkeypatch):
+    # Edits under and around a roof across a chunk border, relit one at a time, should leave the
+    # same light as lighting the finished chunks from scratch. Logs glow here so the block light
+    # channel gets exercised too.
+    emission = lighting.EMISSION.copy()
+    emission[LOG] = 14
+    monkeypatch.setattr(lighting, 'EMISSION', emission)
+    world = World()
+    keys = [(0, 0), (1, 0), (0, 1)]
+    for chunk_key in keys:
+        chunk = world.get_or_create_chunk(chunk_key)
+        for x in range(16):
+            for z in range(16):
+                chunk.set(x, 10, z, STONE)
+    engine = LightEngine(world)
+    for chunk_key in keys:
+        engine.add_chunk(world.get_chunk(chunk_key))
+
+    rng = random.Random(1)
+    edits = [(x, 20, z, STONE) for x in range(8, 24) for z in range(4, 20)]  # Roof
+    edits += [(rng.randrange(6, 26), rng.randrange(11, 22), rng.randrange(2, 22), rng.choice((AIR, AIR, STONE, GLASS, LEAVES, LOG)))
+              for _ in range(150)]
+    for x, y, z, block_id in edits:
+        world.set_block(x, y, z, block_id)
+        engine.update_block(x, y, z)
+
+    relit = LightEngine(world)
+    for chunk_key in keys:
+        relit.add_chunk(world.get_chunk(chunk_key))
+    for chunk_key in keys:
+        for channel in (SKY, BLOCK):
+            assert engine.chunks[chunk_key].channels[channel] == relit.chunks[chunk_key].channels[channel], (chunk_key, channel)
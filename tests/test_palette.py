@@ -0,0 +1,24 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import pytest
+from palette import SectionPalette
+from world import CHUNK_VOLUME
+
+
+@pytest.mark.parametrize('distinct', [1, 2, 17, 256])
+def test_round_trip(distinct):
+    rng = np.random.default_rng(distinct)
+    ids = rng.permutation(256)[:distinct].astype(np.uint8)
+    blocks = bytearray(ids[rng.integers(0, distinct, CHUNK_VOLUME)].tobytes())
+    blocks[:distinct] = ids.tobytes()  # Every ID shows up at least once
+    assert SectionPalette.decode(SectionPalette.encode(blocks)) == blocks
+
+
+def test_truncated_data_is_rejected():
+    data = SectionPalette.encode(bytearray(range(256)) * (CHUNK_VOLUME // 256))
+    with pytest.raises(ValueError):
+        SectionPalette.decode(data[:-1])
@@ -0,0 +1,80 @@
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import pytest
+from blocks import STONE, GLASS
+from protocol import (Protocol, HEADER, MAX_PAYLOAD, WELCOME, REQUEST, CANCEL, CHUNK, EDIT, BLOCK, POSITION, MOBS,
+                      DAMAGE, HURT)
+from world import CHUNK_VOLUME
+
+
+def read(frames):
+    # Every (message type, decoded arguments) in `frames`, read back like the other end does
+    async def read_all():
+        reader = asyncio.StreamReader()
+        reader.feed_data(b''.join(frames))
+        reader.feed_eof()
+        messages = []
+        for _ in frames:
+            message_type, payload = await Protocol.read(reader)
+            messages.append((message_type, Protocol.decode(message_type, payload)))
+        return messages
+    return asyncio.run(read_all())
+
+
+def test_fixed_size_messages():
+    frames = [
+        Protocol.encode_welcome(3, -1234567890123, 400),
+        Protocol.encode_keys(REQUEST, [(0, 0), (-5, 7)]),
+        Protocol.encode_keys(CANCEL, []),
+        Protocol.encode_block(EDIT, -20, -32, 99, STONE),
+        Protocol.encode_block(BLOCK, 1, 95, -1, GLASS),
+        Protocol.encode_position(1.5, 64.0, -2.25),
+        Protocol.encode_damage(65535, 2.5),
+        Protocol.encode_hurt(4.0),
+    ]
+    assert read(frames) == [
+        (WELCOME, (3, -1234567890123, 400)),
+        (REQUEST, ([(0, 0), (-5, 7)],)),
+        (CANCEL, ([],)),
+        (EDIT, (-20, -32, 99, STONE)),
+        (BLOCK, (1, 95, -1, GLASS)),
+        (POSITION, (1.5, 64.0, -2.25)),
+        (DAMAGE, (65535, 2.5)),
+        (HURT, (4.0,)),
+    ]
+
+
+def test_chunk():
+    blocks = bytearray(CHUNK_VOLUME)
+    blocks[:CHUNK_VOLUME // 2] = bytes([STONE]) * (CHUNK_VOLUME // 2)
+    blocks[1000] = GLASS
+    [(message_type, (chunk_key, decoded))] = read([Protocol.encode_chunk((-3, 8), blocks)])
+    assert message_type == CHUNK
+    assert chunk_key == (-3, 8)
+    assert decoded == blocks
+
+
+def test_mobs():
+    slots = np.array([0, 7, 65535])
+    states = np.array([1, 2, 3])
+    hostile = np.array([True, False, True])
+    positions = np.array([[0.5, 10.0, -3.0], [1.0, 2.0, 3.0], [-100.25, 40.0, 7.5]])
+    health = np.array([20.0, 0.5, 8.0])
+    [(message_type, decoded)] = read([Protocol.encode_mobs(slots, states, hostile, positions, health)])
+    assert message_type == MOBS
+    for sent, received in zip((slots, states, hostile, positions, health), decoded):
+        assert np.array_equal(sent, received)
+
+
+def test_bad_frames_are_rejected():
+    with pytest.raises(ValueError):
+        read([HEADER.pack(MAX_PAYLOAD + 1, CHUNK)])
+    with pytest.raises(ValueError):
+        read([Protocol.frame(CHUNK, b'\0' * 8 + b'not zlib')])
+    with pytest.raises(ValueError):
+        read([Protocol.frame(99)])
@@ -0,0 +1,48 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from regionfile import RegionStore, RegionFile, HEADER, SLOT, SLOT_SIZE
+
+
+def save(directory, chunks):
+    # Writes {chunk key: payload or None} through a store of its own, like one play session
+    store = RegionStore(directory)
+    for chunk_key, payload in chunks.items():
+        store.save_chunk(chunk_key, payload)
+    store.flush()
+    store.close()
+
+
+def load(directory, chunk_keys):
+    store = RegionStore(directory)
+    payloads = {chunk_key: store.load_chunk(chunk_key) for chunk_key in chunk_keys}
+    store.close()
+    return payloads
+
+
+def test_save_and_reopen(tmp_path):
+    keys = [(0, 0), (1, 0), (-1, 5), (40, 0)]  # (40, 0) is in another region
+    save(tmp_path, {(0, 0): b'a' * 500, (1, 0): b'b', (-1, 5): bytes(range(256)), (40, 0): b'far'})
+    assert load(tmp_path, keys) == {(0, 0): b'a' * 500, (1, 0): b'b', (-1, 5): bytes(range(256)), (40, 0): b'far'}
+
+    # The second save appends, only the chunks in it change
+    save(tmp_path, {(0, 0): b'c' * 100, (1, 0): None})
+    assert load(tmp_path, keys + [(2, 2)]) == {(0, 0): b'c' * 100, (1, 0): None, (-1, 5): bytes(range(256)), (40, 0): b'far', (2, 2): None}
+
+
+def test_torn_table_falls_back_to_the_previous_save(tmp_path):
+    save(tmp_path, {(0, 0): b'first', (3, 3): b'kept'})
+    save(tmp_path, {(0, 0): b'second'})
+    assert load(tmp_path, [(0, 0)]) == {(0, 0): b'second'}
+
+    # Tear the table the second save wrote: the region should read as it was after the first
+    region = RegionFile(os.path.join(tmp_path, 'r.0.0.region'))
+    region.open()
+    slot = region.slot
+    region.close()
+    with open(region.path, 'r+b') as file:
+        file.seek(HEADER.size + slot * SLOT_SIZE + SLOT.size + 10)
+        file.write(b'\xff\xff')
+    assert load(tmp_path, [(0, 0), (3, 3)]) == {(0, 0): b'first', (3, 3): b'kept'}
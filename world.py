@@ -0,0 +1,136 @@
+import math
+from blocks import BLOCKS, AIR
+
+CHUNK_SIZE = 16
+MIN_Y = -32
+MAX_Y = 96  # Exclusive
+CHUNK_HEIGHT = MAX_Y - MIN_Y
+CHUNK_VOLUME = CHUNK_SIZE * CHUNK_SIZE * CHUNK_HEIGHT
+SECTION_HEIGHT = 16  # Chunks are drawn and culled in cubes of this height
+SECTIONS = CHUNK_HEIGHT // SECTION_HEIGHT
+
+# Voxels hold block IDs from the registry, these tables are derived from it for the hot paths
+BLOCK_TEXTURES = BLOCKS.lookup('texture')  # Block ID -> texture path, None for air
+SOLID_BLOCKS = {block_type.id for block_type in BLOCKS if block_type.solid}
+# Blocks that don't hide the faces of their neighbours
+TRANSPARENT_BLOCKS = {block_type.id for block_type in BLOCKS if block_type.transparent and block_type.id != AIR}
+
+
+class Chunk:
+    def __init__(self, key, blocks=None):
+        self.key = key
+        self.origin_x = key[0] * CHUNK_SIZE
+        self.origin_z = key[1] * CHUNK_SIZE
+        # Dense array of block IDs, one byte per voxel, laid out y-major then z then x
+        self.blocks = blocks if blocks is not None else bytearray(CHUNK_VOLUME)
+        self.revision = 0  # Bumped on every change, so anything derived from the blocks can tell it's stale
+
+    @staticmethod
+    def index(local_x, y, local_z):
+        return ((y - MIN_Y) * CHUNK_SIZE + local_z) * CHUNK_SIZE + local_x
+
+    @staticmethod
+    def unpack_index(index):
+        rest, local_x = divmod(index, CHUNK_SIZE)
+        y, local_z = divmod(rest, CHUNK_SIZE)
+        return local_x, y + MIN_Y, local_z
+
+    def get(self, local_x, y, local_z):
+        if not MIN_Y <= y < MAX_Y:
+            return AIR
+        return self.blocks[self.index(local_x, y, local_z)]
+
+    def set(self, local_x, y, local_z, block_id):
+        if not MIN_Y <= y < MAX_Y:
+            return False
+        self.blocks[self.index(local_x, y, local_z)] = block_id
+        self.revision += 1
+        return True
+
+    def top_block(self, local_x, local_z):
+        # Highest solid y in a column, or None if the column is empty
+        column = self.blocks[self.index(local_x, MIN_Y, local_z)::CHUNK_SIZE * CHUNK_SIZE]
+        height = len(column.rstrip(b'\x00'))
+        return height - 1 + MIN_Y if height else None
+
+    def world_position(self, index):
+        local_x, y, local_z = self.unpack_index(index)
+        return self.origin_x + local_x, y, self.origin_z + local_z
+
+
+class World:
+    def __init__(self):
+        self.chunks = {}  # (chunk_x, chunk_z) -> Chunk
+
+    @staticmethod
+    def chunk_key(x, z):
+        # Blocks are centred on integer coordinates, so round before dividing
+        return (math.floor(x + 0.5) // CHUNK_SIZE, math.floor(z + 0.5) // CHUNK_SIZE)
+
+    @staticmethod
+    def block_coords(position):
+        # Block positions are stored as floats on entities, snap them back onto the grid
+        return int(round(position[0])), int(round(position[1])), int(round(position[2]))
+
+    @staticmethod
+    def edited_chunks(x, z):
+        # The chunk of a changed cell, plus the neighbour across the border it sits on: its block
+        # can expose or hide that chunk's border faces, and its light shades them
+        chunk_x, chunk_z = x // CHUNK_SIZE, z // CHUNK_SIZE
+        chunk_keys = [(chunk_x, chunk_z)]
+        local_x, local_z = x % CHUNK_SIZE, z % CHUNK_SIZE
+        if local_x == 0:
+            chunk_keys.append((chunk_x - 1, chunk_z))
+        elif local_x == CHUNK_SIZE - 1:
+            chunk_keys.append((chunk_x + 1, chunk_z))
+        if local_z == 0:
+            chunk_keys.append((chunk_x, chunk_z - 1))
+        elif local_z == CHUNK_SIZE - 1:
+            chunk_keys.append((chunk_x, chunk_z + 1))
+        return chunk_keys
+
+    def get_chunk(self, chunk_key):
+        return self.chunks.get(chunk_key)
+
+    def get_or_create_chunk(self, chunk_key):
+        chunk = self.chunks.get(chunk_key)
+        if chunk is None:
+            chunk = Chunk(chunk_key)
+            self.chunks[chunk_key] = chunk
+        return chunk
+
+    def add_chunk(self, chunk):
+        self.chunks[chunk.key] = chunk
+
+    def remove_chunk(self, chunk_key):
+        return self.chunks.pop(chunk_key, None)
+
+    def locate(self, x, y, z):
+        chunk = self.chunks.get((x // CHUNK_SIZE, z // CHUNK_SIZE))
+        if chunk is None:
+            return None, None
+        return chunk, (x % CHUNK_SIZE, y, z % CHUNK_SIZE)
+
+    def get_block(self, x, y, z):
+        chunk = self.chunks.get((x // CHUNK_SIZE, z // CHUNK_SIZE))
+        if chunk is None:
+            return AIR
+        return chunk.get(x % CHUNK_SIZE, y, z % CHUNK_SIZE)
+
+    def set_block(self, x, y, z, block_id):
+        chunk = self.chunks.get((x // CHUNK_SIZE, z // CHUNK_SIZE))
+        if chunk is None:
+            return False
+        return chunk.set(x % CHUNK_SIZE, y, z % CHUNK_SIZE, block_id)
+
+    def top_block(self, x, z):
+        chunk = self.chunks.get((x // CHUNK_SIZE, z // CHUNK_SIZE))
+        if chunk is None:
+            return None
+        return chunk.top_block(x % CHUNK_SIZE, z % CHUNK_SIZE)
+
+    def has_block(self, x, y, z):
+        return self.get_block(x, y, z) != AIR
+
+    def block_count(self):
+        return sum(CHUNK_VOLUME - chunk.blocks.count(AIR) for chunk in self.chunks.values())
@@ -0,0 +1,236 @@
+import json
+import os
+import random
+import threading
+from collections import OrderedDict
+import numpy as np
+from noise import Noise
+from blocks import AIR, STONE, DIRT, GRASS, GRAVEL, LOG, LEAVES, STONE_BRICKS, COAL_ORE, COPPER_ORE, IRON_ORE, DIAMOND_ORE
+from world import CHUNK_SIZE, CHUNK_HEIGHT, MIN_Y, MAX_Y
+
+BASE_HEIGHT = 10  # Surface height where the noise is 0
+HEIGHT_SCALE = 20  # Blocks of height per unit of noise
+DIRT_DEPTH = 3  # Dirt between the surface block and the stone
+GRAVEL_HEIGHT = 1  # Valley floors at or below this height are gravel instead of grass
+TREE_TRIES = 2  # Tree spots tried per chunk, each one has TREE_CHANCE of growing
+TREE_CHANCE = 0.6
+GRAVE_CHANCE = 1 / 24  # Per chunk
+FEATURE_REACH = 1  # Chunks a decoration can reach into from the chunk it's rooted in
+
+# Ore veins: (block, veins per chunk, lowest y, highest y, blocks per vein). Rarer ores sit deeper.
+ORES = [
+    (COAL_ORE, 10, MIN_Y, 64, 8),
+    (COPPER_ORE, 6, MIN_Y, 40, 6),
+    (IRON_ORE, 6, MIN_Y, 24, 5),
+    (DIAMOND_ORE, 1, MIN_Y, -16, 4),
+]
+
+DEFAULT_SEED = 0
+SEED_FILE = 'level.json'
+
+
+class GeneratedChunk:
+    # Result of generating a chunk off the main thread: plain data, no scene objects
+    def __init__(self, key, blocks, cached=False):
+        self.key = key
+        self.blocks = blocks  # bytearray in Chunk layout
+        self.cached = cached  # Restored from the chunk cache rather than freshly generated
+
+
+class StageCache:
+    # Bounded memo of one generation stage, least recently used chunks dropped first. Shared by
+    # the worker threads, a result computed twice by a race is simply identical.
+    def __init__(self, max_chunks):
+        self.max_chunks = max_chunks
+        self.results = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, chunk_key, build):
+        with self.lock:
+            result = self.results.get(chunk_key)
+            if result is not None:
+                self.results.move_to_end(chunk_key)
+                return result
+        result = build(chunk_key)
+        with self.lock:
+            self.results[chunk_key] = result
+            while len(self.results) > self.max_chunks:
+                self.results.popitem(last=False)
+        return result
+
+
+class WorldGen:
+    # Seeded terrain generation in stages, each a pure function of the seed and chunk key:
+    #   heightmap  -> surface height per column
+    #   strata     -> stone down to the bottom of the world, with ore veins
+    #   surface    -> grass or gravel over dirt on top of the stone
+    #   decoration -> trees and graves, as block lists that may reach into neighbouring chunks
+    # Every stage is memoized per chunk. A chunk takes the decorations of its neighbours from their
+    # own stages rather than having them written into it, so the same seed always gives the same
+    # chunk, in whatever order chunks are generated, and a chunk can be regenerated instead of stored.
+    # Safe to run in worker threads or processes.
+    def __init__(self, seed=DEFAULT_SEED):
+        self.seed = seed
+        self.init_caches()
+
+    def init_caches(self):
+        self.heightmaps = StageCache(1024)
+        self.strata_cache = StageCache(64)
+        self.surfaces = StageCache(64)
+        self.decorations = StageCache(1024)
+
+    def __getstate__(self):
+        # Worker processes get the seed only, they build their own memos
+        return {'seed': self.seed}
+
+    def __setstate__(self, state):
+        self.seed = state['seed']
+        self.init_caches()
+
+    @staticmethod
+    def load_seed(directory):
+        # The seed of the world saved in `directory`, a new random one for a new world
+        path = os.path.join(directory, SEED_FILE)
+        try:
+            with open(path, 'r') as file:
+                return int(json.load(file)['seed'])
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            print(f"Failed to read world seed from {path}: {e}")
+        seed = random.randrange(2 ** 31)
+        try:
+            os.makedirs(directory, exist_ok=True)
+            with open(path, 'w') as file:
+                json.dump({'seed': seed}, file)
+        except OSError as e:
+            print(f"Failed to save world seed to {path}: {e}")
+        return seed
+
+    def rng(self, stage, chunk_key):
+        # Independent, reproducible random stream per stage and chunk
+        return random.Random(f"{self.seed}:{stage}:{chunk_key[0]}:{chunk_key[1]}")
+
+    def generate(self, chunk_key):
+        voxels = self.surface(chunk_key).copy()  # [y][z][x], the same memory layout as Chunk.blocks
+        origin_x = chunk_key[0] * CHUNK_SIZE
+        origin_z = chunk_key[1] * CHUNK_SIZE
+        for dx in range(-FEATURE_REACH, FEATURE_REACH + 1):
+            for dz in range(-FEATURE_REACH, FEATURE_REACH + 1):
+                for x, y, z, block_id, replace in self.decoration((chunk_key[0] + dx, chunk_key[1] + dz)):
+                    local_x, local_z = x - origin_x, z - origin_z
+                    if 0 <= local_x < CHUNK_SIZE and 0 <= local_z < CHUNK_SIZE and MIN_Y <= y < MAX_Y:
+                        cell = (y - MIN_Y, local_z, local_x)
+                        if replace or voxels[cell] == AIR:
+                            voxels[cell] = block_id
+        return GeneratedChunk(chunk_key, bytearray(voxels.tobytes()))
+
+    def heightmap(self, chunk_key):
+        # Stage 1: surface height of every column, indexed [x][z]
+        return self.heightmaps.get(chunk_key, self.build_heightmap)
+
+    def build_heightmap(self, chunk_key):
+        heights = self.sample_heights(chunk_key[0] * CHUNK_SIZE, chunk_key[1] * CHUNK_SIZE)
+        heights.flags.writeable = False
+        return heights
+
+    def strata(self, chunk_key):
+        # Stage 2: solid stone from the bottom of the world up to the surface, with ore veins
+        return self.strata_cache.get(chunk_key, self.build_strata)
+
+    def build_strata(self, chunk_key):
+        heights = self.heightmap(chunk_key).T  # [z][x]
+        levels = np.arange(MIN_Y, MAX_Y)[:, None, None]
+        voxels = np.where(levels <= heights[None], STONE, AIR).astype(np.uint8)
+
+        rng = self.rng('ores', chunk_key)
+        for block_id, veins, low, high, size in ORES:
+            for _ in range(veins):
+                x, y, z = rng.randrange(CHUNK_SIZE), rng.randint(low, high), rng.randrange(CHUNK_SIZE)
+                for _ in range(size):
+                    # Ores only replace stone, so veins never poke out of the ground
+                    if 0 <= x < CHUNK_SIZE and 0 <= z < CHUNK_SIZE and MIN_Y <= y < MAX_Y and voxels[y - MIN_Y, z, x] == STONE:
+                        voxels[y - MIN_Y, z, x] = block_id
+                    axis = rng.randrange(3)
+                    step = rng.choice((-1, 1))
+                    if axis == 0:
+                        x += step
+                    elif axis == 1:
+                        y += step
+                    else:
+                        z += step
+        voxels.flags.writeable = False
+        return voxels
+
+    def surface(self, chunk_key):
+        # Stage 3: the top of every column turned into grass (or gravel in valleys) over dirt
+        return self.surfaces.get(chunk_key, self.build_surface)
+
+    def build_surface(self, chunk_key):
+        voxels = self.strata(chunk_key).copy()
+        heights = self.heightmap(chunk_key).T  # [z][x]
+        levels = np.arange(MIN_Y, MAX_Y)[:, None, None]
+        dirt = (levels < heights[None]) & (levels >= heights[None] - DIRT_DEPTH)
+        voxels[dirt & (voxels == STONE)] = DIRT
+        top = levels == heights[None]
+        voxels[top] = np.broadcast_to(self.surface_block(heights), top.shape)[top]
+        voxels.flags.writeable = False
+        return voxels
+
+    @staticmethod
+    def surface_block(heights):
+        # Block on top of columns of these heights
+        return np.where(np.asarray(heights) <= GRAVEL_HEIGHT, GRAVEL, GRASS)
+
+    def decoration(self, chunk_key):
+        # Stage 4: (x, y, z, block ID, replaces terrain) of everything rooted in this chunk. Blocks
+        # outside the chunk are picked up by the neighbour they land in when it generates.
+        return self.decorations.get(chunk_key, self.build_decoration)
+
+    def build_decoration(self, chunk_key):
+        heights = self.heightmap(chunk_key)
+        rng = self.rng('decoration', chunk_key)
+        origin_x = chunk_key[0] * CHUNK_SIZE
+        origin_z = chunk_key[1] * CHUNK_SIZE
+        blocks = []
+        for _ in range(TREE_TRIES):
+            local_x, local_z = rng.randrange(CHUNK_SIZE), rng.randrange(CHUNK_SIZE)
+            if rng.random() < TREE_CHANCE and heights[local_x, local_z] > GRAVEL_HEIGHT:
+                WorldGen.place_tree(origin_x + local_x, int(heights[local_x, local_z]) + 1, origin_z + local_z, rng.randint(4, 6), blocks)
+        if rng.random() < GRAVE_CHANCE:
+            local_x, local_z = rng.randrange(1, CHUNK_SIZE - 1), rng.randrange(1, CHUNK_SIZE - 2)
+            WorldGen.place_grave(origin_x + local_x, int(heights[local_x, local_z]), origin_z + local_z, blocks)
+        return tuple(blocks)
+
+    @staticmethod
+    def place_tree(x, y, z, trunk_height, blocks):
+        for i in range(trunk_height):
+            blocks.append((x, y + i, z, LOG, True))
+        # Leaves around the top of the trunk, they never replace terrain or other trees' logs
+        for dx in range(-1, 2):
+            for dz in range(-1, 2):
+                for dy in range(trunk_height - 1, trunk_height + 2):
+                    if not (dx == 0 and dz == 0 and dy < trunk_height):
+                        blocks.append((x + dx, y + dy, z + dz, LEAVES, False))
+
+    @staticmethod
+    def place_grave(x, y, z, blocks):
+        # A gravel mound with a stone brick headstone at its head
+        blocks.append((x, y, z, GRAVEL, True))
+        blocks.append((x, y, z + 1, GRAVEL, True))
+        blocks.append((x, y + 1, z - 1, STONE_BRICKS, False))
+
+    def sample_heights(self, origin_x, origin_z, size=CHUNK_SIZE, step=1):
+        # Surface heights of a size x size area sampled every `step` columns, indexed [x][z].
+        # Doesn't go through the memo, distant LOD surfaces sample the same noise coarser.
+        xs = np.arange(origin_x, origin_x + size, step, dtype=np.float64)
+        zs = np.arange(origin_z, origin_z + size, step, dtype=np.float64)
+        return self.heights(xs[:, None], zs[None, :])
+
+    def heights(self, x, z):
+        # Surface height of the terrain at block columns x, z (array-likes that broadcast).
+        # Valleys bottom out at y = 0.
+        return np.maximum(np.floor(BASE_HEIGHT + Noise.perlin_noise_batch(x, z, seed=self.seed) * HEIGHT_SCALE), 0).astype(np.int64)
+
+    def get_height_at(self, x, z):
+        return int(self.heights(x, z))